@@ -0,0 +1,70 @@
+"""
+Cache de respostas geradas
+Entradas expiradas continuam guardadas por um tempo para servir como
+fallback (stale) quando o Gemini estiver indisponível.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+
+class ResponseCache:
+    """Cache LRU com TTL fresco e retenção extra para respostas stale"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600.0,
+        stale_ttl_seconds: float = 86400.0,
+        max_entries: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        # chave -> (valor, criado_em)
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(endpoint: str, payload: dict) -> str:
+        """Chave determinística para endpoint + payload"""
+        raw = json.dumps({"endpoint": endpoint, "payload": payload}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retorna o valor apenas se ainda estiver fresco"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, created_at = entry
+        if self._clock() - created_at > self.ttl_seconds:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Retorna (valor, idade em segundos) mesmo se expirado, dentro da retenção stale"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, created_at = entry
+        age = self._clock() - created_at
+        if age > self.ttl_seconds + self.stale_ttl_seconds:
+            del self._entries[key]
+            return None
+        return value, age
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (value, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,230 @@
+"""
+Captura de tráfego real para replay (opt-in)
+Uma amostra das requisições de geração é gravada com o instante de chegada
+num log compacto (uma linha JSON por requisição) com rotação por tamanho.
+Textos livres são pseudonimizados com HMAC: o mesmo valor vira sempre o
+mesmo token, do mesmo tamanho, então tamanhos de payload e repetições (e a
+taxa de acerto do cache) se mantêm no replay sem guardar o que o aluno
+escreveu. A escrita é feita em lotes por uma task em background.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ordem das colunas de cada linha capturada
+FIELDS = ("ts", "method", "path", "query", "body", "client")
+
+# Campos categóricos: não identificam o aluno e mudam o comportamento do servidor
+KEEP_FIELDS = frozenset({
+    "level", "difficulty", "question_type", "current_level", "mode", "reuse", "priority", "count",
+})
+
+FILE_PREFIX = "capture-"
+FILE_SUFFIX = ".jsonl"
+
+
+class Anonymizer:
+    """Pseudonimização determinística (HMAC) que preserva o tamanho dos textos"""
+
+    def __init__(self, salt: str = ""):
+        self._key = (salt or secrets.token_hex(16)).encode()
+
+    def token(self, value: str) -> str:
+        if not value:
+            return value
+        digest = hmac.new(self._key, value.encode(), hashlib.sha256).hexdigest()
+        return (digest * (len(value) // len(digest) + 1))[:len(value)]
+
+    def scrub(self, value: Any, field: Optional[str] = None) -> Any:
+        """Troca todo texto livre por token; mantém números, booleanos e campos categóricos"""
+        if isinstance(value, dict):
+            return {key: self.scrub(item, key) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.scrub(item, field) for item in value]
+        if isinstance(value, str) and field not in KEEP_FIELDS:
+            return self.token(value)
+        return value
+
+
+def capture_files(path: str) -> List[str]:
+    """Arquivos de captura de um diretório, em ordem cronológica (ou o próprio arquivo)"""
+    if os.path.isfile(path):
+        return [path]
+    if not os.path.isdir(path):
+        return []
+    return [
+        os.path.join(path, name) for name in sorted(os.listdir(path))
+        if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)
+    ]
+
+
+def read_capture(paths: Iterable[str]) -> Iterator[dict]:
+    """Requisições capturadas, como dicts com as chaves de FIELDS"""
+    for path in paths:
+        for name in capture_files(path):
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # linha truncada por crash no meio da escrita
+                    if len(row) == len(FIELDS):
+                        yield dict(zip(FIELDS, row))
+
+
+class TrafficCapture:
+    """Amostra, anonimiza e grava as requisições de geração"""
+
+    def __init__(
+        self,
+        directory: str,
+        anonymizer: Anonymizer,
+        paths: Iterable[str] = (),
+        enabled: bool = False,
+        sample_rate: float = 0.1,
+        max_file_bytes: int = 10 * 1024 * 1024,
+        max_files: int = 10,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+        clock: Callable[[], float] = time.time,
+        rng: random.Random = None,
+    ):
+        self.directory = directory
+        self.anonymizer = anonymizer
+        self.paths = frozenset(paths)
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._buffer: List[list] = []
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[str] = None
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    def wants(self, method: str, path: str) -> bool:
+        """Decide (sorteando) se a requisição entra na amostra"""
+        return self.enabled and path in self.paths and self._rng.random() < self.sample_rate
+
+    def record(self, method: str, path: str, query: dict, body: bytes, client: Optional[str] = None) -> None:
+        """Anonimiza e enfileira a requisição; nunca bloqueia"""
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            payload = {"_invalid_json_bytes": len(body)}
+        row = [
+            round(self._clock(), 3),
+            method,
+            path,
+            self.anonymizer.scrub(query) if query else None,
+            self.anonymizer.scrub(payload),
+            self.anonymizer.token(client) if client else None,
+        ]
+        try:
+            self._queue.put_nowait(row)
+            self.captured += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    # Arquivos
+
+    def _new_file(self, ts: float) -> str:
+        stamp = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        return os.path.join(self.directory, f"{FILE_PREFIX}{stamp}{FILE_SUFFIX}")
+
+    def _write_batch(self, rows: List[list]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        data = "".join(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows)
+        if self._current is None or not os.path.exists(self._current) or (
+            os.path.getsize(self._current) + len(data) > self.max_file_bytes
+        ):
+            if self._current is not None:
+                self.rotations += 1
+            self._current = self._new_file(rows[0][0])
+            self._prune()
+        with open(self._current, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    def _prune(self) -> None:
+        """Mantém só os `max_files` arquivos mais recentes (contando o que vai ser aberto)"""
+        files = capture_files(self.directory)
+        for name in files[:max(0, len(files) - self.max_files + 1)]:
+            os.remove(name)
+
+    # Writer em background
+
+    async def _next_batch(self) -> List[list]:
+        self._buffer.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(self._buffer) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._buffer.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    async def _write(self, batch: List[list]) -> None:
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error("Traffic capture write failed (%d rows): %r", len(batch), e)
+            return
+        self.written += len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await self._write(await self._next_batch())
+
+    async def flush(self) -> None:
+        batch, self._buffer = self._buffer, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write(batch)
+
+    def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "captured": self.captured,
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "rotations": self.rotations,
+        }
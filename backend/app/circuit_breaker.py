@@ -0,0 +1,131 @@
+"""
+Circuit breaker para chamadas ao Gemini
+Abre o circuito quando a taxa de erros (ou de chamadas lentas) na janela
+recente passa do limite, falhando rápido até o próximo teste em half-open.
+"""
+
+import time
+from collections import deque
+from typing import Callable, Optional
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada porque o circuito está aberto"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Circuit breaker com estados closed/open/half_open baseado em janela deslizante"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window_seconds: float = 60.0,
+        min_requests: int = 5,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_round = 0  # identifica o período half-open em que a vaga de teste foi tomada
+        # (timestamp, falhou_ou_lenta)
+        self._calls: deque = deque()
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_round += 1
+        return self._state
+
+    def before_call(self) -> Optional[int]:
+        """Levanta CircuitOpenError se a chamada não deve ser feita agora
+
+        Em half-open, a chamada ocupa uma vaga de teste e recebe um token:
+        se ela terminar sem resultado (cancelada), devolva a vaga com cancel_call.
+        """
+        state = self.state
+        if state == self.OPEN:
+            raise CircuitOpenError(self.open_seconds - (self._clock() - self._opened_at))
+        if state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                raise CircuitOpenError(self.open_seconds)
+            self._half_open_calls += 1
+            return self._half_open_round
+        return None
+
+    def cancel_call(self, probe: Optional[int]) -> None:
+        """Devolve a vaga de teste de uma chamada que não chegou ao modelo ou não terminou
+
+        Sem isso, um teste cancelado deixaria o circuito em half-open para sempre.
+        Tokens de um período half-open anterior são ignorados.
+        """
+        if probe is not None and self._state == self.HALF_OPEN and probe == self._half_open_round:
+            self._half_open_calls = max(0, self._half_open_calls - 1)
+
+    def record_success(self, latency: float) -> None:
+        """Registra uma chamada concluída (lenta conta como ruim)"""
+        self._record(bad=latency >= self.slow_call_seconds)
+
+    def record_failure(self, latency: float = 0.0) -> None:
+        """Registra uma chamada que falhou"""
+        self._record(bad=True)
+
+    def _record(self, bad: bool) -> None:
+        now = self._clock()
+        if self.state == self.HALF_OPEN:
+            if bad:
+                self._trip(now)
+            else:
+                self._state = self.CLOSED
+                self._calls.clear()
+            return
+
+        self._calls.append((now, bad))
+        self._prune(now)
+        if self._state == self.CLOSED and len(self._calls) >= self.min_requests:
+            if self.error_rate() >= self.error_rate_threshold:
+                self._trip(now)
+
+    def _trip(self, now: float) -> None:
+        self._state = self.OPEN
+        self._opened_at = now
+        self._calls.clear()
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def error_rate(self) -> float:
+        """Fração de chamadas ruins na janela atual"""
+        self._prune(self._clock())
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, bad in self._calls if bad) / len(self._calls)
+
+    def snapshot(self) -> dict:
+        """Estado atual para health checks e métricas"""
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "window_calls": len(self._calls),
+        }
@@ -1,6 +1,13 @@
 import os
+from pathlib import Path
 from typing import Optional
 
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (backend/.env), antes de Settings ler o ambiente
+ENV_PATH = Path(__file__).parent.parent / ".env"
+load_dotenv(dotenv_path=ENV_PATH)
+
 class Settings:
     """Application settings and configuration"""
     
@@ -20,6 +27,14 @@ class Settings:
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", 8000))
     
+    # Logging Configuration
+    LOG_CONFIGURE: bool = os.getenv("LOG_CONFIGURE", "true").lower() == "true"  # false: mantém os handlers do logger raiz
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # json ou text
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", 0.1))  # fração dos logs de acesso de sucesso mantida
+    LOG_SLOW_REQUEST_MS: float = float(os.getenv("LOG_SLOW_REQUEST_MS", 2000))  # acima disso o acesso sempre é logado
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    
     # CORS Configuration
     ALLOWED_ORIGINS: list = os.getenv("ALLOWED_ORIGINS", "*").split(",")
     
@@ -27,6 +42,21 @@ class Settings:
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", 2048))
     
+    # Upstream Transport Configuration
+    GEMINI_TRANSPORT: str = os.getenv("GEMINI_TRANSPORT", "grpc")  # grpc ou rest
+    GEMINI_API_ENDPOINT: str = os.getenv("GEMINI_API_ENDPOINT", "generativelanguage.googleapis.com")
+    GEMINI_API_INSECURE: bool = os.getenv("GEMINI_API_INSECURE", "false").lower() == "true"  # apenas para stand-in local
+    UPSTREAM_POOL_SIZE: int = int(os.getenv("UPSTREAM_POOL_SIZE", 4))
+    UPSTREAM_KEEPALIVE_SECONDS: int = int(os.getenv("UPSTREAM_KEEPALIVE_SECONDS", 30))
+    UPSTREAM_WARMUP_TIMEOUT_SECONDS: float = float(os.getenv("UPSTREAM_WARMUP_TIMEOUT_SECONDS", 10))
+    
+    # Generation Profiles Configuration
+    # JSON com overrides por perfil, ex.: {"explain": {"temperature": 0.4, "model": "gemini-2.0-flash"}}
+    GENERATION_PROFILES: str = os.getenv("GENERATION_PROFILES", "")
+    ADAPTIVE_MAX_TOKENS: bool = os.getenv("ADAPTIVE_MAX_TOKENS", "false").lower() == "true"
+    ADAPTIVE_HEADROOM: float = float(os.getenv("ADAPTIVE_HEADROOM", 1.15))  # margem acima do p99 observado
+    ADAPTIVE_MIN_SAMPLES: int = int(os.getenv("ADAPTIVE_MIN_SAMPLES", 50))
+    
     # Study Assistant Configuration
     DEFAULT_DIFFICULTY: str = "medium"
     DEFAULT_QUESTION_TYPE: str = "multiple_choice"
@@ -34,6 +64,92 @@ class Settings:
     MAX_STUDY_PLAN_WEEKS: int = 52  # 1 year max
     MAX_DAILY_HOURS: int = 12
     
+    # Upstream Resilience Configuration
+    UPSTREAM_TIMEOUT_SECONDS: float = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", 30))
+    BREAKER_WINDOW_SECONDS: float = float(os.getenv("BREAKER_WINDOW_SECONDS", 60))
+    BREAKER_MIN_REQUESTS: int = int(os.getenv("BREAKER_MIN_REQUESTS", 5))
+    BREAKER_ERROR_RATE: float = float(os.getenv("BREAKER_ERROR_RATE", 0.5))
+    BREAKER_SLOW_CALL_SECONDS: float = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", 20))
+    BREAKER_OPEN_SECONDS: float = float(os.getenv("BREAKER_OPEN_SECONDS", 30))
+    
+    # Load Shedding Configuration (limite de concorrência adaptativo das gerações interativas)
+    LIMITER_ENABLED: bool = os.getenv("LIMITER_ENABLED", "true").lower() == "true"
+    LIMITER_INITIAL: int = int(os.getenv("LIMITER_INITIAL", 8))
+    LIMITER_MIN: int = int(os.getenv("LIMITER_MIN", 2))
+    LIMITER_MAX: int = int(os.getenv("LIMITER_MAX", 64))
+    LIMITER_TARGET_LATENCY_SECONDS: float = float(os.getenv("LIMITER_TARGET_LATENCY_SECONDS", 8))
+    
+    # Response Cache Configuration
+    CACHE_TTL_SECONDS: int = int(os.getenv("CACHE_TTL_SECONDS", 3600))
+    CACHE_STALE_TTL_SECONDS: int = int(os.getenv("CACHE_STALE_TTL_SECONDS", 86400))  # fallback quando o Gemini falha
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", 1000))
+    
+    # Async Jobs Configuration
+    JOBS_DB_PATH: str = os.getenv("JOBS_DB_PATH", "jobs.db")
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", 2))
+    JOB_RETENTION_SECONDS: int = int(os.getenv("JOB_RETENTION_SECONDS", 86400))
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", 60))  # job running sem renovação volta para a fila
+    
+    # Content Store Configuration (acervo pesquisável do conteúdo gerado)
+    CONTENT_DB_PATH: str = os.getenv("CONTENT_DB_PATH", "content.db")
+    CONTENT_WRITE_BATCH_SIZE: int = int(os.getenv("CONTENT_WRITE_BATCH_SIZE", 50))
+    CONTENT_WRITE_INTERVAL_SECONDS: float = float(os.getenv("CONTENT_WRITE_INTERVAL_SECONDS", 1))
+    
+    # Document Store Configuration (planos e resumos indexados por seção)
+    DOCUMENTS_DB_PATH: str = os.getenv("DOCUMENTS_DB_PATH", "documents.db")
+    DOCUMENT_CACHE_MAX_AGE: int = int(os.getenv("DOCUMENT_CACHE_MAX_AGE", 86400))  # ID = hash do conteúdo
+    
+    # Quota Configuration (limites do free tier do modelo)
+    QUOTA_RPM: int = int(os.getenv("QUOTA_RPM", 30))
+    QUOTA_RPD: int = int(os.getenv("QUOTA_RPD", 200))
+    
+    # Usage Ledger Configuration (arquivos diários append-only)
+    USAGE_LEDGER_DIR: str = os.getenv("USAGE_LEDGER_DIR", "usage")
+    USAGE_RETENTION_DAYS: int = int(os.getenv("USAGE_RETENTION_DAYS", 30))
+    USAGE_WRITE_INTERVAL_SECONDS: float = float(os.getenv("USAGE_WRITE_INTERVAL_SECONDS", 2))
+    
+    # Traffic Capture Configuration (opt-in: amostra anonimizada do tráfego para replay)
+    CAPTURE_ENABLED: bool = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+    CAPTURE_DIR: str = os.getenv("CAPTURE_DIR", "capture")
+    CAPTURE_SAMPLE_RATE: float = float(os.getenv("CAPTURE_SAMPLE_RATE", 0.1))
+    CAPTURE_PATHS: str = os.getenv("CAPTURE_PATHS", "/explain,/explain/stream,/generate-question,/study-plan,/summarize,/quiz")
+    CAPTURE_MAX_FILE_MB: float = float(os.getenv("CAPTURE_MAX_FILE_MB", 10))
+    CAPTURE_MAX_FILES: int = int(os.getenv("CAPTURE_MAX_FILES", 10))
+    CAPTURE_SALT: str = os.getenv("CAPTURE_SALT", "")  # vazio = aleatório por processo
+    
+    # Question Pool Configuration
+    POOL_LOW_WATERMARK: int = int(os.getenv("POOL_LOW_WATERMARK", 3))
+    POOL_TARGET_SIZE: int = int(os.getenv("POOL_TARGET_SIZE", 10))
+    POOL_BATCH_SIZE: int = int(os.getenv("POOL_BATCH_SIZE", 5))
+    POOL_REFILL_INTERVAL_SECONDS: int = int(os.getenv("POOL_REFILL_INTERVAL_SECONDS", 30))
+    POOL_QUOTA_RESERVE: float = float(os.getenv("POOL_QUOTA_RESERVE", 0.5))  # fração da cota reservada para uso interativo
+    
+    # Spaced Repetition Configuration (filas de revisão SM-2 por aluno, persistidas em SQLite)
+    REVIEW_DB_PATH: str = os.getenv("REVIEW_DB_PATH", "review.db")
+    REVIEW_MAX_STUDENTS: int = int(os.getenv("REVIEW_MAX_STUDENTS", 10000))  # alunos com fila em memória
+    REVIEW_MAX_INLINE_KEYS: int = int(os.getenv("REVIEW_MAX_INLINE_KEYS", 10000))  # gabaritos enviados pelo cliente em /grade
+    
+    # Tenants Configuration (fila justa da capacidade upstream)
+    # JSON por API key, ex.: {"chave-escola-a": {"name": "escola-a", "weight": 3, "burst": 4}}
+    TENANTS: str = os.getenv("TENANTS", "")
+    TENANT_DEFAULT_WEIGHT: float = float(os.getenv("TENANT_DEFAULT_WEIGHT", 1))
+    TENANT_DEFAULT_BURST: int = int(os.getenv("TENANT_DEFAULT_BURST", 2))
+    UPSTREAM_CONCURRENCY: int = int(os.getenv("UPSTREAM_CONCURRENCY", 4))
+    
+    # Prefetch Configuration (geração especulativa do próximo passo provável)
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+    PREFETCH_MIN_PROBABILITY: float = float(os.getenv("PREFETCH_MIN_PROBABILITY", 0.5))
+    PREFETCH_QUOTA_RESERVE: float = float(os.getenv("PREFETCH_QUOTA_RESERVE", 0.6))  # só prefetcha com folga maior que a do pool
+    PREFETCH_MAX_PER_HOUR: int = int(os.getenv("PREFETCH_MAX_PER_HOUR", 10))
+    
+    # Idempotency Configuration (header Idempotency-Key nos POST)
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    IDEMPOTENCY_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+    
+    # HTTP Cache Configuration (variantes GET de /explain e /generate-question)
+    HTTP_CACHE_MAX_AGE: int = int(os.getenv("HTTP_CACHE_MAX_AGE", 3600))
+    HTTP_CACHE_STALE_WHILE_REVALIDATE: int = int(os.getenv("HTTP_CACHE_STALE_WHILE_REVALIDATE", 86400))
+    
     def validate(self) -> bool:
         """Validate required settings"""
         if not self.GEMINI_API_KEY:
@@ -0,0 +1,273 @@
+"""
+Acervo pesquisável de todo conteúdo gerado
+Explicações, questões, planos e resumos são gravados (append-only) em SQLite
+com índice FTS5, para busca por relevância e reaproveitamento. A gravação sai
+do caminho da requisição: um writer em background grava em lotes.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    endpoint TEXT NOT NULL,
+    subject TEXT,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_content_endpoint ON content (endpoint, created_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS content_fts USING fts5(
+    title, subject, body,
+    content='content', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokens(text: str) -> List[str]:
+    """Termos normalizados (minúsculas, sem acento), como o tokenizer do FTS5"""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return _TOKEN.findall(normalized)
+
+
+def match_query(text: str) -> Optional[str]:
+    """Converte texto livre em uma consulta FTS5 segura (todos os termos, entre aspas)"""
+    terms = tokens(text)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms)
+
+
+class ContentStore:
+    """Persistência append-only do conteúdo gerado, com busca FTS5"""
+
+    # Pesos do bm25 por coluna: título pesa mais que o corpo
+    RANK_WEIGHTS = (10.0, 2.0, 1.0)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def append_many(self, records: List[dict]) -> int:
+        """Grava um lote numa única transação (conteúdo + índice)"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for record in records:
+                    cursor = self._conn.execute(
+                        "INSERT INTO content (endpoint, subject, title, body, payload, created_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            record["endpoint"],
+                            record.get("subject"),
+                            record["title"],
+                            record["body"],
+                            json.dumps(record.get("payload", {})),
+                            record.get("created_at", time.time()),
+                        ),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO content_fts (rowid, title, subject, body) VALUES (?, ?, ?, ?)",
+                        (cursor.lastrowid, record["title"], record.get("subject") or "", record["body"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(records)
+
+    def get(self, content_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM content WHERE id = ?", (content_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def _to_dict(self, row: sqlite3.Row) -> dict:
+        item = dict(row)
+        item["payload"] = json.loads(item["payload"])
+        return item
+
+    def _filters(self, endpoint: Optional[str], subject: Optional[str]) -> Tuple[str, list]:
+        clauses, params = [], []
+        if endpoint:
+            clauses.append("c.endpoint = ?")
+            params.append(endpoint)
+        if subject:
+            clauses.append("c.subject = ? COLLATE NOCASE")
+            params.append(subject)
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+    def search(
+        self,
+        query: str,
+        endpoint: Optional[str] = None,
+        subject: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> Tuple[int, List[dict]]:
+        """(total de resultados, página ordenada por relevância bm25)"""
+        fts_query = match_query(query)
+        if fts_query is None:
+            return 0, []
+        where, params = self._filters(endpoint, subject)
+        weights = ", ".join(str(weight) for weight in self.RANK_WEIGHTS)
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM content_fts JOIN content c ON c.id = content_fts.rowid"
+                f" WHERE content_fts MATCH ?{where}",
+                (fts_query, *params),
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT c.id, c.endpoint, c.subject, c.title, c.created_at,"
+                f" snippet(content_fts, 2, '[', ']', '…', 24) AS snippet,"
+                f" bm25(content_fts, {weights}) AS rank"
+                f" FROM content_fts JOIN content c ON c.id = content_fts.rowid"
+                f" WHERE content_fts MATCH ?{where}"
+                f" ORDER BY rank LIMIT ? OFFSET ?",
+                (fts_query, *params, limit, offset),
+            ).fetchall()
+        results = []
+        for row in rows:
+            item = dict(row)
+            item["score"] = round(-item.pop("rank"), 4)  # bm25 do SQLite é negativo (menor = melhor)
+            results.append(item)
+        return total, results
+
+    def find_reusable(
+        self, endpoint: str, title: str, subject: Optional[str] = None, match: Optional[Dict[str, object]] = None
+    ) -> Optional[dict]:
+        """Conteúdo já gerado que responde à mesma requisição (match forte) ou None
+
+        Forte = mesmo endpoint e matéria, título com os mesmos termos (ignorando
+        caixa, acentos e ordem) e os mesmos valores nos campos de `match`.
+        """
+        fts_query = match_query(title)
+        if fts_query is None:
+            return None
+        wanted = sorted(tokens(title))
+        where, params = self._filters(endpoint, subject)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT c.* FROM content_fts JOIN content c ON c.id = content_fts.rowid"
+                f" WHERE content_fts MATCH ?{where}"
+                f" ORDER BY c.created_at DESC LIMIT 50",
+                (f"title : ({fts_query})", *params),
+            ).fetchall()
+        for row in rows:
+            item = self._to_dict(row)
+            if sorted(tokens(item["title"])) != wanted:
+                continue
+            if all(item["payload"].get(field) == value for field, value in (match or {}).items()):
+                return item
+        return None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM content").fetchone()[0]
+
+
+class ContentWriter:
+    """Grava o conteúdo gerado em lotes, fora do caminho da requisição"""
+
+    def __init__(self, store: ContentStore, batch_size: int = 50, flush_interval: float = 1.0, max_pending: int = 10000):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._buffer: List[dict] = []  # lote em montagem (preservado se o writer for cancelado)
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def submit(self, endpoint: str, title: str, body: str, subject: Optional[str] = None, payload: Optional[dict] = None) -> None:
+        """Enfileira um registro; nunca bloqueia (descarta se a fila estiver cheia)"""
+        record = {
+            "endpoint": endpoint,
+            "title": title,
+            "subject": subject,
+            "body": body,
+            "payload": payload or {},
+            "created_at": time.time(),
+        }
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _next_batch(self) -> List[dict]:
+        """Espera o primeiro registro e junta outros até encher o lote ou vencer o intervalo"""
+        self._buffer.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(self._buffer) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._buffer.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    async def _write(self, batch: List[dict]) -> None:
+        try:
+            await asyncio.to_thread(self.store.append_many, batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error("Content store write failed (%d records): %r", len(batch), e)
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    async def _run(self) -> None:
+        while True:
+            await self._write(await self._next_batch())
+
+    async def flush(self) -> None:
+        """Grava imediatamente tudo que estiver pendente"""
+        batch, self._buffer = self._buffer, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write(batch)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
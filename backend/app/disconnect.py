@@ -0,0 +1,203 @@
+"""
+Cancelamento de gerações quando o cliente desconecta
+DisconnectWatcher (middleware ASGI) consome o canal `receive` em background
+e marca a requisição como abandonada assim que chega http.disconnect, mesmo
+enquanto o endpoint só espera o upstream. Gerações iguais em andamento são
+compartilhadas (InFlight): a chamada upstream só é cancelada quando não
+resta nenhum interessado no resultado.
+"""
+
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Evento da requisição atual (None fora de uma requisição: jobs, prefetch, refill)
+current_disconnect: ContextVar[Optional[asyncio.Event]] = ContextVar("current_disconnect", default=None)
+
+# Convenção do nginx para "cliente fechou a conexão antes da resposta"
+CLIENT_CLOSED_REQUEST = 499
+
+
+class ClientDisconnected(Exception):
+    """O cliente fechou a conexão antes da resposta ficar pronta"""
+
+
+class DisconnectWatcher:
+    """Middleware ASGI: lê as mensagens do cliente numa task e sinaliza o disconnect"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        disconnected = asyncio.Event()
+        messages: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def pumped_receive():
+            if disconnected.is_set() and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        token = current_disconnect.set(disconnected)
+        task = asyncio.create_task(pump())
+        try:
+            await self.app(scope, pumped_receive, send)
+        finally:
+            task.cancel()
+            current_disconnect.reset(token)
+
+
+class DisconnectHold:
+    """Desconexão de uma requisição que outras podem segurar (ex.: retentativa com a mesma Idempotency-Key)
+
+    `event` só dispara quando o cliente original saiu e não resta ninguém
+    segurando: a retentativa que aguarda a execução original mantém a
+    geração viva mesmo se a primeira conexão cair.
+    """
+
+    def __init__(self, disconnect: asyncio.Event):
+        self.event = asyncio.Event()
+        self.holders = 0
+        self._client_gone = False
+        self._watcher = asyncio.ensure_future(self._watch(disconnect))
+
+    async def _watch(self, disconnect: asyncio.Event) -> None:
+        await disconnect.wait()
+        self._client_gone = True
+        self._update()
+
+    def hold(self) -> None:
+        self.holders += 1
+
+    def release(self) -> None:
+        self.holders -= 1
+        self._update()
+
+    def _update(self) -> None:
+        if self._client_gone and self.holders <= 0:
+            self.event.set()
+
+    def close(self) -> None:
+        self._watcher.cancel()
+
+
+async def until_disconnected(awaitable: Awaitable[Any], disconnect: Optional[asyncio.Event] = None) -> Any:
+    """Aguarda `awaitable`; se o cliente desconectar antes, cancela-o e levanta ClientDisconnected"""
+    disconnect = disconnect or current_disconnect.get()
+    if disconnect is None:
+        return await awaitable
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(disconnect.wait())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        await _cancel(task)
+        raise
+    finally:
+        watcher.cancel()
+    if not task.done():
+        await _cancel(task)
+        raise ClientDisconnected()
+    return task.result()
+
+
+async def _cancel(task: asyncio.Future) -> None:
+    """Cancela e espera o cancelamento terminar (ex.: um gerador assíncrono fica livre para aclose)"""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+class _Flight:
+    __slots__ = ("task", "waiters", "expected_tokens")
+
+    def __init__(self, task: asyncio.Task, expected_tokens: int):
+        self.task = task
+        self.waiters = 0
+        self.expected_tokens = expected_tokens
+
+
+class InFlight:
+    """Gerações em andamento por chave, compartilhadas entre requisições iguais
+
+    Cada requisição é um "interessado"; chamadores sem requisição (jobs,
+    prefetch) nunca desistem, então mantêm a geração e o preenchimento do
+    cache vivos. Quando o último interessado desiste, a chamada é cancelada.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.coalesced = 0
+        self.abandoned = 0
+        self.kept_alive = 0
+        self.cancelled = 0
+        self.tokens_saved = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def _start(self, key: str, factory: Callable[[], Awaitable[Any]], expected_tokens: int) -> _Flight:
+        flight = _Flight(asyncio.ensure_future(factory()), expected_tokens)
+        self._flights[key] = flight
+
+        def done(task: asyncio.Task) -> None:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not task.cancelled():
+                task.exception()  # evita "exception was never retrieved" sem interessados
+
+        flight.task.add_done_callback(done)
+        return flight
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]], expected_tokens: int = 0) -> Any:
+        """Resultado da geração `key` (inicia com `factory` se ninguém estiver gerando)"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, factory, expected_tokens)
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await until_disconnected(asyncio.shield(flight.task))
+        except ClientDisconnected:
+            self.abandoned += 1
+            if flight.waiters > 1:
+                self.kept_alive += 1
+            raise
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._count_cancelled(flight.expected_tokens)
+
+    def _count_cancelled(self, tokens_saved: int) -> None:
+        self.cancelled += 1
+        self.tokens_saved += max(0, tokens_saved)
+
+    def abandon_stream(self, tokens_saved: int) -> None:
+        """Conta um streaming interrompido pelo cliente (sempre um único interessado)"""
+        self.abandoned += 1
+        self._count_cancelled(tokens_saved)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "coalesced": self.coalesced,
+            "abandoned_requests": self.abandoned,
+            "kept_for_other_waiters": self.kept_alive,
+            "upstream_cancelled": self.cancelled,
+            "estimated_tokens_saved": self.tokens_saved,
+        }
@@ -0,0 +1,217 @@
+"""
+Documentos gerados indexados por seção
+Planos de estudo e resumos são quebrados uma única vez, pelos títulos do
+markdown, num índice de seções gravado sob um ID de documento (hash do
+conteúdo). Os clientes buscam só a seção ou o intervalo de semanas que vão
+mostrar, com ETag por seção, em vez de baixar e reprocessar o documento
+inteiro (ou regenerá-lo) a cada visualização.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.http_cache import compute_etag
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_sections (
+    document_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    slug TEXT NOT NULL,
+    title TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    week INTEGER,
+    body TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    PRIMARY KEY (document_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_sections_week ON document_sections (document_id, week);
+"""
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_WEEK = re.compile(r"\bsemana\s+([0-9]{1,9})\b", re.IGNORECASE)
+_EMOJI = re.compile(r"[^\w\s-]", re.UNICODE)
+_INDEX = re.compile(r"[0-9]{1,9}")  # só ASCII e cabe no INTEGER do SQLite; o resto é slug
+
+
+def document_id(kind: str, text: str) -> str:
+    """ID estável: o mesmo texto gera sempre o mesmo documento"""
+    return hashlib.sha256(f"{kind}\x00{text}".encode()).hexdigest()[:16]
+
+
+def slugify(title: str) -> str:
+    """"## 📝 Possíveis Perguntas de Prova" -> "possiveis-perguntas-de-prova" """
+    text = unicodedata.normalize("NFKD", title.replace("*", "")).encode("ascii", "ignore").decode()
+    return "-".join(_EMOJI.sub(" ", text).lower().split()) or "secao"
+
+
+def parse_sections(text: str) -> List[dict]:
+    """Seções do markdown pelos títulos ATX; o texto antes do primeiro título vira "introducao" """
+    sections: List[dict] = []
+    title, level, lines = "Introdução", 0, []
+
+    def close():
+        body = "\n".join(lines).strip()
+        if level == 0 and not body:
+            return
+        slug, suffix = slugify(title), 2
+        while any(section["id"] == slug for section in sections):
+            slug, suffix = f"{slugify(title)}-{suffix}", suffix + 1
+        week = _WEEK.search(title)
+        sections.append({
+            "index": len(sections),
+            "id": slug,
+            "title": title,
+            "level": level,
+            "week": int(week.group(1)) if week else None,
+            "body": body,
+        })
+
+    in_code = False
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        heading = None if in_code else _HEADING.match(line)
+        if heading:
+            close()
+            title, level, lines = heading.group(2).strip(), len(heading.group(1)), []
+        else:
+            lines.append(line)
+    close()
+    for section in sections:
+        section["bytes"] = len(section["body"].encode())
+        section["etag"] = compute_etag(section["body"].encode())
+    return sections
+
+
+class DocumentStore:
+    """Índice de seções dos documentos gerados (SQLite, append-only como o acervo)"""
+
+    def __init__(self, path: str, remember: int = 10000):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # IDs já gravados: acertos de cache não voltam a tocar o disco
+        self._known: "OrderedDict[str, int]" = OrderedDict()
+        self.remember = remember
+        self.saved = 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def known(self, doc_id: str) -> Optional[int]:
+        """Número de seções se o documento já foi gravado por este processo"""
+        count = self._known.get(doc_id)
+        if count is not None:
+            self._known.move_to_end(doc_id)
+        return count
+
+    def _remember(self, doc_id: str, count: int) -> None:
+        self._known[doc_id] = count
+        self._known.move_to_end(doc_id)
+        while len(self._known) > self.remember:
+            self._known.popitem(last=False)
+
+    def save(self, kind: str, title: str, text: str) -> dict:
+        """Indexa e grava o documento (idempotente) -> {document_id, sections}"""
+        doc_id = document_id(kind, text)
+        count = self.known(doc_id)
+        if count is not None:
+            return {"document_id": doc_id, "sections": count}
+        sections = parse_sections(text)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO documents (id, kind, title, created_at) VALUES (?, ?, ?, ?)",
+                    (doc_id, kind, title, time.time()),
+                )
+                if cursor.rowcount:
+                    self._conn.executemany(
+                        "INSERT INTO document_sections (document_id, idx, slug, title, level, week, body, etag)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (doc_id, s["index"], s["id"], s["title"], s["level"], s["week"], s["body"], s["etag"])
+                            for s in sections
+                        ],
+                    )
+                    self.saved += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._remember(doc_id, len(sections))
+        return {"document_id": doc_id, "sections": len(sections)}
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        """Metadados e índice das seções (sem os corpos)"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT idx, slug, title, level, week, length(CAST(body AS BLOB)) AS bytes, etag"
+                " FROM document_sections WHERE document_id = ? ORDER BY idx",
+                (doc_id,),
+            ).fetchall()
+        document = dict(row)
+        document["sections"] = [self._section(r) for r in rows]
+        return document
+
+    def sections(
+        self,
+        doc_id: str,
+        offset: int = 0,
+        limit: int = 10,
+        week_from: Optional[int] = None,
+        week_to: Optional[int] = None,
+    ) -> List[dict]:
+        """Corpos de um intervalo de seções (por posição ou por semana)"""
+        clauses, params = ["document_id = ?"], [doc_id]
+        if week_from is not None:
+            clauses.append("week >= ?")
+            params.append(week_from)
+        if week_to is not None:
+            clauses.append("week <= ?")
+            params.append(week_to)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, slug, title, level, week, length(CAST(body AS BLOB)) AS bytes, etag, body"
+                f" FROM document_sections WHERE {' AND '.join(clauses)} ORDER BY idx LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [self._section(r) for r in rows]
+
+    def section(self, doc_id: str, ref: str) -> Optional[dict]:
+        """Uma seção pela posição ("3") ou pelo slug ("possiveis-perguntas-de-prova")"""
+        column, value = ("idx", int(ref)) if _INDEX.fullmatch(ref) else ("slug", ref)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT idx, slug, title, level, week, length(CAST(body AS BLOB)) AS bytes, etag, body"
+                f" FROM document_sections WHERE document_id = ? AND {column} = ?",
+                (doc_id, value),
+            ).fetchone()
+        return self._section(row) if row is not None else None
+
+    def _section(self, row: sqlite3.Row) -> dict:
+        item = dict(row)
+        item["index"] = item.pop("idx")
+        item["id"] = item.pop("slug")
+        return item
+
+    def stats(self) -> dict:
+        return {"saved": self.saved, "remembered": len(self._known)}
@@ -0,0 +1,240 @@
+"""
+Correção de respostas dos alunos
+Múltipla escolha e verdadeiro/falso são corrigidas localmente, na hora,
+contra o gabarito guardado quando a questão foi gerada. Respostas abertas
+vão em lote para o modelo: várias respostas por chamada, com os critérios
+de avaliação de cada questão e uma nota por resposta (saída JSON estruturada).
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.quiz import split_count
+from app.review import ReviewStore
+
+MULTIPLE_CHOICE = "multiple_choice"
+TRUE_FALSE = "true_false"
+OPEN_ENDED = "open_ended"
+
+# Nota mínima (0..1) para uma resposta aberta contar como correta
+PASSING_SCORE = 0.6
+
+# grade_batch(entradas com "index") -> {index: {"score", "feedback"}}
+BatchGrader = Callable[[List[dict]], Awaitable[Dict[int, dict]]]
+
+# response_schema do Gemini para as notas de um lote de respostas abertas
+GRADES_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "index": {"type": "integer"},
+            "score": {"type": "number"},
+            "feedback": {"type": "string"},
+        },
+        "required": ["index", "score", "feedback"],
+    },
+}
+
+_TRUE = {"v", "verdadeiro", "verdadeira", "true", "t", "sim", "certo", "correto"}
+_FALSE = {"f", "falso", "falsa", "false", "nao", "errado", "incorreto"}
+_LETTER = re.compile(r"^\(?([a-e])\s*(?:[).:\-]|$)")
+
+
+def question_id(item: dict) -> str:
+    """ID estável de uma questão (hash do enunciado e do gabarito)"""
+    digest = hashlib.sha256(f"{item['statement']}\x00{item['answer']}".encode()).hexdigest()
+    return digest[:16]
+
+
+def question_type_of(item: dict) -> str:
+    """Tipo inferido pelas alternativas (sem alternativas = aberta)"""
+    options = [_normalize(option) for option in item.get("options") or []]
+    if not options:
+        return OPEN_ENDED
+    if len(options) == 2 and _boolean(options[0]) is not None and _boolean(options[1]) is not None:
+        return TRUE_FALSE
+    return MULTIPLE_CHOICE
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return " ".join(text.lower().split())
+
+
+def _boolean(text: str) -> Optional[bool]:
+    word = _normalize(text).strip(" .!)")
+    if word in _TRUE:
+        return True
+    if word in _FALSE:
+        return False
+    return None
+
+
+def _letter(text: str, options: List[str]) -> Optional[str]:
+    """Letra da alternativa: "B", "b)", "B) texto" ou o texto completo da alternativa"""
+    normalized = _normalize(text)
+    match = _LETTER.match(normalized)
+    if match:
+        return match.group(1)
+    for option in options:
+        option_match = _LETTER.match(_normalize(option))
+        body = _normalize(option)[option_match.end():].strip() if option_match else _normalize(option)
+        if normalized and (normalized == body or normalized == _normalize(option)):
+            return option_match.group(1) if option_match else None
+    return None
+
+
+def grade_local(item: dict, question_type: str, answer: str) -> dict:
+    """Corrige múltipla escolha / verdadeiro-falso contra o gabarito"""
+    if question_type == TRUE_FALSE:
+        expected, given = _boolean(item["answer"]), _boolean(answer)
+    else:
+        expected, given = _letter(item["answer"], item["options"]), _letter(answer, item["options"])
+    if expected is None:
+        return {"correct": None, "score": None, "feedback": "Gabarito da questão em formato não reconhecido",
+                "graded_by": "unavailable"}
+    if given is None:
+        return {"correct": False, "score": 0.0, "feedback": "Resposta não reconhecida. " + item["explanation"],
+                "graded_by": "local"}
+    correct = given == expected
+    return {"correct": correct, "score": 1.0 if correct else 0.0, "feedback": item["explanation"], "graded_by": "local"}
+
+
+def parse_grades(text: str) -> Dict[int, dict]:
+    """Notas válidas de uma resposta JSON do modelo, por índice (nota limitada a 0..1)"""
+    data = json.loads(text.strip().strip("`").removeprefix("json"))
+    grades = {}
+    for raw in data if isinstance(data, list) else []:
+        try:
+            index, score = int(raw["index"]), float(raw["score"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if score > 1:
+            score /= 100  # o modelo às vezes responde em 0..100
+        grades[index] = {"score": round(min(max(score, 0.0), 1.0), 3), "feedback": str(raw.get("feedback", ""))}
+    return grades
+
+
+class AnswerKeyStore:
+    """Gabaritos das questões geradas, por question_id (LRU em memória sobre o ReviewStore opcional)
+
+    Gabaritos enviados pelo cliente (inline) ficam numa tabela à parte,
+    limitada aos `max_inline` mais recentes.
+    """
+
+    def __init__(self, max_entries: int = 50000, store: Optional[ReviewStore] = None, max_inline: int = 10000):
+        self.max_entries = max_entries
+        self.store = store
+        self.max_inline = max_inline
+        self.inline_evicted = 0
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()  # /grade usa o store numa thread (asyncio.to_thread)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item: dict, inline: bool = False) -> str:
+        qid = question_id(item)
+        with self._lock:
+            if qid not in self._items:
+                self._items[qid] = {key: item[key] for key in ("statement", "options", "answer", "explanation")}
+                if self.store is not None and inline:
+                    self.inline_evicted += self.store.save_inline_answer_key(qid, self._items[qid], self.max_inline)
+                elif self.store is not None:
+                    self.store.save_answer_key(qid, self._items[qid])
+            self._remember(qid)
+        return qid
+
+    def get(self, qid: str) -> Optional[dict]:
+        with self._lock:
+            item = self._items.get(qid)
+            if item is None and self.store is not None:
+                item = self.store.get_answer_key(qid)  # saiu do LRU ou foi gravado por outro worker
+                if item is not None:
+                    self._items[qid] = item
+            if item is not None:
+                self._remember(qid)
+        return item
+
+    def _remember(self, qid: str) -> None:
+        self._items.move_to_end(qid)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+
+class GradingEngine:
+    """Corrige localmente o que dá e empacota as respostas abertas em lotes para o modelo"""
+
+    def __init__(self, grade_batch: BatchGrader):
+        self.grade_batch = grade_batch
+        self.graded_local = 0
+        self.graded_model = 0
+        self.unavailable = 0
+        self.upstream_calls = 0
+
+    async def grade(self, submissions: List[dict], per_call: Optional[int] = None) -> Tuple[List[dict], int]:
+        """(resultado por submissão, chamadas upstream); submissão = {item, question_type, answer}
+
+        Se uma chamada do lote falhar, as respostas dela voltam como
+        "unavailable" e o erro é relançado só quando nada foi corrigido.
+        """
+        results: List[Optional[dict]] = [None] * len(submissions)
+        open_ended = []
+        for index, submission in enumerate(submissions):
+            if submission["question_type"] == OPEN_ENDED:
+                open_ended.append(index)
+            else:
+                results[index] = grade_local(submission["item"], submission["question_type"], submission["answer"])
+
+        parts = split_count(len(open_ended), per_call or len(open_ended)) if open_ended else []
+        batches, start = [], 0
+        for size in parts:
+            batches.append(open_ended[start:start + size])
+            start += size
+        outcomes = await asyncio.gather(
+            *(self.grade_batch([{"index": i, **submissions[i]} for i in batch]) for batch in batches),
+            return_exceptions=True,
+        )
+
+        error = None
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, BaseException):
+                error = outcome
+                outcome = {}
+            for index in batch:
+                grade = outcome.get(index)
+                if grade is None:
+                    results[index] = {"correct": None, "score": None, "feedback": "Correção indisponível no momento",
+                                      "graded_by": "unavailable"}
+                else:
+                    results[index] = {"correct": grade["score"] >= PASSING_SCORE, **grade, "graded_by": "model"}
+
+        for result in results:
+            if result["graded_by"] == "local":
+                self.graded_local += 1
+            elif result["graded_by"] == "model":
+                self.graded_model += 1
+            else:
+                self.unavailable += 1
+        self.upstream_calls += len(batches)
+        if error is not None and all(result["graded_by"] == "unavailable" for result in results):
+            raise error
+        return results, len(batches)
+
+    def stats(self) -> dict:
+        return {
+            "graded_local": self.graded_local,
+            "graded_model": self.graded_model,
+            "unavailable": self.unavailable,
+            "upstream_calls": self.upstream_calls,
+            "answers_per_upstream_call": (
+                round((self.graded_local + self.graded_model) / self.upstream_calls, 2) if self.upstream_calls else None
+            ),
+        }
@@ -0,0 +1,56 @@
+"""
+Cabeçalhos de cache HTTP para as variantes GET
+ETag determinístico pelo hash do conteúdo e suporte a If-None-Match -> 304,
+para que browser/CDN absorvam requisições repetidas.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+
+def compute_etag(body: bytes) -> str:
+    """ETag forte derivado do conteúdo da resposta"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara If-None-Match (lista, '*' ou weak) com o ETag atual"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cache_control(max_age: int, stale_while_revalidate: int) -> str:
+    value = f"public, max-age={max_age}"
+    if stale_while_revalidate > 0:
+        value += f", stale-while-revalidate={stale_while_revalidate}"
+    return value
+
+
+def cacheable_response(
+    request: Request,
+    content: dict,
+    max_age: int,
+    stale_while_revalidate: int = 0,
+    etag: Optional[str] = None,
+) -> Response:
+    """JSONResponse com ETag/Cache-Control; 304 se o cliente já tem a mesma versão
+
+    `etag` substitui o hash da resposta (ex.: ETag de uma seção de documento).
+    """
+    response = JSONResponse(content=content)
+    etag = etag or compute_etag(response.body)
+    # Conteúdo stale (fallback de erro) não deve ficar guardado em caches intermediários
+    control = "no-store" if content.get("stale") else cache_control(max_age, stale_while_revalidate)
+    # Cota e tenant vêm da X-API-Key: caches compartilhados guardam uma cópia por chave
+    headers = {"ETag": etag, "Cache-Control": control, "Vary": "X-API-Key"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
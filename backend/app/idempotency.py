@@ -0,0 +1,145 @@
+"""
+Idempotency-Key para os POST de geração
+Uma nova tentativa com a mesma chave se junta à execução em andamento ou
+recebe a resposta guardada, sem gerar de novo. Reusar a chave com outro
+payload é rejeitado. O armazenamento é limitado em tamanho e expira por TTL.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+
+# 4xx determinísticos: a nova tentativa receberia o mesmo erro
+REPLAYABLE_CLIENT_ERRORS = frozenset({400, 404, 422})
+
+
+def replayable(status_code: int, headers: List[Tuple[bytes, bytes]]) -> bool:
+    """Só guarda o que a retentativa repetiria: 2xx e 4xx determinísticos, nunca com Retry-After (429/503)"""
+    if any(name.lower() == b"retry-after" for name, _ in headers):
+        return False
+    return 200 <= status_code < 300 or status_code in REPLAYABLE_CLIENT_ERRORS
+
+
+class StoredResponse:
+    __slots__ = ("status_code", "headers", "body")
+
+    def __init__(self, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "created_at", "done", "response", "hold")
+
+    def __init__(self, fingerprint: str, created_at: float, hold: Any = None):
+        self.fingerprint = fingerprint
+        self.created_at = created_at
+        self.done = asyncio.Event()
+        self.response: Optional[StoredResponse] = None
+        self.hold = hold  # hold()/release(): retentativas aguardando mantêm a execução original viva
+
+
+class IdempotencyConflict(Exception):
+    """Chave já usada com um payload diferente"""
+
+
+def fingerprint(method: str, path: str, query: str, body: bytes) -> str:
+    """Hash da requisição (método, rota, query e corpo) associado à chave"""
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query.encode(), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """Execuções por chave: em andamento (aguardáveis) ou concluídas (reexibíveis)"""
+
+    def __init__(self, ttl_seconds: float = 86400.0, max_entries: int = 10000, clock: Callable[[], float] = time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.replayed = 0
+        self.attached = 0
+        self.conflicts = 0
+        self.evicted = 0
+
+    def _expire(self) -> None:
+        now = self._clock()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.created_at < self.ttl_seconds:
+                break
+            if entry.response is None and not entry.done.is_set():
+                break  # em andamento: sai quando terminar
+            self._entries.popitem(last=False)
+
+    def _evict(self) -> None:
+        """Descarta as entradas concluídas mais antigas acima do limite"""
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._entries[key].done.is_set():
+                del self._entries[key]
+                self.evicted += 1
+
+    async def begin(self, key: str, request_fingerprint: str, hold: Any = None) -> Optional[StoredResponse]:
+        """Resposta a reexibir, ou None se o chamador deve executar (e depois chamar finish)
+
+        `hold` (opcional) é seguro por quem se junta à execução deste chamador
+        enquanto aguarda, para que ela não seja abandonada no meio.
+        """
+        while True:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = _Entry(request_fingerprint, self._clock(), hold)
+                self._evict()
+                return None
+            if entry.fingerprint != request_fingerprint:
+                self.conflicts += 1
+                raise IdempotencyConflict(key)
+            if not entry.done.is_set():
+                self.attached += 1
+                if entry.hold is not None:
+                    entry.hold.hold()
+                try:
+                    await entry.done.wait()
+                finally:
+                    if entry.hold is not None:
+                        entry.hold.release()
+                if entry.response is None:
+                    continue  # a execução original falhou: esta tentativa executa
+            else:
+                self.replayed += 1
+            return entry.response
+
+    def finish(self, key: str, response: Optional[StoredResponse]) -> None:
+        """Conclui a execução; sem resposta (erro transitório) a chave fica livre para nova tentativa"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        if response is None:
+            del self._entries[key]
+        else:
+            entry.response = response
+        entry.done.set()
+
+    def stats(self) -> dict:
+        self._expire()
+        in_flight = sum(1 for entry in self._entries.values() if not entry.done.is_set())
+        return {
+            "entries": len(self._entries),
+            "in_flight": in_flight,
+            "replayed": self.replayed,
+            "attached": self.attached,
+            "conflicts": self.conflicts,
+            "evicted": self.evicted,
+        }
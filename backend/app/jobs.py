@@ -0,0 +1,322 @@
+"""
+Fila de jobs assíncronos para gerações longas
+Jobs ficam persistidos em SQLite (sobrevivem a restarts), são deduplicados
+pelo hash da requisição e expiram conforme a política de retenção.
+Vários processos podem dividir o mesmo banco: a reserva de um job é
+atômica e quem o executa renova um lease (updated_at); só jobs com o
+lease vencido (processo morto) voltam para a fila.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, Optional, Set
+
+from app.logging_setup import current_request_id
+from app.tenants import BACKGROUND, DEFAULT_TENANT, tenant_context
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TERMINAL_STATUSES = (DONE, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    tenant TEXT NOT NULL DEFAULT 'public',
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_hash ON jobs (request_hash, status);
+"""
+
+
+class JobStore:
+    """Persistência dos jobs em SQLite"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def _migrate(self) -> None:
+        """Adiciona colunas novas em bancos criados por versões anteriores"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "tenant" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT 'public'")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Transação com o lock de escrita do banco (exclui outros processos)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _to_dict(self, row: Optional[sqlite3.Row]) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def _find_active(self, conn: sqlite3.Connection, request_hash: str) -> Optional[sqlite3.Row]:
+        return conn.execute(
+            "SELECT * FROM jobs WHERE request_hash = ? AND status != ? ORDER BY created_at DESC LIMIT 1",
+            (request_hash, FAILED),
+        ).fetchone()
+
+    def find_active(self, request_hash: str) -> Optional[dict]:
+        """Job não falho com o mesmo hash (usado para deduplicação)"""
+        with self._lock:
+            row = self._find_active(self._conn, request_hash)
+        return self._to_dict(row)
+
+    def _insert(
+        self, conn: sqlite3.Connection, kind: str, request_hash: str, payload: dict, priority: int, tenant: str
+    ) -> str:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, kind, request_hash, payload, priority, tenant, status, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, request_hash, json.dumps(payload), priority, tenant, QUEUED, now, now),
+        )
+        return job_id
+
+    def insert(self, kind: str, request_hash: str, payload: dict, priority: int, tenant: str = DEFAULT_TENANT) -> dict:
+        with self._lock:
+            job_id = self._insert(self._conn, kind, request_hash, payload, priority, tenant)
+        return self.get(job_id)
+
+    def insert_unless_active(
+        self, kind: str, request_hash: str, payload: dict, priority: int, tenant: str = DEFAULT_TENANT
+    ) -> tuple:
+        """(job, criado): deduplicação e inserção na mesma transação"""
+        with self._transaction() as conn:
+            existing = self._find_active(conn, request_hash)
+            job_id = existing["id"] if existing is not None else self._insert(
+                conn, kind, request_hash, payload, priority, tenant
+            )
+        return self.get(job_id), existing is None
+
+    def claim_next(self) -> Optional[dict]:
+        """Marca como running e retorna o job de maior prioridade (FIFO no empate)"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), row["id"], QUEUED),
+            ).rowcount
+        return self.get(row["id"]) if claimed else None
+
+    def heartbeat(self, job_ids: Iterable[str]) -> None:
+        """Renova o lease dos jobs que este processo está executando"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?",
+                [(now, job_id, RUNNING) for job_id in job_ids],
+            )
+
+    def finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        status = FAILED if error is not None else DONE
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, now, now, job_id),
+            )
+
+    def requeue_running(self, stale_before: Optional[float] = None) -> int:
+        """Recoloca na fila jobs running cujo lease venceu antes de `stale_before` (None = todos)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, time.time(), RUNNING, float("inf") if stale_before is None else stale_before),
+            )
+        return cursor.rowcount
+
+    def purge_finished(self, older_than: float) -> int:
+        """Remove jobs terminados antes do timestamp informado"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (older_than,),
+            )
+        return cursor.rowcount
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+
+class JobQueue:
+    """Fila de prioridade persistente com pool de workers asyncio"""
+
+    def __init__(
+        self,
+        db_path: str,
+        handlers: Dict[str, JobHandler],
+        workers: int = 2,
+        retention_seconds: float = 86400.0,
+        poll_interval: float = 1.0,
+        key_fn: Optional[Callable[[str, dict], str]] = None,
+        lease_seconds: float = 60.0,
+    ):
+        self.db_path = db_path
+        self.handlers = handlers
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self.key_fn = key_fn or (lambda kind, payload: json.dumps([kind, payload], sort_keys=True))
+        self.lease_seconds = lease_seconds
+        self.store: Optional[JobStore] = None
+        self._tasks: list = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._listeners: Dict[str, Set[asyncio.Queue]] = {}
+        self._running: Set[str] = set()
+
+    async def start(self) -> None:
+        """Abre o banco, recupera jobs interrompidos e inicia os workers"""
+        self.store = JobStore(self.db_path)
+        self.store.requeue_running(time.time() - self.lease_seconds)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+        self._tasks.append(asyncio.create_task(self._keep_leases()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            # Jobs interrompidos voltam para a fila no próximo start
+            self.store.close()
+            self.store = None
+
+    def submit(self, kind: str, payload: dict, priority: int = 0, tenant: str = DEFAULT_TENANT) -> tuple:
+        """Enfileira um job; retorna (job, criado) - criado=False quando deduplicado"""
+        if kind not in self.handlers:
+            raise KeyError(kind)
+        job, created = self.store.insert_unless_active(kind, self.key_fn(kind, payload), payload, priority, tenant)
+        if created:
+            self._wakeup.set()
+        return job, created
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Fila de eventos de progresso de um job (para SSE)"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        listeners = self._listeners.get(job_id)
+        if listeners is not None:
+            listeners.discard(queue)
+            if not listeners:
+                del self._listeners[job_id]
+
+    def _publish(self, job_id: str, event: dict) -> None:
+        for queue in self._listeners.get(job_id, ()):
+            queue.put_nowait(event)
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            job = self.store.claim_next()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._running.add(job["id"])
+            try:
+                await self._run(job)
+            finally:
+                self._running.discard(job["id"])
+
+    async def _run(self, job: dict) -> None:
+        job_id = job["id"]
+        current_request_id.set(f"job-{job_id}")  # correlaciona os logs da geração com o job
+        started = time.monotonic()
+        self._publish(job_id, {"status": RUNNING})
+        try:
+            # Jobs usam a lane de background do tenant que os enviou
+            with tenant_context(job["tenant"], BACKGROUND):
+                result = await self.handlers[job["kind"]](job["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Não expõe a exceção crua; HTTPException já traz uma mensagem segura
+            error = str(getattr(e, "detail", None) or "Falha ao processar o job")
+            logger.warning("Job failed", extra={"job_kind": job["kind"], "error": repr(e)})
+            self.store.finish(job_id, error=error)
+            self._publish(job_id, {"status": FAILED, "error": error})
+            return
+        self.store.finish(job_id, result=result)
+        self._publish(job_id, {"status": DONE, "elapsed_seconds": round(time.monotonic() - started, 3)})
+
+    async def _janitor(self) -> None:
+        while True:
+            self.store.purge_finished(time.time() - self.retention_seconds)
+            await asyncio.sleep(min(max(self.retention_seconds / 10, 1.0), 300.0))
+
+    async def _keep_leases(self) -> None:
+        """Renova os leases deste processo e devolve à fila os de processos que pararam"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            self.store.heartbeat(self._running)
+            requeued = self.store.requeue_running(time.time() - self.lease_seconds)
+            if requeued:
+                logger.warning("Requeued %d jobs with expired lease", requeued)
+                self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {status: self.store.count(status) for status in (QUEUED, RUNNING, DONE, FAILED)}
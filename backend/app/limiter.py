@@ -0,0 +1,135 @@
+"""
+Limite de concorrência adaptativo (load shedding)
+O limite de chamadas upstream simultâneas é ajustado pela latência
+observada: cai multiplicativamente quando a latência passa do alvo (ou há
+erro) e cresce aos poucos enquanto ela fica abaixo. Acima do limite a
+requisição é recusada na hora, em vez de esperar numa fila sem fim.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Requisição recusada porque o limite de concorrência foi atingido"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Concurrency limit reached, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Limite de concorrência por gradiente de latência (AIMD suavizado)"""
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        target_latency: float = 8.0,
+        smoothing: float = 0.2,
+        backoff: float = 0.9,
+        ewma_alpha: float = 0.2,
+        history: int = 100,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.ewma_alpha = ewma_alpha
+        self._clock = clock
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._latency_ewma = None
+        self.accepted = 0
+        self.shed = 0
+        self.increases = 0
+        self.decreases = 0
+        # (timestamp, limite) a cada mudança do limite inteiro
+        self._changes: deque = deque(maxlen=history)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def retry_after(self) -> float:
+        """Estimativa de quando uma vaga deve abrir (latência típica atual)"""
+        return max(1.0, self._latency_ewma or self.target_latency)
+
+    def acquire(self) -> None:
+        """Ocupa uma vaga ou levanta ConcurrencyLimitExceeded imediatamente"""
+        if self._in_flight >= self.limit:
+            self.shed += 1
+            raise ConcurrencyLimitExceeded(self.retry_after())
+        self._in_flight += 1
+        self.accepted += 1
+
+    def release(self, latency: Optional[float], ok: bool = True) -> None:
+        """Libera a vaga e ajusta o limite pela latência da chamada (None = não ajusta)"""
+        in_flight = self._in_flight
+        self._in_flight -= 1
+        if latency is None:
+            return
+        before = self.limit
+        if not ok or latency > self.target_latency:
+            self._limit = max(self.min_limit, self._limit * self.backoff)
+        else:
+            self._latency_ewma = latency if self._latency_ewma is None else (
+                self.ewma_alpha * latency + (1 - self.ewma_alpha) * self._latency_ewma
+            )
+            # Só cresce se o limite estava de fato sendo usado (evita inflar com tráfego baixo)
+            if in_flight * 2 >= self._limit:
+                gradient = min(1.0, self.target_latency / max(self._latency_ewma, 1e-6))
+                proposed = self._limit * gradient + math.sqrt(self._limit)
+                self._limit = min(self.max_limit, (1 - self.smoothing) * self._limit + self.smoothing * proposed)
+        if self.limit != before:
+            if self.limit > before:
+                self.increases += 1
+            else:
+                self.decreases += 1
+            self._changes.append((round(self._clock(), 3), self.limit))
+
+    @contextmanager
+    def guard(self, neutral: tuple = ()):
+        """Executa o bloco ocupando uma vaga; erro ou latência alta reduzem o limite
+
+        Exceções em `neutral` (ex.: circuito aberto, recusa antes do upstream)
+        liberam a vaga sem contar como erro.
+        """
+        self.acquire()
+        start = self._clock()
+        try:
+            yield
+        except (asyncio.CancelledError, *neutral):
+            self.release(None)  # cliente desistiu: não diz nada sobre a saúde do upstream
+            raise
+        except BaseException:
+            self.release(self._clock() - start, ok=False)
+            raise
+        self.release(self._clock() - start)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "target_latency_ms": round(self.target_latency * 1000),
+            "latency_ewma_ms": round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+            "accepted": self.accepted,
+            "shed": self.shed,
+            "limit_increases": self.increases,
+            "limit_decreases": self.decreases,
+            "recent_limit_changes": list(self._changes)[-10:],
+        }
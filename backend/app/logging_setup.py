@@ -0,0 +1,159 @@
+"""
+Pipeline de logs estruturados (JSON) sem bloquear o event loop
+O handler da aplicação só enfileira o registro (com o request ID da
+requisição atual); formatação e I/O acontecem numa thread do QueueListener.
+Logs de sucesso de alto volume podem ser amostrados.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+
+# Atributos padrão do LogRecord; o resto veio de `extra=` e vai para o JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sampled"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Mantém só uma fração dos registros marcados com extra={"sampled": True}"""
+
+    def __init__(self, rate: float = 1.0, rng: random.Random = None):
+        super().__init__()
+        self.rate = rate
+        self._rng = rng or random.Random()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.rate >= 1.0:
+            return True
+        if self._rng.random() < self.rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Enfileira sem formatar; descarta (e conta) se a fila estiver cheia"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+        self._emit_seconds = 0.0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Só o que depende da thread/contexto atual; a mensagem é formatada no listener
+        record.request_id = current_request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord) -> None:
+        start = time.perf_counter()
+        super().emit(record)
+        self._emit_seconds += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "pending": self.queue.qsize(),
+            "avg_emit_us": round(self._emit_seconds / self.enqueued * 1e6, 2) if self.enqueued else None,
+        }
+
+
+class LoggingPipeline:
+    """Handler da fila + listener em background, instalados no logger raiz"""
+
+    def __init__(
+        self,
+        handler: AsyncQueueHandler,
+        listener: logging.handlers.QueueListener,
+        sampler: SamplingFilter,
+        previous: Optional[tuple] = None,
+    ):
+        self.handler = handler
+        self.listener = listener
+        self.sampler = sampler
+        self._previous = previous  # (handlers, level) do logger raiz antes do pipeline
+        self._stopped = False
+
+    def stop(self) -> None:
+        """Devolve o logger raiz como estava, esvazia a fila e encerra a thread do listener (idempotente)"""
+        if self._stopped:
+            return
+        self._stopped = True
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+        if self._previous is not None:
+            handlers, level = self._previous
+            for handler in handlers:
+                root.addHandler(handler)
+            root.setLevel(level)
+        self.listener.stop()
+
+    def stats(self) -> dict:
+        return {**self.handler.stats(), "sampled_out": self.sampler.dropped, "sample_rate": self.sampler.rate}
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    sample_rate: float = 1.0,
+    queue_size: int = 10000,
+    stream=None,
+) -> LoggingPipeline:
+    """Substitui os handlers do logger raiz pelo pipeline em fila (até o stop)"""
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(
+        JsonFormatter() if fmt == "json" else logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+    )
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    handler = AsyncQueueHandler(log_queue)
+    sampler = SamplingFilter(sample_rate)
+    handler.addFilter(sampler)  # amostragem antes de enfileirar: o descarte custa quase nada
+
+    root = logging.getLogger()
+    previous = (list(root.handlers), root.level)
+    for existing in previous[0]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return LoggingPipeline(handler, listener, sampler, previous)
@@ -1,35 +1,208 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
 import google.generativeai as genai
 import os
-from typing import List, Optional
+import json
+import asyncio
+import time
+import uuid
+from typing import Annotated, Callable, List, Optional
 import logging
-from dotenv import load_dotenv
-from pathlib import Path
 
-# Load environment variables from .env file
-# Get the directory where this script is located
-current_dir = Path(__file__).parent.parent  # Go up to backend directory
-env_path = current_dir / '.env'
-load_dotenv(dotenv_path=env_path)
+from app.config import ENV_PATH as env_path, settings
+from app.logging_setup import LoggingPipeline, current_request_id, setup_logging
+from app.cache import ResponseCache
+from app.capture import Anonymizer, TrafficCapture
+from app.content_store import ContentStore, ContentWriter
+from app.documents import DocumentStore
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.disconnect import (
+    CLIENT_CLOSED_REQUEST, ClientDisconnected, DisconnectHold, DisconnectWatcher, InFlight, current_disconnect,
+    until_disconnected,
+)
+from app.limiter import AdaptiveLimiter, ConcurrencyLimitExceeded
+from app.upstream import UpstreamClient
+from app.transport import ModelPool
+from app.profiles import ProfileRegistry, load_profiles, output_tokens
+from app.tenants import TenantRegistry, current_client, current_tenant
+from app.scheduler import FairScheduler
+from app.jobs import JobQueue, TERMINAL_STATUSES
+from app.prompts import StudyPrompts
+from app.quota import QuotaTracker
+from app.usage import UsageLedger
+from app.http_cache import cacheable_response
+from app.idempotency import IdempotencyConflict, IdempotencyStore, StoredResponse, fingerprint, replayable
+from app.prefetch import PrefetchEngine
+from app.question_pool import (
+    QUESTION_ITEMS_SCHEMA, QuestionItem, QuestionPool, PoolRefiller, pool_key, parse_question_items, render_question
+)
+from app.quiz import QuizPacker
+from app.review import ReviewScheduler, ReviewStore, quality_of
+from app.study_plan import PLAN_CONTENT_SCHEMA, build_skeleton, merge_plan, parse_plan_content, render_plan
+from app.grading import (
+    GRADES_SCHEMA, OPEN_ENDED, AnswerKeyStore, GradingEngine, parse_grades, question_id, question_type_of
+)
 
-# Debug: Print if .env file was found
+# Logs JSON em fila (formatação e I/O numa thread separada do event loop), instalados no lifespan
+log_pipeline: Optional[LoggingPipeline] = None
+logger = logging.getLogger(__name__)
+
+# Debug: registra se o .env foi encontrado
 if env_path.exists():
-    print(f"✅ Arquivo .env encontrado em: {env_path}")
+    logger.info("✅ Arquivo .env encontrado em: %s", env_path)
 else:
-    print(f"❌ Arquivo .env NÃO encontrado em: {env_path}")
+    logger.info("❌ Arquivo .env NÃO encontrado em: %s", env_path)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicia e encerra os serviços em background (fila de jobs, refill do pool de questões)"""
+    global log_pipeline
+    if settings.LOG_CONFIGURE:
+        log_pipeline = setup_logging(
+            settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLE_RATE, settings.LOG_QUEUE_SIZE
+        )
+    owns_stores = content_store is None  # já abertos = testes (o conftest cuida deles)
+    if owns_stores:
+        open_stores()
+    # Aquece as conexões antes de aceitar tráfego (o health check só responde depois do startup)
+    if isinstance(model, ModelPool):
+        await model.warm_up(timeout=settings.UPSTREAM_WARMUP_TIMEOUT_SECONDS)
+    await job_queue.start()
+    content_writer.start()
+    usage.start()
+    capture.start()
+    if not (is_ci or skip_api_validation):
+        pool_refiller.start()
+    try:
+        yield
+    finally:
+        await pool_refiller.stop()
+        await job_queue.stop()
+        await content_writer.stop()
+        await usage.stop()
+        await capture.stop()
+        if isinstance(model, ModelPool):
+            await model.close()
+        if owns_stores:
+            close_stores()
+        if log_pipeline is not None:
+            log_pipeline.stop()
+            log_pipeline = None
 
 app = FastAPI(
     title="IsCoolGPT - Assistente Virtual de Estudos",
     description="Um assistente inteligente para ajudar nos seus estudos usando Google Gemini",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Idempotency-Key nos POST: retentativas do cliente não disparam uma nova geração
+idempotency = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS, max_entries=settings.IDEMPOTENCY_MAX_ENTRIES
 )
 
+# Streams SSE passam direto: não são bufferizados, guardados nem reexibidos
+STREAMING_PATHS = frozenset({"/explain/stream"})
+
+# Registrado antes de identify_tenant para rodar dentro dele (já com o tenant no contexto)
+@app.middleware("http")
+async def idempotent_posts(request: Request, call_next):
+    """Reexibe ou aguarda a execução original de um POST com a mesma Idempotency-Key"""
+    key = request.headers.get("idempotency-key")
+    if request.method != "POST" or not key or request.url.path in STREAMING_PATHS:
+        return await call_next(request)
+    if len(key) > 255:
+        return JSONResponse(status_code=400, content={"detail": "Idempotency-Key muito longa (máx. 255)"})
+
+    scoped_key = f"{current_tenant.get()}:{key}"
+    request_fingerprint = fingerprint(request.method, request.url.path, request.url.query, await request.body())
+    disconnect = current_disconnect.get()
+    # Retentativas que aguardam esta execução seguram o disconnect dela (não cancelam a geração)
+    hold = DisconnectHold(disconnect) if disconnect is not None else None
+    try:
+        stored = await until_disconnected(idempotency.begin(scoped_key, request_fingerprint, hold))
+    except (IdempotencyConflict, ClientDisconnected) as e:
+        if hold is not None:
+            hold.close()
+        if isinstance(e, ClientDisconnected):
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+        return JSONResponse(
+            status_code=422, content={"detail": "Idempotency-Key já usada com outra requisição"}
+        )
+    if stored is not None:
+        if hold is not None:
+            hold.close()
+        response = stored_response(stored)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    token = current_disconnect.set(hold.event) if hold is not None else None
+    try:
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    except BaseException:
+        idempotency.finish(scoped_key, None)
+        raise
+    finally:
+        if hold is not None:
+            current_disconnect.reset(token)
+            hold.close()
+    # Erros transitórios (5xx, 429, recusas com Retry-After, cliente desconectado) não ficam guardados
+    headers = [(k, v) for k, v in response.raw_headers if k.lower() != b"content-length"]
+    result = StoredResponse(response.status_code, headers, body)
+    idempotency.finish(scoped_key, result if replayable(response.status_code, headers) else None)
+    return stored_response(result)
+
+def stored_response(stored: StoredResponse) -> Response:
+    """Resposta a partir do corpo/cabeçalhos guardados (Content-Length recalculado pelo Response)"""
+    response = Response(content=stored.body, status_code=stored.status_code)
+    for name, value in stored.headers:
+        response.headers.append(name.decode("latin-1"), value.decode("latin-1"))
+    return response
+
+# Captura de tráfego (opt-in): amostra anonimizada com os instantes de chegada, para replay
+capture = TrafficCapture(
+    settings.CAPTURE_DIR,
+    Anonymizer(settings.CAPTURE_SALT),
+    paths=[path.strip() for path in settings.CAPTURE_PATHS.split(",") if path.strip()],
+    enabled=settings.CAPTURE_ENABLED,
+    sample_rate=settings.CAPTURE_SAMPLE_RATE,
+    max_file_bytes=int(settings.CAPTURE_MAX_FILE_MB * 1024 * 1024),
+    max_files=settings.CAPTURE_MAX_FILES,
+)
+
+# Dentro de identify_tenant: requisições com API key inválida não entram na amostra
+@app.middleware("http")
+async def capture_traffic(request: Request, call_next):
+    """Grava uma amostra das requisições de geração (payload anonimizado e instante de chegada)"""
+    if capture.wants(request.method, request.url.path):
+        capture.record(
+            request.method,
+            request.url.path,
+            dict(request.query_params),
+            await request.body(),
+            client=request.headers.get("x-client-id"),
+        )
+    return await call_next(request)
+
+# Tenants (escolas) identificados por API key
+tenants = TenantRegistry.from_json(
+    settings.TENANTS, default_weight=settings.TENANT_DEFAULT_WEIGHT, default_burst=settings.TENANT_DEFAULT_BURST
+)
+
+@app.middleware("http")
+async def identify_tenant(request: Request, call_next):
+    """Associa a requisição ao tenant da X-API-Key (sem chave = tenant público)"""
+    tenant = tenants.resolve(request.headers.get("x-api-key"))
+    if tenant is None:
+        return JSONResponse(status_code=401, content={"detail": "API key inválida"})
+    current_tenant.set(tenant.name)
+    current_client.set(request.headers.get("x-client-id"))
+    return await call_next(request)
+
 # Configure CORS for frontend integration
 app.add_middleware(
     CORSMiddleware,
@@ -37,8 +210,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "Idempotent-Replayed", "X-Request-ID"],
 )
 
+# Registrado por último = middleware mais externo: todo log da requisição leva o request ID
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Correlation ID (X-Request-ID) e log de acesso; sucessos rápidos são amostrados"""
+    request_id = (request.headers.get("x-request-id") or uuid.uuid4().hex)[:128]
+    current_request_id.set(request_id)
+    start = time.monotonic()
+    response = await call_next(request)
+    duration_ms = round((time.monotonic() - start) * 1000, 1)
+    response.headers["X-Request-ID"] = request_id
+    routine = response.status_code < 400 and duration_ms < settings.LOG_SLOW_REQUEST_MS
+    logger.log(
+        logging.WARNING if response.status_code >= 500 else logging.INFO,
+        "request",
+        extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "duration_ms": duration_ms,
+            "sampled": routine,
+        },
+    )
+    return response
+
+# Fora de todos: detecta o cliente fechando a conexão enquanto o endpoint espera o upstream
+app.add_middleware(DisconnectWatcher)
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected(request: Request, exc: ClientDisconnected):
+    """Ninguém lê esta resposta; o status só aparece no log de acesso"""
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
 # Configure Gemini
 api_key = os.getenv("GEMINI_API_KEY")
 is_ci = os.getenv("CI", "false").lower() == "true"
@@ -49,9 +255,9 @@ if not api_key and not (is_ci or skip_api_validation):
     raise ValueError("GEMINI_API_KEY environment variable is required")
 
 if is_ci or skip_api_validation:
-    print(f"🧪 Modo CI/Teste - API Key validation pulada")
+    logger.info("🧪 Modo CI/Teste - API Key validation pulada")
 else:
-    print(f"🔑 API Key: OK")
+    logger.info("🔑 API Key: OK")
     genai.configure(api_key=api_key)
 
 # Configure generation settings optimized for Gemini 2.0 Flash-Lite
@@ -64,17 +270,111 @@ generation_config = {
 
 # Usar modelo otimizado para free tier
 model_name = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-lite")
-print(f"🤖 Modelo: {model_name}")
+logger.info("🤖 Modelo: %s", model_name)
 
 # Inicializar modelo apenas se não estiver no CI
 if not (is_ci or skip_api_validation):
-    model = genai.GenerativeModel(
+    # Pool com conexões persistentes (gRPC ou REST), aquecido no startup
+    model = ModelPool(
         model_name,
-        generation_config=generation_config
+        generation_config,
+        api_key,
+        transport=settings.GEMINI_TRANSPORT,
+        pool_size=settings.UPSTREAM_POOL_SIZE,
+        keepalive_seconds=settings.UPSTREAM_KEEPALIVE_SECONDS,
+        endpoint=settings.GEMINI_API_ENDPOINT,
+        insecure=settings.GEMINI_API_INSECURE,
     )
+    logger.info("🔌 Transporte: %s (pool de %d conexões)", settings.GEMINI_TRANSPORT, settings.UPSTREAM_POOL_SIZE)
 else:
     model = None  # No CI, não precisamos do modelo real
 
+# Circuit breaker + cache: falha rápido quando o Gemini degrada e serve respostas stale
+breaker = CircuitBreaker(
+    window_seconds=settings.BREAKER_WINDOW_SECONDS,
+    min_requests=settings.BREAKER_MIN_REQUESTS,
+    error_rate_threshold=settings.BREAKER_ERROR_RATE,
+    slow_call_seconds=settings.BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=settings.BREAKER_OPEN_SECONDS,
+)
+response_cache = ResponseCache(
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+    stale_ttl_seconds=settings.CACHE_STALE_TTL_SECONDS,
+    max_entries=settings.CACHE_MAX_ENTRIES,
+)
+quota = QuotaTracker(rpm=settings.QUOTA_RPM, rpd=settings.QUOTA_RPD)
+# Fila justa por tenant na frente do upstream (lanes interativa e background)
+scheduler = FairScheduler(
+    tenants.policies(),
+    tenants.default,
+    concurrency=settings.UPSTREAM_CONCURRENCY,
+    rate_per_minute=settings.QUOTA_RPM,
+)
+# Limite adaptativo: com o upstream lento, o excesso é recusado na hora (503) em vez de enfileirar
+limiter = AdaptiveLimiter(
+    initial_limit=settings.LIMITER_INITIAL,
+    min_limit=settings.LIMITER_MIN,
+    max_limit=settings.LIMITER_MAX,
+    target_latency=settings.LIMITER_TARGET_LATENCY_SECONDS,
+) if settings.LIMITER_ENABLED else None
+upstream = UpstreamClient(
+    model, breaker, timeout=settings.UPSTREAM_TIMEOUT_SECONDS, quota=quota, scheduler=scheduler, limiter=limiter
+)
+
+# Perfis de geração por endpoint (modelo, temperatura, limite de tokens)
+profiles = ProfileRegistry(
+    load_profiles(settings.GENERATION_PROFILES),
+    adaptive=settings.ADAPTIVE_MAX_TOKENS,
+    headroom=settings.ADAPTIVE_HEADROOM,
+    min_samples=settings.ADAPTIVE_MIN_SAMPLES,
+)
+
+# Stores persistentes: abertos no lifespan (o import não toca o disco; nos testes, o conftest usa tmp_path)
+# Acervo pesquisável: todo conteúdo gerado é gravado em lotes, fora da requisição
+content_store: Optional[ContentStore] = None
+content_writer: Optional[ContentWriter] = None
+# Planos e resumos indexados por seção: o cliente busca só a parte que vai mostrar
+document_store: Optional[DocumentStore] = None
+# Ledger de uso: tokens, latência e status de cache de cada chamada (gravado em lotes)
+usage: Optional[UsageLedger] = None
+# Gabaritos das questões estruturadas (pool e quiz), para a correção em /grade e a revisão
+review_store: Optional[ReviewStore] = None
+answer_keys: Optional[AnswerKeyStore] = None
+# Revisão espaçada: cada correção reagenda a questão para o aluno (SM-2)
+review: Optional[ReviewScheduler] = None
+
+def open_stores() -> None:
+    """Abre os stores nos caminhos do settings"""
+    global content_store, content_writer, document_store, usage, review_store, answer_keys, review
+    content_store = ContentStore(settings.CONTENT_DB_PATH)
+    content_writer = ContentWriter(
+        content_store,
+        batch_size=settings.CONTENT_WRITE_BATCH_SIZE,
+        flush_interval=settings.CONTENT_WRITE_INTERVAL_SECONDS,
+    )
+    document_store = DocumentStore(settings.DOCUMENTS_DB_PATH)
+    usage = UsageLedger(
+        settings.USAGE_LEDGER_DIR,
+        retention_days=settings.USAGE_RETENTION_DAYS,
+        flush_interval=settings.USAGE_WRITE_INTERVAL_SECONDS,
+    )
+    usage.load()
+    review_store = ReviewStore(settings.REVIEW_DB_PATH)
+    answer_keys = AnswerKeyStore(store=review_store, max_inline=settings.REVIEW_MAX_INLINE_KEYS)
+    review = ReviewScheduler(max_students=settings.REVIEW_MAX_STUDENTS, store=review_store)
+    review.load()
+
+def close_stores() -> None:
+    global content_store, content_writer, document_store, usage, review_store, answer_keys, review
+    content_store.close()
+    document_store.close()
+    review_store.close()
+    content_store = content_writer = document_store = usage = None
+    review_store = answer_keys = review = None
+
+# Gerações em andamento: requisições iguais compartilham a chamada, cancelada quando todas desistem
+inflight = InFlight()
+
 # Helper function
 def check_model_available():
     """Verifica se o modelo está disponível (não estamos no CI)"""
@@ -89,6 +389,125 @@ def check_model_available():
             detail="Modelo Gemini não inicializado"
         )
 
+def record_usage(endpoint: str, profile: str, cache: str, result=None, latency: float = 0.0, ok: bool = True) -> None:
+    """Registra a chamada no ledger de uso (tenant da requisição atual)"""
+    usage_metadata = getattr(result, "usage_metadata", None)
+    usage.record(
+        endpoint,
+        profiles.get(profile)[1].model or model_name,
+        current_tenant.get(),
+        cache,
+        prompt_tokens=getattr(usage_metadata, "prompt_token_count", 0) or 0,
+        output_tokens=output_tokens(result) or 0,
+        latency=latency,
+        ok=ok,
+    )
+
+async def generate_with_profile(
+    profile: str, prompt: str, units: int = 0, endpoint: Optional[str] = None, cache: str = "bypass", **extra_config
+):
+    """Chama o upstream com o perfil do endpoint e registra o tamanho da saída e o uso"""
+    model_override, config = profiles.resolve(profile, units)
+    config.update(extra_config)
+    start = time.monotonic()
+    try:
+        result = await upstream.generate(prompt, generation_config=config, model_name=model_override)
+    except (CircuitOpenError, ConcurrencyLimitExceeded):
+        raise  # recusada antes de chegar ao upstream
+    except Exception:
+        record_usage(endpoint or profile, profile, cache, latency=time.monotonic() - start, ok=False)
+        raise
+    record_usage(endpoint or profile, profile, cache, result, latency=time.monotonic() - start)
+    profiles.observe(profile, result, units=units, cap=config["max_output_tokens"])
+    return result
+
+async def generate_cached(
+    endpoint: str,
+    payload: dict,
+    prompt: str,
+    profile: str = "generate",
+    units: int = 0,
+    record: Optional[dict] = None,
+    reuse: bool = False,
+    render: Optional[Callable[[str], str]] = None,
+    **extra_config,
+) -> dict:
+    """Gera o texto com cache; se o Gemini falhar, serve a última resposta (mesmo expirada)
+
+    `record` (title, subject, match) grava o resultado no acervo; com `reuse`,
+    um conteúdo equivalente já gravado é devolvido sem chamar o modelo.
+    `render` converte a resposta do modelo (ex.: JSON) no texto gravado no acervo.
+    `extra_config` vai para a generation_config (ex.: response_mime_type).
+    """
+    key = response_cache.make_key(endpoint, payload)
+    cached = response_cache.get(key)
+    if cached is not None:
+        prefetcher.claim(key)
+        record_usage(endpoint, profile, "hit")
+        return {"text": cached}
+
+    if reuse and record is not None:
+        stored = content_store.find_reusable(endpoint, record["title"], record.get("subject"), record.get("match"))
+        if stored is not None:
+            record_usage(endpoint, profile, "reuse")
+            return {"text": stored["body"], "reused_content_id": stored["id"]}
+
+    async def fill():
+        result = await generate_with_profile(profile, prompt, units, endpoint=endpoint, cache="miss", **extra_config)
+        response_cache.set(key, result.text)
+        if record is not None:
+            body = render(result.text) if render is not None else result.text
+            content_writer.submit(endpoint, record["title"], body, subject=record.get("subject"), payload=payload)
+        return result
+
+    joined = key in inflight
+    try:
+        result = await inflight.run(key, fill, expected_tokens=profiles.expected_tokens(profile, units))
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        stale = response_cache.get_stale(key)
+        if stale is not None:
+            logger.warning("Upstream failed for %s, serving stale response: %r", endpoint, e)
+            record_usage(endpoint, profile, "stale")
+            text, age = stale
+            return {"text": text, "stale": True, "stale_age_seconds": int(age)}
+        raise upstream_http_error(endpoint, e)
+
+    if joined:
+        record_usage(endpoint, profile, "coalesced")
+    return {"text": result.text}
+
+def upstream_http_error(endpoint: str, e: Exception) -> HTTPException:
+    """Traduz a falha de uma chamada upstream para a resposta HTTP adequada"""
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail="Serviço de IA temporariamente indisponível. Tente novamente em instantes.",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
+    if isinstance(e, ConcurrencyLimitExceeded):
+        return HTTPException(
+            status_code=503,
+            detail="Servidor sobrecarregado. Tente novamente em instantes.",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
+    logger.error("Upstream error on %s: %r", endpoint, e)
+    return HTTPException(status_code=502, detail="Falha ao gerar resposta com o serviço de IA")
+
+async def index_document(kind: str, title: str, text: str) -> dict:
+    """Grava o índice de seções do documento e devolve os campos de resposta (vazio se falhar)"""
+    try:
+        saved = await asyncio.to_thread(document_store.save, kind, title, text)
+    except Exception as e:
+        logger.error("Document index write failed for %s: %r", kind, e)
+        return {}
+    return {"document_id": saved["document_id"], "document_sections": saved["sections"]}
+
+def stale_fields(generated: dict) -> dict:
+    """Campos extras de resposta indicando que o conteúdo veio stale do cache"""
+    return {k: v for k, v in generated.items() if k != "text"}
+
 # Pydantic models
 class Prompt(BaseModel):
     content: str = Field(..., description="The prompt content to send to Gemini")
@@ -107,8 +526,8 @@ class ExplanationRequest(BaseModel):
 
 class StudyPlanRequest(BaseModel):
     subject: str = Field(..., description="Subject to study")
-    duration_weeks: int = Field(..., description="Study duration in weeks")
-    daily_hours: int = Field(..., description="Available daily study hours")
+    duration_weeks: int = Field(..., ge=1, le=settings.MAX_STUDY_PLAN_WEEKS, description="Study duration in weeks")
+    daily_hours: int = Field(..., ge=1, le=settings.MAX_DAILY_HOURS, description="Available daily study hours")
     current_level: str = Field("beginner", description="Current knowledge level")
 
 @app.get("/")
@@ -121,7 +540,8 @@ async def health_check():
     return {
         "status": "healthy", 
         "service": "IsCoolGPT", 
-        "api_configured": bool(os.getenv("GEMINI_API_KEY"))
+        "api_configured": bool(os.getenv("GEMINI_API_KEY")),
+        "upstream_circuit": breaker.state
     }
 
 @app.get("/health/full")
@@ -130,13 +550,41 @@ async def full_health_check():
     if is_ci or skip_api_validation:
         return {"status": "healthy", "mode": "CI/Test", "gemini_connection": "skipped"}
     
+    start = time.monotonic()
     try:
-        # Test Gemini connection with timeout
-        test_response = model.generate_content("Test", request_options={"timeout": 10})
-        return {"status": "healthy", "gemini_connection": "ok", "test_response": bool(test_response.text)}
+        # Pelo UpstreamClient: o teste respeita breaker, limiter e cota e entra no ledger de uso
+        test_response = await upstream.generate("Test", timeout=10)
     except Exception as e:
-        logger.error(f"Full health check failed: {e}")
+        if not isinstance(e, (CircuitOpenError, ConcurrencyLimitExceeded)):
+            record_usage("/health/full", "generate", "bypass", latency=time.monotonic() - start, ok=False)
+        logger.error("Full health check failed: %r", e)
         return {"status": "degraded", "gemini_connection": "error", "error": str(e)}
+    record_usage("/health/full", "generate", "bypass", test_response, latency=time.monotonic() - start)
+    return {"status": "healthy", "gemini_connection": "ok", "test_response": bool(test_response.text)}
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas internas (não consome cota)"""
+    return {
+        "upstream_circuit": breaker.snapshot(),
+        "quota": quota.snapshot(),
+        "response_cache": {"entries": len(response_cache)},
+        "question_pool": question_pool.stats(),
+        "generation_profiles": profiles.stats(),
+        "scheduler": scheduler.stats(),
+        "concurrency_limit": limiter.snapshot() if limiter is not None else None,
+        "prefetch": prefetcher.stats(),
+        "content_store": content_writer.stats(),
+        "documents": document_store.stats(),
+        "usage_ledger": usage.stats(),
+        "quiz": quiz_packer.stats(),
+        "idempotency": idempotency.stats(),
+        "disconnects": inflight.stats(),
+        "traffic_capture": capture.stats(),
+        "grading": grader.stats(),
+        "review": review.stats(),
+        "logging": log_pipeline.stats() if log_pipeline is not None else None,
+    }
 
 @app.get("/models")
 async def list_available_models():
@@ -182,7 +630,7 @@ async def list_available_models():
         }
         
     except Exception as e:
-        logger.error(f"Error listing models: {e}")
+        logger.error("Error listing models: %r", e)
         raise HTTPException(status_code=500, detail=f"Error listing models: {str(e)}")
 
 @app.post("/generate")
@@ -190,149 +638,752 @@ async def generate(data: Prompt):
     """Generate a response using Gemini AI"""
     check_model_available()  # Verifica se não estamos no CI
     
-    try:
-        prompt_text = data.content
-        if data.context:
-            prompt_text = f"Contexto: {data.context}\n\nPergunta: {data.content}"
-        
-        # Add timeout to prevent infinite loading
-        result = model.generate_content(
-            prompt_text,
-            request_options={"timeout": 30}  # 30 second timeout
-        )
-        
-        if not result or not result.text:
-            raise HTTPException(status_code=500, detail="Failed to generate response")
-            
-        return {"response": result.text, "status": "success"}
-    except Exception as e:
-        logger.error(f"Error generating response: {e}")
-        raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
+    prompt_text = data.content
+    if data.context:
+        prompt_text = f"Contexto: {data.context}\n\nPergunta: {data.content}"
+    
+    # Timeout e circuit breaker ficam no UpstreamClient
+    generated = await generate_cached("/generate", data.model_dump(), prompt_text, record={"title": data.content[:120]})
+    return {"response": generated["text"], "status": "success", **stale_fields(generated)}
+
+def explain_prompt(request: ExplanationRequest) -> str:
+    return f"""
+    Explique o conceito "{request.concept}" de forma didática e clara.
+    
+    Nível de explicação: {request.level}
+    {f"Área de conhecimento: {request.subject}" if request.subject else ""}
+    
+    Por favor, organize a explicação com:
+    1. Definição simples
+    2. Explicação detalhada
+    3. Exemplos práticos
+    4. Aplicações no dia a dia (se aplicável)
+    5. Dicas para memorização
+    
+    Use linguagem adequada ao nível solicitado.
+    """
+
+def explain_body(request: ExplanationRequest, generated: dict) -> dict:
+    return {"explanation": generated["text"], "concept": request.concept, "level": request.level, **stale_fields(generated)}
+
+async def run_explain(request: ExplanationRequest, reuse: bool = False) -> dict:
+    """Gera a explicação de um conceito"""
+    record = {"title": request.concept, "subject": request.subject, "match": {"level": request.level}}
+    generated = await generate_cached(
+        "/explain", request.model_dump(), explain_prompt(request), profile="explain", record=record, reuse=reuse
+    )
+    return explain_body(request, generated)
+
+def cached_not_modified(
+    request: Request, endpoint: str, profile: str, payload: dict, body: Callable[[dict], dict]
+) -> Optional[Response]:
+    """304 direto do cache de respostas (mesmo expirado) quando o If-None-Match bate: revalidar não gasta cota"""
+    if not request.headers.get("if-none-match"):
+        return None
+    cached = response_cache.get_stale(response_cache.make_key(endpoint, payload))
+    if cached is None:
+        return None
+    response = cacheable_response(
+        request, body({"text": cached[0]}), settings.HTTP_CACHE_MAX_AGE, settings.HTTP_CACHE_STALE_WHILE_REVALIDATE
+    )
+    if response.status_code != 304:
+        return None
+    record_usage(endpoint, profile, "hit")
+    return response
+
+REUSE_QUERY = Query(False, description="Reaproveita um conteúdo equivalente já gerado, se existir no acervo")
 
 @app.post("/explain")
-async def explain_concept(request: ExplanationRequest):
+async def explain_concept(request: ExplanationRequest, reuse: bool = REUSE_QUERY):
     """Explain a concept in detail for studying"""
     check_model_available()  # Verifica se não estamos no CI
-    
+    body = await run_explain(request, reuse)
+    observe_step("/explain", request.subject, request.model_dump())
+    return body
+
+@app.get("/explain")
+async def explain_concept_cacheable(request: Request, params: Annotated[ExplanationRequest, Query()]):
+    """Variante GET idempotente de /explain, cacheável por browser/CDN (ETag + If-None-Match)"""
+    check_model_available()  # Verifica se não estamos no CI
+    not_modified = cached_not_modified(
+        request, "/explain", "explain", params.model_dump(), lambda generated: explain_body(params, generated)
+    )
+    body = await run_explain(params) if not_modified is None else None
+    observe_step("/explain", params.subject, params.model_dump())
+    if not_modified is not None:
+        return not_modified
+    return cacheable_response(request, body, settings.HTTP_CACHE_MAX_AGE, settings.HTTP_CACHE_STALE_WHILE_REVALIDATE)
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def chunk_text(chunk) -> str:
+    """Texto de um chunk do streaming (o último pode vir só com finish_reason)"""
     try:
-        prompt = f"""
-        Explique o conceito "{request.concept}" de forma didática e clara.
-        
-        Nível de explicação: {request.level}
-        {f"Área de conhecimento: {request.subject}" if request.subject else ""}
-        
-        Por favor, organize a explicação com:
-        1. Definição simples
-        2. Explicação detalhada
-        3. Exemplos práticos
-        4. Aplicações no dia a dia (se aplicável)
-        5. Dicas para memorização
-        
-        Use linguagem adequada ao nível solicitado.
-        """
-        
-        result = model.generate_content(prompt)
-        return {"explanation": result.text, "concept": request.concept, "level": request.level}
-    except Exception as e:
-        logger.error(f"Error explaining concept: {e}")
-        raise HTTPException(status_code=500, detail=f"Error explaining concept: {str(e)}")
+        return chunk.text or ""
+    except ValueError:
+        return ""
 
-@app.post("/generate-question")
-async def generate_study_question(request: StudyQuestion):
-    """Generate study questions for practice"""
+@app.post("/explain/stream")
+async def explain_concept_stream(request: ExplanationRequest):
+    """Explicação em streaming (SSE); se o aluno fechar a aba, a geração upstream é cancelada"""
     check_model_available()  # Verifica se não estamos no CI
-    
+    payload = request.model_dump()
+    observe_step("/explain", request.subject, payload)
+    key = response_cache.make_key("/explain", payload)
+    done = {"concept": request.concept, "level": request.level}
+
+    async def single(text: str, extra: dict):
+        yield sse_event({"delta": text})
+        yield sse_event({**done, **extra}, event="done")
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        prefetcher.claim(key)
+        record_usage("/explain", "explain", "hit")
+        return StreamingResponse(single(cached, {"cached": True}), media_type="text/event-stream")
+    if key in inflight:
+        # A mesma explicação já está sendo gerada (sem streaming): espera junto em vez de gerar de novo
+        generated = await run_explain(request)
+        return StreamingResponse(
+            single(generated["explanation"], {"cached": False, **stale_fields(generated)}), media_type="text/event-stream"
+        )
+
+    model_override, config = profiles.resolve("explain")
+    expected = profiles.expected_tokens("explain")
+    chunks = upstream.stream(explain_prompt(request), generation_config=config, model_name=model_override)
+    start = time.monotonic()
     try:
-        prompt = f"""
-        Gere uma questão de estudo sobre {request.subject}, especificamente sobre {request.topic}.
-        
-        Configurações:
-        - Dificuldade: {request.difficulty}
-        - Tipo de questão: {request.question_type}
-        
-        Para questões de múltipla escolha, inclua 4 alternativas (A, B, C, D).
-        Para questões verdadeiro/falso, inclua a justificativa.
-        Para questões abertas, forneça critérios de avaliação.
-        
-        Sempre inclua a resposta correta e uma explicação detalhada.
-        """
-        
-        result = model.generate_content(prompt)
+        first = await until_disconnected(anext(chunks))
+    except ClientDisconnected:
+        inflight.abandon_stream(expected)
+        raise
+    except Exception as e:
+        await chunks.aclose()
+        stale = response_cache.get_stale(key)
+        if stale is None:
+            raise upstream_http_error("/explain", e)
+        logger.warning("Upstream failed for /explain/stream, serving stale response: %r", e)
+        record_usage("/explain", "explain", "stale")
+        text, age = stale
+        return StreamingResponse(
+            single(text, {"cached": True, "stale": True, "stale_age_seconds": int(age)}), media_type="text/event-stream"
+        )
+
+    async def event_stream():
+        parts, last, chunk = [], first, first
+        try:
+            while chunk is not None:
+                last = chunk
+                parts.append(chunk_text(chunk))
+                yield sse_event({"delta": parts[-1]})
+                chunk = await until_disconnected(anext(chunks, None))
+        except (ClientDisconnected, asyncio.CancelledError) as e:
+            # Estimativa: o que faltava gerar da resposta típica deste perfil
+            inflight.abandon_stream(expected - len("".join(parts)) // 4)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        except Exception as e:
+            logger.error("Upstream error on /explain/stream: %r", e)
+            record_usage("/explain", "explain", "miss", latency=time.monotonic() - start, ok=False)
+            yield sse_event({"detail": "Falha ao gerar resposta com o serviço de IA"}, event="error")
+            return
+        finally:
+            await chunks.aclose()
+
+        text = "".join(parts)
+        record_usage("/explain", "explain", "miss", last, latency=time.monotonic() - start)
+        profiles.observe("explain", last, cap=config["max_output_tokens"])
+        response_cache.set(key, text)
+        content_writer.submit("/explain", request.concept, text, subject=request.subject, payload=payload)
+        yield sse_event({**done, "cached": False}, event="done")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+async def run_question(request: StudyQuestion, reuse: bool = False) -> dict:
+    """Gera uma questão de estudo"""
+    prompt = f"""
+    Gere uma questão de estudo sobre {request.subject}, especificamente sobre {request.topic}.
+    
+    Configurações:
+    - Dificuldade: {request.difficulty}
+    - Tipo de questão: {request.question_type}
+    
+    Para questões de múltipla escolha, inclua 4 alternativas (A, B, C, D).
+    Para questões verdadeiro/falso, inclua a justificativa.
+    Para questões abertas, forneça critérios de avaliação.
+    
+    Sempre inclua a resposta correta e uma explicação detalhada.
+    """
+    
+    record = {
+        "title": request.topic,
+        "subject": request.subject,
+        "match": {"difficulty": request.difficulty, "question_type": request.question_type},
+    }
+    generated = await generate_cached(
+        "/generate-question", request.model_dump(), prompt, profile=f"question:{request.question_type}",
+        record=record, reuse=reuse
+    )
+    return question_body(request, generated)
+
+def question_body(request: StudyQuestion, generated: dict) -> dict:
+    return {
+        "question": generated["text"],
+        "subject": request.subject,
+        "topic": request.topic,
+        "difficulty": request.difficulty,
+        "type": request.question_type,
+        **stale_fields(generated)
+    }
+
+# Pool de questões pré-geradas: servir uma questão vira lookup local
+question_pool = QuestionPool(
+    low_watermark=settings.POOL_LOW_WATERMARK,
+    target_size=settings.POOL_TARGET_SIZE,
+)
+
+async def generate_question_batch(
+    key: tuple, count: int, avoid: Optional[List[str]] = None, endpoint: str = "question_pool"
+) -> list:
+    """Gera `count` questões estruturadas (JSON schema) em uma única chamada"""
+    prompt = StudyPrompts.question_batch_prompt(*key, count=count, avoid=avoid)
+    result = await generate_with_profile(
+        "question_batch", prompt, units=count, endpoint=endpoint,
+        response_mime_type="application/json", response_schema=QUESTION_ITEMS_SCHEMA
+    )
+    items = parse_question_items(result.text)
+    subject, topic, difficulty, question_type = key
+    payload = {"subject": subject, "topic": topic, "difficulty": difficulty, "question_type": question_type}
+    for item in items:
+        item["question_id"] = answer_keys.add(item)
+        content_writer.submit("/generate-question", topic, render_question(item), subject=subject, payload=payload)
+    return items
+
+pool_refiller = PoolRefiller(
+    question_pool,
+    generate_question_batch,
+    quota,
+    quota_reserve=settings.POOL_QUOTA_RESERVE,
+    batch_size=settings.POOL_BATCH_SIZE,
+    interval=settings.POOL_REFILL_INTERVAL_SECONDS,
+)
+
+@app.post("/generate-question")
+async def generate_study_question(
+    request: StudyQuestion,
+    client_id: Optional[str] = Header(None, alias="X-Client-Id", description="Identifica o aluno para não repetir questões do pool"),
+    reuse: bool = REUSE_QUERY
+):
+    """Generate study questions for practice
+
+    Do pool vem `item` com `question_id`; sem questão no pool a resposta é
+    gerada em texto livre e não traz `question_id` (use /quiz ou /review/next).
+    """
+    key = pool_key(request.subject, request.topic, request.difficulty, request.question_type)
+    question_pool.touch(key)
+    item = question_pool.pop(key, client_id)
+    observe_step("/generate-question", request.subject, request.model_dump())
+    if item is not None:
         return {
-            "question": result.text,
+            "question": render_question(item),
             "subject": request.subject,
             "topic": request.topic,
             "difficulty": request.difficulty,
-            "type": request.question_type
+            "type": request.question_type,
+            "item": item,
+            "source": "pool"
         }
+
+    check_model_available()  # Verifica se não estamos no CI
+    return await run_question(request, reuse)
+
+class QuizRequest(StudyQuestion):
+    count: int = Field(10, ge=1, le=50, description="Número de questões do quiz")
+
+# Quiz: várias questões por chamada upstream, dividindo só quando passa do orçamento de tokens
+quiz_packer = QuizPacker(
+    lambda key, count, avoid: generate_question_batch(key, count, avoid, endpoint="/quiz")
+)
+
+@app.post("/quiz")
+async def generate_quiz(request: QuizRequest):
+    """Gera um quiz com `count` questões usando o mínimo de chamadas upstream"""
+    check_model_available()  # Verifica se não estamos no CI
+    payload = request.model_dump()
+    cache_key = response_cache.make_key("/quiz", payload)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        items, calls = json.loads(cached), 0
+    else:
+        key = pool_key(request.subject, request.topic, request.difficulty, request.question_type)
+        per_call = profiles.get("question_batch")[1].max_units() or request.count
+
+        async def build():
+            items, calls = await quiz_packer.build(key, request.count, per_call)
+            if len(items) == request.count:
+                response_cache.set(cache_key, json.dumps(items))
+            return items, calls
+
+        try:
+            items, calls = await inflight.run(
+                cache_key, build, expected_tokens=profiles.expected_tokens("question_batch", request.count)
+            )
+        except ClientDisconnected:
+            raise
+        except Exception as e:
+            raise upstream_http_error("/quiz", e)
+    return {
+        "subject": request.subject,
+        "topic": request.topic,
+        "difficulty": request.difficulty,
+        "type": request.question_type,
+        "count": len(items),
+        "items": items,
+        "report": {
+            "upstream_calls": calls,
+            "requests_saved": len(items) - calls,  # vs. uma chamada por questão
+        },
+    }
+
+class GradeAnswer(BaseModel):
+    question_id: Optional[str] = Field(None, description="question_id de uma questão do pool ou de /quiz")
+    question: Optional[QuestionItem] = Field(None, description="Questão completa com gabarito, quando não há question_id")
+    answer: str = Field(..., max_length=5000, description="Resposta do aluno (letra, Verdadeiro/Falso ou texto)")
+
+class GradeRequest(BaseModel):
+    answers: List[GradeAnswer] = Field(..., min_length=1, max_length=50)
+
+async def grade_open_answers(entries: List[dict]) -> dict:
+    """Corrige um lote de respostas abertas em uma única chamada (saída JSON estruturada)"""
+    result = await generate_with_profile(
+        "grading", StudyPrompts.grading_prompt(entries), units=len(entries), endpoint="/grade",
+        response_mime_type="application/json", response_schema=GRADES_SCHEMA
+    )
+    return parse_grades(result.text)
+
+grader = GradingEngine(grade_open_answers)
+
+def review_student() -> Optional[str]:
+    """Chave da fila de revisão do aluno atual (tenant + X-Client-Id) ou None"""
+    client_id = current_client.get()
+    return f"{current_tenant.get()}:{client_id}" if client_id else None
+
+def schedule_reviews(student: str, submissions: List[dict], results: List[dict]) -> None:
+    """Reagenda as questões corrigidas (grava no ReviewStore: roda fora do event loop)"""
+    for submission, result in zip(submissions, results):
+        quality = quality_of(result["score"])
+        if quality is not None:
+            # O gabarito fica guardado para a questão poder voltar na revisão
+            review.record(student, answer_keys.add(submission["item"], inline=submission["inline"]), quality)
+
+@app.post("/grade")
+async def grade_answers(request: GradeRequest):
+    """Corrige respostas: objetivas localmente (sem cota), abertas em lote no modelo"""
+    submissions = []
+    for position, entry in enumerate(request.answers):
+        known = await asyncio.to_thread(answer_keys.get, entry.question_id) if entry.question_id else None
+        item = known
+        if item is None and entry.question is not None:
+            item = entry.question.model_dump()
+        if item is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Gabarito da resposta {position} não encontrado: envie a questão completa em `question`",
+            )
+        submissions.append({
+            # ID desconhecido + questão inline: vale o ID com que o gabarito é guardado
+            "question_id": entry.question_id if known is not None else question_id(item),
+            "item": item,
+            "inline": known is None,
+            "question_type": question_type_of(item),
+            "answer": entry.answer,
+        })
+    if any(submission["question_type"] == OPEN_ENDED for submission in submissions):
+        check_model_available()  # Verifica se não estamos no CI
+
+    try:
+        results, calls = await grader.grade(submissions, profiles.get("grading")[1].max_units())
     except Exception as e:
-        logger.error(f"Error generating question: {e}")
-        raise HTTPException(status_code=500, detail=f"Error generating question: {str(e)}")
+        raise upstream_http_error("/grade", e)
+    graded = sum(1 for result in results if result["graded_by"] != "unavailable")
+    student = review_student()
+    if student is not None:
+        await asyncio.to_thread(schedule_reviews, student, submissions, results)
+    return {
+        "results": [
+            {"question_id": submission["question_id"], "type": submission["question_type"], **result}
+            for submission, result in zip(submissions, results)
+        ],
+        "summary": {
+            "answers": len(results),
+            "correct": sum(1 for result in results if result["correct"]),
+            "graded": graded,
+        },
+        "report": {
+            "upstream_calls": calls,
+            "answers_per_upstream_call": round(graded / calls, 2) if calls else None,
+        },
+    }
 
-@app.post("/study-plan")
-async def create_study_plan(request: StudyPlanRequest):
-    """Create a personalized study plan"""
+@app.get("/review/next")
+async def next_review(
+    subject: Optional[str] = Query(None, description="Matéria das questões novas, quando não há revisão vencida"),
+    topic: Optional[str] = Query(None, description="Tópico das questões novas"),
+    difficulty: str = Query("medium"),
+    question_type: str = Query("multiple_choice"),
+):
+    """Próxima questão vencida do aluno (SM-2) sem chamar o modelo; questão nova só com a fila em dia"""
+    student = review_student()
+    if student is None:
+        raise HTTPException(status_code=400, detail="Envie o cabeçalho X-Client-Id para usar a revisão espaçada")
+    card = review.next_due(student)
+    while card is not None:
+        item = answer_keys.get(card["question_id"])
+        if item is not None:
+            return {
+                "question": render_question(item),
+                "item": {"question_id": card["question_id"], **item},
+                "card": card,
+                "source": "review",
+            }
+        review.forget(student, card["question_id"])  # gabarito não existe mais no ReviewStore
+        card = review.next_due(student)
+
+    if subject is None or topic is None:
+        return {"question": None, "item": None, "card": None, "source": None,
+                "next_due_at": review.next_due_at(student), "cards": review.cards(student)}
+
+    # Fila em dia: questão nova do pool e, só se o pool do aluno acabou, do modelo
+    key = pool_key(subject, topic, difficulty, question_type)
+    question_pool.touch(key)
+    item = question_pool.pop(key, current_client.get())
+    source = "pool"
+    if item is None:
+        check_model_available()  # Verifica se não estamos no CI
+        try:
+            items = await generate_question_batch(key, settings.POOL_BATCH_SIZE, endpoint="/review/next")
+        except Exception as e:
+            raise upstream_http_error("/review/next", e)
+        question_pool.add(key, items)
+        item = question_pool.pop(key, current_client.get())
+        source = "generated"
+        if item is None:
+            raise HTTPException(status_code=502, detail="Falha ao gerar resposta com o serviço de IA")
+    return {"question": render_question(item), "item": item, "card": None, "source": source}
+
+@app.get("/generate-question")
+async def generate_study_question_cacheable(request: Request, params: Annotated[StudyQuestion, Query()]):
+    """Variante GET idempotente de /generate-question (sempre a mesma questão para os mesmos parâmetros)"""
     check_model_available()  # Verifica se não estamos no CI
+    not_modified = cached_not_modified(
+        request, "/generate-question", f"question:{params.question_type}", params.model_dump(),
+        lambda generated: question_body(params, generated),
+    )
+    body = await run_question(params) if not_modified is None else None
+    observe_step("/generate-question", params.subject, params.model_dump())
+    if not_modified is not None:
+        return not_modified
+    return cacheable_response(request, body, settings.HTTP_CACHE_MAX_AGE, settings.HTTP_CACHE_STALE_WHILE_REVALIDATE)
+
+async def run_study_plan(request: StudyPlanRequest, reuse: bool = False) -> dict:
+    """Gera um plano de estudos: calendário e horas locais, conteúdo das semanas pelo modelo"""
+    skeleton = build_skeleton(request.duration_weeks, request.daily_hours, request.current_level)
+    prompt = StudyPrompts.study_plan_content_prompt(
+        request.subject, request.current_level, skeleton["weekly_hours"], skeleton["weeks"]
+    )
     
-    try:
-        prompt = f"""
-        Crie um plano de estudos personalizado com as seguintes especificações:
-        
-        - Matéria: {request.subject}
-        - Duração: {request.duration_weeks} semanas
-        - Tempo diário disponível: {request.daily_hours} horas
-        - Nível atual: {request.current_level}
-        
-        O plano deve incluir:
-        1. Divisão semanal dos tópicos
-        2. Objetivos de aprendizagem para cada semana
-        3. Distribuição do tempo de estudo por dia
-        4. Métodos de estudo recomendados
-        5. Marcos de avaliação
-        6. Recursos de estudo sugeridos
-        7. Dicas de organização e produtividade
-        
-        Organize em formato claro e executável.
-        """
-        
-        result = model.generate_content(prompt)
-        return {
-            "study_plan": result.text,
-            "subject": request.subject,
+    record = {
+        "title": request.subject,
+        "subject": request.subject,
+        "match": {
             "duration_weeks": request.duration_weeks,
             "daily_hours": request.daily_hours,
-            "level": request.current_level
-        }
-    except Exception as e:
-        logger.error(f"Error creating study plan: {e}")
-        raise HTTPException(status_code=500, detail=f"Error creating study plan: {str(e)}")
+            "current_level": request.current_level,
+        },
+    }
+
+    def render(text: str) -> str:
+        content = parse_plan_content(text)
+        if not content:
+            return text  # sem conteúdo estruturado, o texto vai como veio
+        return render_plan(merge_plan(skeleton, content), request.subject, request.daily_hours, request.current_level)
+
+    generated = await generate_cached(
+        "/study-plan", request.model_dump(), prompt, profile="study_plan", units=request.duration_weeks,
+        record=record, reuse=reuse, render=render,
+        response_mime_type="application/json", response_schema=PLAN_CONTENT_SCHEMA
+    )
+    # O acervo guarda o plano já em markdown: reaproveitado, ele vai como está
+    content = {} if "reused_content_id" in generated else parse_plan_content(generated["text"])
+    plan = merge_plan(skeleton, content)
+    study_plan = (
+        render_plan(plan, request.subject, request.daily_hours, request.current_level)
+        if content else generated["text"]
+    )
+    return {
+        "study_plan": study_plan,
+        "plan": plan,
+        **(await index_document("/study-plan", request.subject, study_plan)),
+        "subject": request.subject,
+        "duration_weeks": request.duration_weeks,
+        "daily_hours": request.daily_hours,
+        "level": request.current_level,
+        **stale_fields(generated)
+    }
+
+@app.post("/study-plan")
+async def create_study_plan(
+    request: StudyPlanRequest,
+    mode: str = Query("sync", pattern="^(sync|async)$", description="async: retorna 202 com o ID do job"),
+    priority: int = Query(0, description="Prioridade do job (maior roda primeiro)"),
+    reuse: bool = REUSE_QUERY
+):
+    """Create a personalized study plan"""
+    check_model_available()  # Verifica se não estamos no CI
+    observe_step("/study-plan", request.subject, request.model_dump())
+    if mode == "async":
+        return submit_job("study-plan", request.model_dump(), priority)
+    return await run_study_plan(request, reuse)
+
+async def run_summarize(content: Prompt) -> dict:
+    """Gera o resumo de um conteúdo"""
+    prompt = f"""
+    Faça um resumo didático e estruturado do seguinte conteúdo de estudo:
+    
+    {content.content}
+    
+    O resumo deve incluir:
+    1. Pontos principais
+    2. Conceitos-chave
+    3. Fatos importantes para memorizar
+    4. Conexões entre ideias
+    5. Possíveis perguntas de prova
+    
+    Use um título markdown "##" para cada uma dessas partes, bullets dentro delas
+    e organize de forma clara para revisão.
+    """
+    
+    record = {"title": content.content.strip().split("\n", 1)[0][:120]}
+    generated = await generate_cached(
+        "/summarize", content.model_dump(), prompt, profile="summarize", units=len(content.content) // 1000,
+        record=record
+    )
+    return {
+        "summary": generated["text"],
+        "status": "success",
+        **(await index_document("/summarize", record["title"], generated["text"])),
+        **stale_fields(generated)
+    }
 
 @app.post("/summarize")
-async def summarize_content(content: Prompt):
+async def summarize_content(
+    content: Prompt,
+    mode: str = Query("sync", pattern="^(sync|async)$", description="async: retorna 202 com o ID do job"),
+    priority: int = Query(0, description="Prioridade do job (maior roda primeiro)")
+):
     """Summarize study content for review"""
     check_model_available()  # Verifica se não estamos no CI
-    
-    try:
-        prompt = f"""
-        Faça um resumo didático e estruturado do seguinte conteúdo de estudo:
-        
-        {content.content}
-        
-        O resumo deve incluir:
-        1. Pontos principais
-        2. Conceitos-chave
-        3. Fatos importantes para memorizar
-        4. Conexões entre ideias
-        5. Possíveis perguntas de prova
-        
-        Use bullets e organize de forma clara para revisão.
-        """
-        
-        result = model.generate_content(prompt)
-        return {"summary": result.text, "status": "success"}
-    except Exception as e:
-        logger.error(f"Error summarizing content: {e}")
-        raise HTTPException(status_code=500, detail=f"Error summarizing content: {str(e)}")
+    observe_step("/summarize", None, content.model_dump())
+    if mode == "async":
+        return submit_job("summarize", content.model_dump(), priority)
+    return await run_summarize(content)
+
+# Prefetch especulativo: aprende o próximo passo típico do aluno (por matéria)
+# e gera a resposta provável no cache quando sobra cota. Só entram transições
+# cujo payload seguinte dá para prever a partir do atual.
+LEVEL_TO_DIFFICULTY = {"beginner": "easy", "intermediate": "medium", "advanced": "hard"}
+DIFFICULTY_TO_LEVEL = {difficulty: level for level, difficulty in LEVEL_TO_DIFFICULTY.items()}
+
+def predict_question_after_explain(payload: dict) -> Optional[dict]:
+    if not payload.get("subject"):
+        return None
+    return StudyQuestion(
+        subject=payload["subject"],
+        topic=payload["concept"],
+        difficulty=LEVEL_TO_DIFFICULTY.get(payload["level"], "medium"),
+    ).model_dump()
+
+def predict_explain_after_question(payload: dict) -> Optional[dict]:
+    return ExplanationRequest(
+        concept=payload["topic"],
+        subject=payload["subject"],
+        level=DIFFICULTY_TO_LEVEL.get(payload["difficulty"], "intermediate"),
+    ).model_dump()
+
+async def run_prefetch(endpoint: str, payload: dict):
+    if endpoint == "/generate-question":
+        return await run_question(StudyQuestion(**payload))
+    return await run_explain(ExplanationRequest(**payload))
+
+prefetcher = PrefetchEngine(
+    predictors={
+        ("/explain", "/generate-question"): predict_question_after_explain,
+        ("/generate-question", "/explain"): predict_explain_after_question,
+    },
+    execute=run_prefetch,
+    key_fn=ResponseCache.make_key,
+    is_cached=lambda key: response_cache.get(key) is not None,
+    quota=quota,
+    enabled=settings.PREFETCH_ENABLED,
+    min_probability=settings.PREFETCH_MIN_PROBABILITY,
+    quota_reserve=settings.PREFETCH_QUOTA_RESERVE,
+    max_per_hour=settings.PREFETCH_MAX_PER_HOUR,
+    hit_window_seconds=settings.CACHE_TTL_SECONDS,
+)
+
+def observe_step(endpoint: str, subject: Optional[str], payload: dict) -> None:
+    """Alimenta o modelo de transições com a chamada atual do aluno"""
+    client_id = current_client.get()
+    if client_id:
+        prefetcher.observe(f"{current_tenant.get()}:{client_id}", endpoint, subject, payload)
+
+# Jobs assíncronos para gerações longas (evita timeout de proxy/cliente)
+job_queue = JobQueue(
+    settings.JOBS_DB_PATH,
+    handlers={
+        "study-plan": lambda payload: run_study_plan(StudyPlanRequest(**payload)),
+        "summarize": lambda payload: run_summarize(Prompt(**payload)),
+    },
+    workers=settings.JOB_WORKERS,
+    retention_seconds=settings.JOB_RETENTION_SECONDS,
+    key_fn=ResponseCache.make_key,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+)
+
+def job_view(job: dict) -> dict:
+    """Representação pública de um job"""
+    view = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+    if job["result"] is not None:
+        view["result"] = job["result"]
+    if job["error"] is not None:
+        view["error"] = job["error"]
+    return view
+
+def submit_job(kind: str, payload: dict, priority: int) -> JSONResponse:
+    """Enfileira o job e responde 202 com as URLs de acompanhamento"""
+    job, created = job_queue.submit(kind, payload, priority, tenant=current_tenant.get())
+    body = {
+        **job_view(job),
+        "deduplicated": not created,
+        "status_url": f"/jobs/{job['id']}",
+        "events_url": f"/jobs/{job['id']}/events",
+    }
+    return JSONResponse(status_code=202, content=body, headers={"Location": body["status_url"]})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status e resultado de um job assíncrono"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    return job_view(job)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Progresso do job via Server-Sent Events"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+
+    async def event_stream():
+        queue = job_queue.subscribe(job_id)
+        try:
+            current = job_queue.get(job_id)
+            yield f"data: {json.dumps(job_view(current))}\n\n"
+            status = current["status"]
+            while status not in TERMINAL_STATUSES:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # mantém a conexão viva atrás de proxies
+                    continue
+                status = event["status"]
+                if status in TERMINAL_STATUSES:
+                    event = job_view(job_queue.get(job_id))
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            job_queue.unsubscribe(job_id, queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.get("/usage")
+async def usage_report(
+    granularity: str = Query("hour", pattern="^(hour|day)$", description="Rollup por hora ou por dia (UTC)"),
+    hours: int = Query(24, ge=1, le=24 * 90, description="Janela consultada, em horas"),
+    group_by: str = Query("endpoint", pattern="^(endpoint|model|key)$", description="Agrupa por endpoint, modelo ou tenant"),
+):
+    """Consumo de tokens/cota por período e projeção de quando a cota diária acaba (não consome cota)"""
+    report = usage.rollup(granularity, hours, group_by)
+    # Cota restante pelo ledger (persistido e visto igual por todos os workers), não pelo QuotaTracker em memória
+    day_used = usage.upstream_calls_since(time.time() - 86400)
+    report["projection"] = usage.projection(max(settings.QUOTA_RPD - day_used, 0))
+    return report
+
+@app.get("/search")
+async def search_content(
+    q: str = Query(..., min_length=2, description="Termos de busca"),
+    endpoint: Optional[str] = Query(None, description="Filtra por endpoint de origem (ex.: /explain)"),
+    subject: Optional[str] = Query(None, description="Filtra por matéria"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=50),
+):
+    """Busca por relevância no acervo de conteúdo já gerado (não consome cota)"""
+    total, results = await asyncio.to_thread(
+        content_store.search, q, endpoint, subject, page_size, (page - 1) * page_size
+    )
+    return {"query": q, "total": total, "page": page, "page_size": page_size, "results": results}
+
+@app.get("/content/{content_id}")
+async def get_content(content_id: int):
+    """Conteúdo completo de um resultado da busca"""
+    item = content_store.get(content_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Conteúdo não encontrado")
+    return item
+
+@app.get("/documents/{document_id}")
+async def get_document(request: Request, document_id: str):
+    """Índice de seções de um plano/resumo gerado, sem os corpos (não consome cota)"""
+    document = await asyncio.to_thread(document_store.get, document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    return cacheable_response(request, document, settings.DOCUMENT_CACHE_MAX_AGE)
+
+@app.get("/documents/{document_id}/sections")
+async def get_document_sections(
+    request: Request,
+    document_id: str,
+    offset: int = Query(0, ge=0, description="Posição da primeira seção (após o filtro de semanas)"),
+    limit: int = Query(10, ge=1, le=100),
+    week_from: Optional[int] = Query(None, ge=1, description="Só seções de semana >= week_from"),
+    week_to: Optional[int] = Query(None, ge=1, description="Só seções de semana <= week_to"),
+):
+    """Intervalo de seções com os corpos, por posição ou por semana (não consome cota)"""
+    sections = await asyncio.to_thread(document_store.sections, document_id, offset, limit, week_from, week_to)
+    if not sections and await asyncio.to_thread(document_store.get, document_id) is None:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    body = {"document_id": document_id, "offset": offset, "sections": sections}
+    return cacheable_response(request, body, settings.DOCUMENT_CACHE_MAX_AGE)
+
+@app.get("/documents/{document_id}/sections/{section}")
+async def get_document_section(request: Request, document_id: str, section: str):
+    """Uma seção, pela posição ou pelo id (slug do título), com ETag próprio (não consome cota)"""
+    item = await asyncio.to_thread(document_store.section, document_id, section)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Seção não encontrada")
+    return cacheable_response(
+        request, {"document_id": document_id, **item}, settings.DOCUMENT_CACHE_MAX_AGE, etag=item["etag"]
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,192 @@
+"""
+Prefetch especulativo de gerações prováveis
+Aprende as transições entre endpoints (por matéria) de cada cliente e, com
+folga de cota, gera em background a próxima resposta mais provável direto
+no cache. Tem teto de prefetches por hora e contabiliza acertos e cota
+desperdiçada.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.disconnect import current_disconnect
+from app.quota import QuotaTracker
+from app.tenants import BACKGROUND, current_lane
+
+logger = logging.getLogger(__name__)
+
+ANY_SUBJECT = "*"
+
+# (endpoint anterior, próximo endpoint) -> payload previsto a partir do payload anterior
+PayloadPredictor = Callable[[dict], Optional[dict]]
+
+
+class TransitionModel:
+    """Contagem de transições endpoint -> endpoint por matéria"""
+
+    def __init__(self, min_observations: int = 5):
+        self.min_observations = min_observations
+        self._counts: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, subject: Optional[str], source: str, target: str) -> None:
+        for key in {(subject or ANY_SUBJECT, source), (ANY_SUBJECT, source)}:
+            self._counts[key][target] += 1
+
+    def next_probabilities(self, subject: Optional[str], source: str) -> List[Tuple[str, float]]:
+        """Próximos endpoints e probabilidades (usa o agregado geral se a matéria tem poucos dados)"""
+        counts = self._counts.get((subject or ANY_SUBJECT, source))
+        if not counts or sum(counts.values()) < self.min_observations:
+            counts = self._counts.get((ANY_SUBJECT, source))
+        if not counts:
+            return []
+        total = sum(counts.values())
+        if total < self.min_observations:
+            return []
+        return sorted(((target, count / total) for target, count in counts.items()), key=lambda t: t[1], reverse=True)
+
+
+class PrefetchEngine:
+    """Decide, executa e contabiliza prefetches especulativos"""
+
+    def __init__(
+        self,
+        predictors: Dict[Tuple[str, str], PayloadPredictor],
+        execute: Callable[[str, dict], Awaitable[object]],
+        key_fn: Callable[[str, dict], str],
+        is_cached: Callable[[str], bool],
+        quota: QuotaTracker,
+        enabled: bool = False,
+        min_probability: float = 0.5,
+        quota_reserve: float = 0.6,
+        max_per_hour: int = 10,
+        max_in_flight: int = 1,
+        hit_window_seconds: float = 1800.0,
+        session_gap_seconds: float = 1800.0,
+        max_clients: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.predictors = predictors
+        self.execute = execute
+        self.key_fn = key_fn
+        self.is_cached = is_cached
+        self.quota = quota
+        self.enabled = enabled
+        self.min_probability = min_probability
+        self.quota_reserve = quota_reserve
+        self.max_per_hour = max_per_hour
+        self.max_in_flight = max_in_flight
+        self.hit_window_seconds = hit_window_seconds
+        self.session_gap_seconds = session_gap_seconds
+        self.max_clients = max_clients
+        self._clock = clock
+
+        self.transitions = TransitionModel()
+        self._last_call: "OrderedDict[str, Tuple[str, Optional[str], float]]" = OrderedDict()
+        self._issued_at: deque = deque()
+        self._pending: "OrderedDict[str, float]" = OrderedDict()  # chave de cache -> quando foi prefetchada
+        self._tasks: set = set()
+
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+        self.failed = 0
+        self.skipped_budget = 0
+
+    def observe(self, client_id: Optional[str], endpoint: str, subject: Optional[str], payload: dict) -> None:
+        """Registra uma chamada do cliente e, se fizer sentido, agenda o prefetch do próximo passo"""
+        if not client_id:
+            return
+        now = self._clock()
+        previous = self._last_call.get(client_id)
+        if previous is not None and now - previous[2] <= self.session_gap_seconds:
+            self.transitions.record(subject, previous[0], endpoint)
+        self._last_call[client_id] = (endpoint, subject, now)
+        self._last_call.move_to_end(client_id)
+        if len(self._last_call) > self.max_clients:
+            self._last_call.popitem(last=False)
+
+        if self.enabled:
+            self._maybe_prefetch(endpoint, subject, payload)
+
+    def _maybe_prefetch(self, endpoint: str, subject: Optional[str], payload: dict) -> None:
+        for target, probability in self.transitions.next_probabilities(subject, endpoint):
+            if probability < self.min_probability:
+                return
+            predictor = self.predictors.get((endpoint, target))
+            if predictor is None:
+                continue
+            next_payload = predictor(payload)
+            if next_payload is None:
+                continue
+            key = self.key_fn(target, next_payload)
+            if key in self._pending or self.is_cached(key):
+                return
+            if not self._within_budget():
+                self.skipped_budget += 1
+                return
+            self._issue(target, next_payload, key)
+            return
+
+    def _within_budget(self) -> bool:
+        now = self._clock()
+        while self._issued_at and now - self._issued_at[0] >= 3600:
+            self._issued_at.popleft()
+        return (
+            len(self._issued_at) < self.max_per_hour
+            and len(self._tasks) < self.max_in_flight
+            and self.quota.has_headroom(self.quota_reserve)
+        )
+
+    def _issue(self, endpoint: str, payload: dict, key: str) -> None:
+        self._issued_at.append(self._clock())
+        self._pending[key] = self._clock()
+        self.issued += 1
+        task = asyncio.create_task(self._run(endpoint, payload, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, endpoint: str, payload: dict, key: str) -> None:
+        current_lane.set(BACKGROUND)
+        current_disconnect.set(None)  # não é cancelado se o aluno que disparou desconectar
+        try:
+            await self.execute(endpoint, payload)
+        except Exception as e:
+            self.failed += 1
+            self._pending.pop(key, None)
+            logger.info("Prefetch failed for %s: %r", endpoint, e)
+
+    def claim(self, key: str) -> bool:
+        """Chamado num acerto de cache: True se a entrada veio de um prefetch ainda não usado"""
+        self._expire()
+        if self._pending.pop(key, None) is None:
+            return False
+        self.hits += 1
+        return True
+
+    def _expire(self) -> None:
+        now = self._clock()
+        while self._pending:
+            key, issued_at = next(iter(self._pending.items()))
+            if now - issued_at < self.hit_window_seconds:
+                break
+            self._pending.popitem(last=False)
+            self.wasted += 1
+
+    def stats(self) -> dict:
+        self._expire()
+        completed = self.hits + self.wasted
+        return {
+            "enabled": self.enabled,
+            "issued": self.issued,
+            "hits": self.hits,
+            "wasted_requests": self.wasted,
+            "failed": self.failed,
+            "pending": len(self._pending),
+            "skipped_budget": self.skipped_budget,
+            "hit_rate": round(self.hits / completed, 3) if completed else None,
+            "issued_last_hour": len(self._issued_at),
+            "max_per_hour": self.max_per_hour,
+        }
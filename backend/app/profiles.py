@@ -0,0 +1,183 @@
+"""
+Perfis de geração por endpoint
+Cada endpoint (e formato de requisição) tem seu modelo, temperatura e limite
+de tokens. No modo adaptativo o limite de saída é aprendido a partir do
+usage_metadata: fica logo acima do p99 observado, recuando quando respostas
+terminam truncadas (MAX_TOKENS).
+"""
+
+import json
+import math
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+
+class GenerationProfile(BaseModel):
+    model: Optional[str] = Field(None, description="Modelo do perfil (None = modelo padrão)")
+    temperature: float = 0.7
+    top_p: float = 0.8
+    top_k: int = 40
+    max_output_tokens: int = Field(2048, description="Limite base de tokens de saída")
+    tokens_per_unit: int = Field(0, description="Tokens extras por unidade de tamanho da requisição")
+    max_output_tokens_limit: int = Field(8192, description="Teto absoluto, mesmo com unidades extras")
+
+    def static_cap(self, units: int = 0) -> int:
+        return min(self.max_output_tokens + self.tokens_per_unit * max(units, 0), self.max_output_tokens_limit)
+
+    def max_units(self) -> Optional[int]:
+        """Maior número de unidades que cabe no teto absoluto (None = tamanho não depende de unidades)"""
+        if self.tokens_per_unit <= 0:
+            return None
+        return max(1, (self.max_output_tokens_limit - self.max_output_tokens) // self.tokens_per_unit)
+
+
+DEFAULT_PROFILES: Dict[str, dict] = {
+    "generate": {"temperature": 0.7, "max_output_tokens": 2048},
+    "explain": {"temperature": 0.6, "max_output_tokens": 1536},
+    "question": {"temperature": 0.8, "max_output_tokens": 768},
+    "question:true_false": {"temperature": 0.8, "max_output_tokens": 512},
+    "question:open_ended": {"temperature": 0.8, "max_output_tokens": 1024},
+    "question_batch": {"temperature": 0.9, "max_output_tokens": 1024, "tokens_per_unit": 450},
+    # Unidade = respostas abertas corrigidas na mesma chamada
+    "grading": {"temperature": 0.2, "max_output_tokens": 256, "tokens_per_unit": 160, "max_output_tokens_limit": 4096},
+    # Unidade = semanas do plano (só tópico/objetivos/atividades; o calendário é montado localmente)
+    "study_plan": {"temperature": 0.5, "max_output_tokens": 256, "tokens_per_unit": 110},
+    # Unidade = cada 1000 caracteres do conteúdo
+    "summarize": {"temperature": 0.3, "max_output_tokens": 512, "tokens_per_unit": 120, "max_output_tokens_limit": 2048},
+}
+
+
+def load_profiles(overrides_json: str = "", base: Optional[Dict[str, dict]] = None) -> Dict[str, GenerationProfile]:
+    """Perfis padrão combinados com overrides em JSON (ex.: '{"explain": {"temperature": 0.4}}')"""
+    merged = {name: dict(values) for name, values in (base or DEFAULT_PROFILES).items()}
+    if overrides_json:
+        for name, values in json.loads(overrides_json).items():
+            merged.setdefault(name, {}).update(values)
+    return {name: GenerationProfile(**values) for name, values in merged.items()}
+
+
+def finish_reason_name(result: Any) -> Optional[str]:
+    """Nome do finish_reason do primeiro candidato (STOP, MAX_TOKENS, ...)"""
+    candidates = getattr(result, "candidates", None)
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], "finish_reason", None)
+    return getattr(reason, "name", None) or (str(reason) if reason is not None else None)
+
+
+def output_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    return getattr(usage, "candidates_token_count", None) if usage is not None else None
+
+
+class _ProfileStats:
+    __slots__ = ("ratios", "responses", "truncated")
+
+    def __init__(self, window: int):
+        # Tokens gerados / limite estático da requisição (normaliza formatos diferentes)
+        self.ratios: deque = deque(maxlen=window)
+        self.responses = 0
+        self.truncated = 0
+
+
+class ProfileRegistry:
+    """Resolve perfis e aprende o limite adaptativo de tokens por perfil"""
+
+    MIN_ADAPTIVE_CAP = 64
+    TRUNCATION_PENALTY = 1.5
+
+    def __init__(
+        self,
+        profiles: Dict[str, GenerationProfile],
+        adaptive: bool = False,
+        headroom: float = 1.15,
+        min_samples: int = 50,
+        window: int = 500,
+    ):
+        self.profiles = profiles
+        self.adaptive = adaptive
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.window = window
+        self._stats: Dict[str, _ProfileStats] = {}
+
+    def get(self, name: str) -> Tuple[str, GenerationProfile]:
+        """Perfil pelo nome; 'question:true_false' cai para 'question' se não existir"""
+        if name in self.profiles:
+            return name, self.profiles[name]
+        base = name.split(":", 1)[0]
+        if base in self.profiles:
+            return base, self.profiles[base]
+        return "generate", self.profiles["generate"]
+
+    def _p99_ratio(self, name: str) -> Optional[float]:
+        stats = self._stats.get(name)
+        if stats is None or len(stats.ratios) < self.min_samples:
+            return None
+        ordered = sorted(stats.ratios)
+        return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.99) - 1)]
+
+    def cap_for(self, name: str, units: int = 0) -> int:
+        """Limite de tokens efetivo: estático, ou p99 observado x headroom no modo adaptativo"""
+        name, profile = self.get(name)
+        static = profile.static_cap(units)
+        if not self.adaptive:
+            return static
+        ratio = self._p99_ratio(name)
+        if ratio is None:
+            return static
+        return max(self.MIN_ADAPTIVE_CAP, min(static, math.ceil(static * ratio * self.headroom)))
+
+    def expected_tokens(self, name: str, units: int = 0) -> int:
+        """Tamanho típico de uma resposta: mediana observada, ou o limite efetivo sem amostras"""
+        name, profile = self.get(name)
+        stats = self._stats.get(name)
+        if stats is None or not stats.ratios:
+            return self.cap_for(name, units)
+        static = profile.static_cap(units)
+        median = sorted(stats.ratios)[len(stats.ratios) // 2]
+        return min(static, round(static * median))
+
+    def resolve(self, name: str, units: int = 0) -> Tuple[Optional[str], dict]:
+        """(modelo, generation_config) para a chamada upstream"""
+        _, profile = self.get(name)
+        config = {
+            "temperature": profile.temperature,
+            "top_p": profile.top_p,
+            "top_k": profile.top_k,
+            "max_output_tokens": self.cap_for(name, units),
+        }
+        return profile.model, config
+
+    def observe(self, name: str, result: Any, units: int = 0, cap: Optional[int] = None) -> None:
+        """Registra tamanho de saída e finish_reason de uma resposta"""
+        name, profile = self.get(name)
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _ProfileStats(self.window)
+        stats.responses += 1
+        truncated = finish_reason_name(result) == "MAX_TOKENS"
+        if truncated:
+            stats.truncated += 1
+        tokens = output_tokens(result)
+        if tokens is None:
+            return
+        if truncated and cap:
+            # Amostra censurada: o tamanho real é maior que o limite usado
+            tokens = max(tokens, cap) * self.TRUNCATION_PENALTY
+        stats.ratios.append(tokens / profile.static_cap(units))
+
+    def stats(self) -> dict:
+        report = {}
+        for name, stats in self._stats.items():
+            ratio = self._p99_ratio(name)
+            report[name] = {
+                "responses": stats.responses,
+                "max_tokens_finishes": stats.truncated,
+                "max_tokens_rate": round(stats.truncated / stats.responses, 4) if stats.responses else 0.0,
+                "p99_output_ratio": round(ratio, 3) if ratio is not None else None,
+                "adaptive_base_cap": self.cap_for(name) if self.adaptive else None,
+            }
+        return {"adaptive": self.adaptive, "profiles": report}
@@ -0,0 +1,238 @@
+"""
+Pool de questões pré-geradas
+Cada combinação (matéria, tópico, dificuldade, tipo) mantém uma lista de
+questões estruturadas compartilhada entre os alunos; cada cliente tem um
+cursor próprio, então pegar a próxima questão não vista é O(1).
+Um refiller em background completa os pools abaixo do low watermark usando
+apenas a folga de cota.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError
+
+from app.quota import QuotaTracker
+from app.tenants import BACKGROUND, current_lane
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str, str, str]
+
+ANONYMOUS_CLIENT = "anonymous"
+
+
+class QuestionItem(BaseModel):
+    statement: str = Field(..., description="Enunciado da questão")
+    options: List[str] = Field(default_factory=list, description="Alternativas (vazio para open_ended)")
+    answer: str = Field(..., description="Resposta correta")
+    explanation: str = Field(..., description="Explicação da resposta")
+
+
+# response_schema do Gemini para um array de QuestionItem (saída JSON estruturada)
+QUESTION_ITEMS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "statement": {"type": "string"},
+            "options": {"type": "array", "items": {"type": "string"}},
+            "answer": {"type": "string"},
+            "explanation": {"type": "string"},
+        },
+        "required": ["statement", "options", "answer", "explanation"],
+    },
+}
+
+
+def pool_key(subject: str, topic: str, difficulty: str, question_type: str) -> PoolKey:
+    """Chave normalizada do pool"""
+    return tuple(part.strip().lower() for part in (subject, topic, difficulty, question_type))
+
+
+def parse_question_items(text: str) -> List[dict]:
+    """Extrai questões válidas de uma resposta JSON do modelo (descarta itens inválidos)"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if "\n" in text else text
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("questions", [data])
+    if not isinstance(data, list):
+        raise ValueError(f"Resposta JSON sem lista de questões ({type(data).__name__})")
+    items = []
+    for raw in data:
+        try:
+            items.append(QuestionItem(**raw).model_dump())
+        except (ValidationError, TypeError):
+            continue
+    return items
+
+
+def render_question(item: dict) -> str:
+    """Formata uma questão estruturada no mesmo estilo markdown da geração livre"""
+    parts = [f"## 📝 Questão\n{item['statement']}"]
+    if item["options"]:
+        parts.append("## 🔤 Alternativas\n" + "\n".join(item["options"]))
+    parts.append(f"## ✅ Resposta Correta\n{item['answer']}")
+    parts.append(f"## 📖 Explicação\n{item['explanation']}")
+    return "\n\n".join(parts)
+
+
+class _Pool:
+    """Questões de uma combinação; índices absolutos começam em `base`"""
+
+    __slots__ = ("items", "base", "cursors", "max_cursor", "last_requested")
+
+    def __init__(self):
+        self.items: deque = deque()
+        self.base = 0
+        self.cursors: "OrderedDict[str, int]" = OrderedDict()
+        self.max_cursor = 0
+        self.last_requested = 0.0
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.items)
+
+    def unseen_ahead(self) -> int:
+        """Questões ainda não servidas ao cliente mais adiantado"""
+        return self.end - max(self.max_cursor, self.base)
+
+
+class QuestionPool:
+    """Pools de questões por combinação com cursor por cliente"""
+
+    def __init__(
+        self,
+        low_watermark: int = 3,
+        target_size: int = 10,
+        max_items: int = 50,
+        max_clients: int = 10000,
+        idle_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.low_watermark = low_watermark
+        self.target_size = target_size
+        self.max_items = max_items
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        self._pools: Dict[PoolKey, _Pool] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def touch(self, key: PoolKey) -> None:
+        """Registra demanda pela combinação (o refiller passa a cuidar dela)"""
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _Pool()
+        pool.last_requested = self._clock()
+
+    def pop(self, key: PoolKey, client_id: Optional[str] = None) -> Optional[dict]:
+        """Próxima questão que o cliente ainda não viu, ou None"""
+        pool = self._pools.get(key)
+        client_id = client_id or ANONYMOUS_CLIENT
+        if pool is None:
+            self.misses += 1
+            return None
+        index = max(pool.cursors.get(client_id, pool.base), pool.base)
+        if index >= pool.end:
+            self.misses += 1
+            return None
+        item = pool.items[index - pool.base]
+        pool.cursors[client_id] = index + 1
+        pool.cursors.move_to_end(client_id)
+        if len(pool.cursors) > self.max_clients:
+            pool.cursors.popitem(last=False)
+        pool.max_cursor = max(pool.max_cursor, index + 1)
+        self.hits += 1
+        return item
+
+    def add(self, key: PoolKey, items: List[dict]) -> None:
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _Pool()
+        for item in items:
+            pool.items.append({"id": uuid.uuid4().hex[:12], **item})
+        # Descarta as mais antigas; cursores atrás de `base` são ajustados no pop
+        while len(pool.items) > self.max_items:
+            pool.items.popleft()
+            pool.base += 1
+
+    def deficits(self) -> List[Tuple[PoolKey, int]]:
+        """Pools ativos abaixo do low watermark, com quantas questões faltam (maior primeiro)"""
+        now = self._clock()
+        needs = []
+        for key, pool in self._pools.items():
+            if now - pool.last_requested > self.idle_seconds:
+                continue
+            ahead = pool.unseen_ahead()
+            if ahead < self.low_watermark:
+                needs.append((key, self.target_size - ahead))
+        return sorted(needs, key=lambda need: need[1], reverse=True)
+
+    def stats(self) -> dict:
+        return {
+            "pools": len(self._pools),
+            "items": sum(len(pool.items) for pool in self._pools.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class PoolRefiller:
+    """Completa pools em background apenas quando há folga de cota"""
+
+    def __init__(
+        self,
+        pool: QuestionPool,
+        generate_batch: Callable[[PoolKey, int], Awaitable[List[dict]]],
+        quota: QuotaTracker,
+        quota_reserve: float = 0.5,
+        batch_size: int = 5,
+        interval: float = 30.0,
+    ):
+        self.pool = pool
+        self.generate_batch = generate_batch
+        self.quota = quota
+        self.quota_reserve = quota_reserve
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def refill_once(self) -> int:
+        """Uma rodada de reposição; retorna quantas questões foram adicionadas"""
+        added = 0
+        for key, missing in self.pool.deficits():
+            if not self.quota.has_headroom(self.quota_reserve):
+                break
+            try:
+                items = await self.generate_batch(key, min(missing, self.batch_size))
+            except Exception as e:
+                logger.warning("Question pool refill failed for %s: %r", key, e)
+                continue
+            self.pool.add(key, items)
+            added += len(items)
+        return added
+
+    async def _run(self) -> None:
+        current_lane.set(BACKGROUND)  # refill nunca disputa com tráfego interativo
+        while True:
+            await self.refill_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,77 @@
+"""
+Quizzes com várias questões por chamada upstream
+Em vez de uma requisição por questão, o quiz pede N questões estruturadas
+(JSON schema) de uma vez, dividindo em mais chamadas só quando N passa do
+orçamento de tokens de saída de uma resposta.
+"""
+
+import asyncio
+import math
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from app.content_store import tokens
+from app.question_pool import PoolKey
+
+# generate_batch(key, count, avoid) -> questões válidas
+BatchGenerator = Callable[[PoolKey, int, Optional[List[str]]], Awaitable[List[dict]]]
+
+
+def split_count(count: int, per_call: int) -> List[int]:
+    """Divide `count` em partes quase iguais de no máximo `per_call` (ex.: 20, 8 -> [7, 7, 6])"""
+    calls = max(1, math.ceil(count / per_call))
+    base, extra = divmod(count, calls)
+    return [base + 1 if i < extra else base for i in range(calls)]
+
+
+def _fingerprint(item: dict) -> Tuple[str, ...]:
+    return tuple(tokens(item["statement"]))
+
+
+class QuizPacker:
+    """Monta quizzes empacotando várias questões por chamada"""
+
+    def __init__(self, generate_batch: BatchGenerator, max_top_up_calls: int = 1):
+        self.generate_batch = generate_batch
+        self.max_top_up_calls = max_top_up_calls
+        self.quizzes = 0
+        self.questions = 0
+        self.upstream_calls = 0
+
+    async def build(self, key: PoolKey, count: int, per_call: int) -> Tuple[List[dict], int]:
+        """(questões únicas, chamadas upstream feitas); completa faltas com chamadas extras limitadas"""
+        parts = split_count(count, per_call)
+        batches = await asyncio.gather(*(self.generate_batch(key, size, None) for size in parts))
+        calls = len(parts)
+
+        items, seen = [], set()
+
+        def collect(batch: List[dict]) -> None:
+            for item in batch:
+                fingerprint = _fingerprint(item)
+                if fingerprint not in seen:
+                    seen.add(fingerprint)
+                    items.append(item)
+
+        for batch in batches:
+            collect(batch)
+        # Itens inválidos ou repetidos entre partes: pede só o que falta, evitando os enunciados já gerados
+        for _ in range(self.max_top_up_calls):
+            missing = count - len(items)
+            if missing <= 0:
+                break
+            collect(await self.generate_batch(key, min(missing, per_call), [item["statement"] for item in items]))
+            calls += 1
+
+        items = items[:count]
+        self.quizzes += 1
+        self.questions += len(items)
+        self.upstream_calls += calls
+        return items, calls
+
+    def stats(self) -> dict:
+        return {
+            "quizzes": self.quizzes,
+            "questions": self.questions,
+            "upstream_calls": self.upstream_calls,
+            "requests_saved": self.questions - self.upstream_calls,
+        }
@@ -0,0 +1,57 @@
+"""
+Controle de cota do Gemini (free tier)
+Conta as chamadas upstream em janelas deslizantes de 1 minuto e 24 horas.
+"""
+
+import time
+from collections import deque
+from typing import Callable
+
+
+class QuotaTracker:
+    """Acompanha o consumo de RPM/RPD para decidir se há folga para trabalho em background"""
+
+    def __init__(self, rpm: int = 30, rpd: int = 200, clock: Callable[[], float] = time.time):
+        self.rpm = rpm
+        self.rpd = rpd
+        self._clock = clock
+        self._minute: deque = deque()
+        self._day: deque = deque()
+
+    def _prune(self, now: float) -> None:
+        while self._minute and now - self._minute[0] >= 60:
+            self._minute.popleft()
+        while self._day and now - self._day[0] >= 86400:
+            self._day.popleft()
+
+    def record(self, count: int = 1) -> None:
+        """Registra chamadas feitas ao upstream"""
+        now = self._clock()
+        for _ in range(count):
+            self._minute.append(now)
+            self._day.append(now)
+        self._prune(now)
+
+    def remaining(self) -> tuple:
+        """(restante no minuto, restante no dia)"""
+        self._prune(self._clock())
+        return max(self.rpm - len(self._minute), 0), max(self.rpd - len(self._day), 0)
+
+    def headroom(self) -> float:
+        """Menor fração livre entre as janelas de minuto e dia (0.0 a 1.0)"""
+        minute_left, day_left = self.remaining()
+        return min(minute_left / self.rpm, day_left / self.rpd)
+
+    def has_headroom(self, reserve: float) -> bool:
+        """True se sobra mais que `reserve` da cota para uso interativo"""
+        return self.headroom() > reserve
+
+    def snapshot(self) -> dict:
+        minute_left, day_left = self.remaining()
+        return {
+            "rpm_limit": self.rpm,
+            "rpd_limit": self.rpd,
+            "minute_remaining": minute_left,
+            "day_remaining": day_left,
+            "headroom": round(self.headroom(), 3),
+        }
@@ -0,0 +1,336 @@
+"""
+Revisão espaçada (SM-2) das questões já geradas
+Cada resultado de /grade reagenda a questão para o aluno (intervalo e
+facilidade do SM-2). A fila de revisão de cada aluno é um heap de inteiros
+(vencimento << 24 | slot) sobre arrays compactos: a próxima questão vencida
+sai em O(log n), sem chamar o modelo. Entradas antigas do heap (questão
+reagendada depois) são descartadas ao chegar ao topo.
+
+Agendamentos e gabaritos ficam persistidos em SQLite (ReviewStore): os
+heaps são reconstruídos no startup e cada worker puxa do banco o que os
+outros gravaram antes de consultar a fila do aluno.
+"""
+
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+SLOT_BITS = 24  # até ~16,7 milhões de questões por aluno
+SLOT_MASK = (1 << SLOT_BITS) - 1
+MAX_INTERVAL_DAYS = 3650
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+SYNC_OVERLAP_SECONDS = 1.0  # relê gravações recentes de outros workers que possam ter commitado fora de ordem
+
+
+def sm2(ease: float, interval: int, repetitions: int, quality: int):
+    """Próximo (facilidade, intervalo em dias, repetições) para uma nota de 0 a 5"""
+    quality = min(max(quality, 0), 5)
+    if quality < 3:
+        repetitions, interval = 0, 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = round(interval * ease)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease, min(interval, MAX_INTERVAL_DAYS), repetitions
+
+
+def quality_of(score: Optional[float]) -> Optional[int]:
+    """Nota SM-2 (0..5) a partir da nota da correção (0..1)"""
+    return None if score is None else round(min(max(score, 0.0), 1.0) * 5)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_keys (
+    id TEXT PRIMARY KEY,
+    item TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inline_answer_keys (
+    id TEXT PRIMARY KEY,
+    item TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_inline_keys_age ON inline_answer_keys (created_at);
+CREATE TABLE IF NOT EXISTS review_cards (
+    student TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    due REAL NOT NULL,
+    ease REAL NOT NULL,
+    interval INTEGER NOT NULL,
+    repetitions INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (student, question_id)
+);
+CREATE INDEX IF NOT EXISTS idx_cards_sync ON review_cards (student, updated_at);
+"""
+
+
+class ReviewStore:
+    """Persistência dos agendamentos e dos gabaritos em SQLite (sobrevive a deploys)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def save_answer_key(self, qid: str, item: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO answer_keys (id, item, created_at) VALUES (?, ?, ?)",
+                (qid, json.dumps(item), time.time()),
+            )
+
+    def save_inline_answer_key(self, qid: str, item: dict, max_entries: int) -> int:
+        """Gabarito enviado pelo cliente em /grade: guarda os `max_entries` mais recentes; devolve quantos saíram"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO inline_answer_keys (id, item, created_at) VALUES (?, ?, ?)",
+                (qid, json.dumps(item), time.time()),
+            )
+            return self._conn.execute(
+                "DELETE FROM inline_answer_keys WHERE id IN"
+                " (SELECT id FROM inline_answer_keys ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            ).rowcount
+
+    def get_answer_key(self, qid: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT item FROM answer_keys WHERE id = ? UNION ALL SELECT item FROM inline_answer_keys WHERE id = ?"
+                " LIMIT 1",
+                (qid, qid),
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save_card(self, student: str, qid: str, due: float, ease: float, interval: int, repetitions: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO review_cards"
+                " (student, question_id, due, ease, interval, repetitions, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (student, qid, due, ease, interval, repetitions, time.time()),
+            )
+
+    def cards_since(self, student: str, since: float) -> list:
+        """Linhas (question_id, due, ease, interval, repetitions, updated_at) gravadas depois de `since`; due < 0 = removida"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT question_id, due, ease, interval, repetitions, updated_at FROM review_cards"
+                " WHERE student = ? AND updated_at > ?",
+                (student, since),
+            ).fetchall()
+
+    def recent_students(self, limit: int) -> list:
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT student FROM review_cards GROUP BY student ORDER BY MAX(updated_at) DESC LIMIT ?", (limit,)
+            )]
+
+    def all_cards(self, students: list) -> Iterator[Tuple[str, list]]:
+        """(aluno, questões ativas) para reconstruir as filas no startup"""
+        for student in students:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT question_id, due, ease, interval, repetitions, updated_at FROM review_cards"
+                    " WHERE student = ?",
+                    (student,),
+                ).fetchall()
+            yield student, rows
+
+
+class _Deck:
+    """Questões de um aluno: estado SM-2 em arrays paralelos indexados por slot"""
+
+    __slots__ = ("ids", "due", "ease", "interval", "repetitions", "slot_of", "heap", "synced_at")
+
+    def __init__(self):
+        self.ids = array("Q")  # question_id (16 hex) como inteiro de 64 bits
+        self.due = array("d")
+        self.ease = array("f")
+        self.interval = array("H")
+        self.repetitions = array("H")
+        self.slot_of: Dict[int, int] = {}
+        self.heap: list = []
+        self.synced_at = 0.0  # maior updated_at já aplicado do ReviewStore
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def slot(self, key: int) -> int:
+        """Slot da questão, criando um com o estado inicial do SM-2"""
+        slot = self.slot_of.get(key)
+        if slot is None:
+            slot = len(self.ids)
+            if slot > SLOT_MASK:
+                raise OverflowError("Limite de questões por aluno atingido")
+            self.slot_of[key] = slot
+            self.ids.append(key)
+            self.due.append(0.0)
+            self.ease.append(INITIAL_EASE)
+            self.interval.append(0)
+            self.repetitions.append(0)
+        return slot
+
+    def apply(self, rows: list) -> None:
+        """Aplica linhas do ReviewStore (agendamentos ou remoções feitos por qualquer worker)"""
+        for qid, due, ease, interval, repetitions, updated_at in rows:
+            key = int(qid, 16)
+            if due < 0:
+                slot = self.slot_of.pop(key, None)
+                if slot is not None:
+                    self.due[slot] = -1.0
+            else:
+                slot = self.slot(key)
+                self.due[slot], self.ease[slot] = due, ease
+                self.interval[slot], self.repetitions[slot] = interval, repetitions
+                self.push(slot)
+            self.synced_at = max(self.synced_at, updated_at)
+        if len(self.heap) > 2 * len(self) + 64:
+            self.compact()
+
+    def push(self, slot: int) -> None:
+        heapq.heappush(self.heap, (int(self.due[slot]) << SLOT_BITS) | slot)
+
+    def top(self) -> Optional[int]:
+        """Slot com o menor vencimento (descarta entradas desatualizadas do topo)"""
+        heap = self.heap
+        while heap:
+            slot = heap[0] & SLOT_MASK
+            if heap[0] >> SLOT_BITS == int(self.due[slot]):
+                return slot
+            heapq.heappop(heap)
+        return None
+
+    def compact(self) -> None:
+        """Reconstrói o heap só com as entradas válidas"""
+        self.heap = [(int(self.due[slot]) << SLOT_BITS) | slot for slot in self.slot_of.values()]
+        heapq.heapify(self.heap)
+
+
+class ReviewScheduler:
+    """Filas de revisão por aluno: índice em memória (LRU de alunos) sobre o ReviewStore opcional"""
+
+    def __init__(
+        self,
+        max_students: int = 10000,
+        day_seconds: float = 86400.0,
+        clock: Callable[[], float] = time.time,
+        store: Optional[ReviewStore] = None,
+    ):
+        self.max_students = max_students
+        self.day_seconds = day_seconds
+        self._clock = clock
+        self.store = store
+        self._decks: "OrderedDict[str, _Deck]" = OrderedDict()
+        self._lock = threading.Lock()  # /grade grava numa thread (asyncio.to_thread)
+        self.recorded = 0
+        self.served = 0
+        self.evicted = 0
+
+    def load(self) -> int:
+        """Reconstrói as filas dos alunos mais recentes a partir do ReviewStore; devolve quantos"""
+        if self.store is None:
+            return 0
+        students = self.store.recent_students(self.max_students)
+        for student, rows in self.store.all_cards(list(reversed(students))):
+            self._decks[student] = _Deck()
+            self._decks[student].apply(rows)
+        return len(students)
+
+    def _deck(self, student: str, create: bool = False) -> Optional[_Deck]:
+        deck = self._decks.get(student)
+        # Outros workers (ou o LRU, que só tira o aluno da memória) deixam o deck atrasado: puxa o que mudou
+        since = deck.synced_at - SYNC_OVERLAP_SECONDS if deck else 0.0
+        rows = self.store.cards_since(student, since) if self.store else ()
+        if deck is None and (create or rows):
+            deck = self._decks[student] = _Deck()
+            while len(self._decks) > self.max_students:
+                self._decks.popitem(last=False)
+                self.evicted += 1
+        if deck is not None:
+            self._decks.move_to_end(student)
+            if rows:
+                deck.apply(rows)
+        return deck
+
+    def record(self, student: str, qid: str, quality: int) -> dict:
+        """Registra o resultado do aluno na questão e a reagenda"""
+        with self._lock:
+            deck = self._deck(student, create=True)
+            slot = deck.slot(int(qid, 16))
+            ease, interval, repetitions = sm2(deck.ease[slot], deck.interval[slot], deck.repetitions[slot], quality)
+            deck.ease[slot], deck.interval[slot], deck.repetitions[slot] = ease, interval, repetitions
+            deck.due[slot] = self._clock() + interval * self.day_seconds
+            deck.push(slot)
+            if len(deck.heap) > 2 * len(deck) + 64:
+                deck.compact()
+            if self.store is not None:
+                self.store.save_card(student, qid, deck.due[slot], ease, interval, repetitions)
+            self.recorded += 1
+            return self._card(deck, slot)
+
+    def next_due(self, student: str) -> Optional[dict]:
+        """Questão vencida mais antiga do aluno (fica na fila até ser respondida) ou None"""
+        with self._lock:
+            deck = self._deck(student)
+            slot = deck.top() if deck is not None else None
+            if slot is None or deck.due[slot] > self._clock():
+                return None
+            self.served += 1
+            return self._card(deck, slot)
+
+    def forget(self, student: str, qid: str) -> None:
+        """Tira da fila uma questão cujo gabarito não existe mais"""
+        with self._lock:
+            deck = self._deck(student)
+            slot = deck.slot_of.pop(int(qid, 16), None) if deck is not None else None
+            if slot is not None:
+                deck.due[slot] = -1.0  # entradas do heap deste slot ficam desatualizadas
+                if self.store is not None:
+                    self.store.save_card(student, qid, -1.0, 0.0, 0, 0)
+
+    def next_due_at(self, student: str) -> Optional[float]:
+        """Vencimento mais próximo na fila do aluno (None se a fila estiver vazia)"""
+        with self._lock:
+            deck = self._deck(student)
+            slot = deck.top() if deck is not None else None
+            return deck.due[slot] if slot is not None else None
+
+    def cards(self, student: str) -> int:
+        with self._lock:
+            deck = self._deck(student)
+            return len(deck) if deck is not None else 0
+
+    def _card(self, deck: _Deck, slot: int) -> dict:
+        return {
+            "question_id": f"{deck.ids[slot]:016x}",
+            "due_at": deck.due[slot],
+            "interval_days": deck.interval[slot],
+            "ease": round(deck.ease[slot], 2),
+            "repetitions": deck.repetitions[slot],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "students": len(self._decks),
+            "cards": sum(len(deck) for deck in self._decks.values()),
+            "recorded": self.recorded,
+            "served": self.served,
+            "evicted_students": self.evicted,
+        }
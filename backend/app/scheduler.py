@@ -0,0 +1,165 @@
+"""
+Agendamento justo (weighted fair queuing) da capacidade upstream
+Cada tenant recebe uma fatia proporcional ao seu peso quando há disputa,
+com limite de chamadas simultâneas por tenant (burst). A lane interativa
+sempre passa na frente da lane de background. A vazão total é limitada por
+concorrência e por um token bucket de RPM.
+"""
+
+import asyncio
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+from app.tenants import BACKGROUND, INTERACTIVE, TenantPolicy
+
+
+class _Waiter:
+    __slots__ = ("tenant", "start", "tag", "future", "enqueued_at")
+
+    def __init__(self, tenant: str, start: float, tag: float, future: asyncio.Future, enqueued_at: float):
+        self.tenant = tenant
+        self.start = start
+        self.tag = tag
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class FairScheduler:
+    """Fila justa ponderada por tenant, com lanes interativa e background"""
+
+    def __init__(
+        self,
+        policies: Dict[str, TenantPolicy],
+        default_policy: TenantPolicy,
+        concurrency: int = 4,
+        rate_per_minute: Optional[float] = None,
+        wait_window: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.policies = policies
+        self.default_policy = default_policy
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_minute / 60 if rate_per_minute else None
+        self.bucket_size = max(1, concurrency)
+        self._clock = clock
+
+        self._queues: Dict[str, Dict[str, deque]] = {INTERACTIVE: defaultdict(deque), BACKGROUND: defaultdict(deque)}
+        self._finish_tags: Dict[str, float] = {}
+        self._vtime = 0.0
+        self._in_flight = 0
+        self._tenant_in_flight: Dict[str, int] = defaultdict(int)
+        self._tokens = float(self.bucket_size)
+        self._last_refill = clock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self._waits: Dict[str, deque] = defaultdict(lambda: deque(maxlen=wait_window))
+        self._granted: Dict[str, int] = defaultdict(int)
+
+    def policy(self, tenant: str) -> TenantPolicy:
+        return self.policies.get(tenant, self.default_policy)
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, lane: str = INTERACTIVE):
+        """Aguarda a vez do tenant e ocupa uma vaga upstream durante o bloco"""
+        waiter = self._enqueue(tenant, lane)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(tenant)  # vaga concedida no mesmo instante do cancelamento
+            else:
+                waiter.future.cancel()  # removido da fila de forma preguiçosa no dispatch
+            raise
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    def _enqueue(self, tenant: str, lane: str) -> _Waiter:
+        policy = self.policy(tenant)
+        start = max(self._vtime, self._finish_tags.get(tenant, 0.0))
+        tag = start + 1.0 / policy.weight
+        self._finish_tags[tenant] = tag
+        waiter = _Waiter(tenant, start, tag, asyncio.get_running_loop().create_future(), self._clock())
+        self._queues[lane if lane in self._queues else INTERACTIVE][tenant].append(waiter)
+        return waiter
+
+    def _release(self, tenant: str) -> None:
+        self._in_flight -= 1
+        self._tenant_in_flight[tenant] -= 1
+        self._dispatch()
+
+    def _refill(self) -> None:
+        if self.rate_per_second is None:
+            return
+        now = self._clock()
+        self._tokens = min(self.bucket_size, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+
+    def _peek(self) -> Optional[deque]:
+        """Fila cujo primeiro waiter tem o menor tag elegível (interativa antes de background)"""
+        for lane in (INTERACTIVE, BACKGROUND):
+            best, best_tag = None, None
+            for tenant, queue in self._queues[lane].items():
+                while queue and queue[0].future.done():
+                    queue.popleft()  # cancelados
+                if not queue or self._tenant_in_flight[tenant] >= self.policy(tenant).burst:
+                    continue
+                if best_tag is None or queue[0].tag < best_tag:
+                    best, best_tag = queue, queue[0].tag
+            if best is not None:
+                return best
+        return None
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.concurrency:
+            queue = self._peek()
+            if queue is None:
+                return
+            self._refill()
+            if self.rate_per_second is not None and self._tokens < 1:
+                self._schedule_retry((1 - self._tokens) / self.rate_per_second)
+                return
+            if self.rate_per_second is not None:
+                self._tokens -= 1
+            waiter = queue.popleft()
+            self._vtime = max(self._vtime, waiter.start)
+            self._in_flight += 1
+            self._tenant_in_flight[waiter.tenant] += 1
+            self._granted[waiter.tenant] += 1
+            self._waits[waiter.tenant].append(self._clock() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _schedule_retry(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+
+        def retry():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = loop.call_later(delay, retry)
+
+    def stats(self) -> dict:
+        """Fila, vagas em uso e tempo de espera por tenant"""
+        tenants = set(self._granted) | set(self._tenant_in_flight)
+        for lane_queues in self._queues.values():
+            tenants |= set(lane_queues)
+        report = {}
+        for tenant in sorted(tenants):
+            waits = sorted(self._waits[tenant]) if tenant in self._waits else []
+            report[tenant] = {
+                "waiting": sum(
+                    sum(1 for waiter in lane_queues.get(tenant, ()) if not waiter.future.done())
+                    for lane_queues in self._queues.values()
+                ),
+                "in_flight": self._tenant_in_flight.get(tenant, 0),
+                "granted": self._granted.get(tenant, 0),
+                "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+            }
+        return {"concurrency": self.concurrency, "in_flight": self._in_flight, "tenants": report}
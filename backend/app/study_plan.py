@@ -0,0 +1,163 @@
+"""
+Motor híbrido de planos de estudo
+O esqueleto do plano (semanas, fases, distribuição das horas e marcos de
+avaliação) é calculado localmente, de forma determinística e em
+milissegundos; o modelo só preenche, em JSON compacto, o tópico, os
+objetivos e as atividades de cada semana. As duas partes são combinadas e
+renderizadas no markdown de sempre.
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fração das semanas em cada fase (a última fase fica com o resto)
+PHASES = (("Fundamentos", 0.4), ("Aprofundamento", 0.4), ("Consolidação e revisão", 0.2))
+
+# Divisão do tempo de um dia de estudo (teoria, exercícios, revisão) por nível
+DAILY_SPLIT = {
+    "beginner": (0.5, 0.3, 0.2),
+    "intermediate": (0.4, 0.45, 0.15),
+    "advanced": (0.3, 0.55, 0.15),
+}
+BLOCKS = ("Teoria", "Exercícios", "Revisão")
+
+STUDY_DAYS = 6  # o 7º dia é de revisão semanal (ou avaliação, na semana de marco)
+CHECKPOINT_EVERY_WEEKS = 4
+SLOT_MINUTES = 15
+
+# response_schema do Gemini para o conteúdo de cada semana
+PLAN_CONTENT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "week": {"type": "integer"},
+            "topic": {"type": "string"},
+            "goals": {"type": "array", "items": {"type": "string"}},
+            "activities": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["week", "topic", "goals", "activities"],
+    },
+}
+
+
+def split_minutes(total: int, ratios: Tuple[float, ...], step: int = SLOT_MINUTES) -> List[int]:
+    """Divide `total` minutos pelas proporções em múltiplos de `step`, somando exatamente `total`"""
+    slots = total // step
+    raw = [slots * ratio for ratio in ratios]
+    parts = [int(value) for value in raw]
+    # Maior resto primeiro até fechar a conta
+    for index in sorted(range(len(raw)), key=lambda i: raw[i] - parts[i], reverse=True)[:slots - sum(parts)]:
+        parts[index] += 1
+    return [part * step for part in parts]
+
+
+def phase_of(week: int, weeks: int) -> str:
+    """Fase da semana (1-based) pelas frações de PHASES"""
+    boundary = 0.0
+    for name, fraction in PHASES[:-1]:
+        boundary += fraction * weeks
+        if week <= max(1, round(boundary)):
+            return name
+    return PHASES[-1][0]
+
+
+def milestone_of(week: int, weeks: int) -> Optional[dict]:
+    if week == weeks:
+        return {"type": "final", "title": "Avaliação final"}
+    if week % CHECKPOINT_EVERY_WEEKS == 0 and weeks - week >= 2:
+        return {"type": "checkpoint", "title": f"Avaliação parcial {week // CHECKPOINT_EVERY_WEEKS}"}
+    return None
+
+
+def build_skeleton(duration_weeks: int, daily_hours: int, current_level: str) -> dict:
+    """Calendário, horas e marcos do plano, sem chamar o modelo"""
+    daily_minutes = daily_hours * 60
+    blocks = [
+        {"activity": name, "minutes": minutes}
+        for name, minutes in zip(BLOCKS, split_minutes(daily_minutes, DAILY_SPLIT.get(current_level, DAILY_SPLIT["intermediate"])))
+        if minutes
+    ]
+    weeks = []
+    for week in range(1, duration_weeks + 1):
+        milestone = milestone_of(week, duration_weeks)
+        weeks.append({
+            "week": week,
+            "phase": phase_of(week, duration_weeks),
+            "hours": daily_hours * 7,
+            "study_days": STUDY_DAYS,
+            "daily_blocks": blocks,
+            "day_7": {"activity": "Avaliação" if milestone else "Revisão semanal", "minutes": daily_minutes},
+            "milestone": milestone,
+        })
+    return {
+        "total_hours": duration_weeks * 7 * daily_hours,
+        "weekly_hours": daily_hours * 7,
+        "milestones": [week["week"] for week in weeks if week["milestone"]],
+        "weeks": weeks,
+    }
+
+
+def parse_plan_content(text: str) -> Dict[int, dict]:
+    """Conteúdo válido por semana a partir da resposta JSON do modelo (vazio se não for JSON)"""
+    try:
+        data = json.loads(text.strip().strip("`").removeprefix("json"))
+    except ValueError:
+        logger.warning("Study plan content is not valid JSON (%d chars)", len(text))
+        return {}
+    content = {}
+    for raw in data if isinstance(data, list) else []:
+        try:
+            week = int(raw["week"])
+            content[week] = {
+                "topic": str(raw["topic"]).strip(),
+                "goals": [str(goal).strip() for goal in raw.get("goals") or []],
+                "activities": [str(activity).strip() for activity in raw.get("activities") or []],
+            }
+        except (KeyError, TypeError, ValueError):
+            continue
+    return content
+
+
+def merge_plan(skeleton: dict, content: Dict[int, dict]) -> dict:
+    """Esqueleto local + conteúdo do modelo; semanas sem conteúdo ficam marcadas"""
+    weeks = []
+    for week in skeleton["weeks"]:
+        filled = content.get(week["week"])
+        weeks.append({
+            **week,
+            "topic": filled["topic"] if filled else None,
+            "goals": filled["goals"] if filled else [],
+            "activities": filled["activities"] if filled else [],
+        })
+    missing = sum(1 for week in weeks if week["topic"] is None)
+    return {**skeleton, "weeks": weeks, "content_complete": missing == 0, "weeks_without_content": missing}
+
+
+def render_plan(plan: dict, subject: str, daily_hours: int, current_level: str) -> str:
+    """Markdown do plano combinado (mesmo formato de leitura da geração livre)"""
+    weeks = plan["weeks"]
+    lines = [
+        f"# 📅 Plano de Estudos: {subject}",
+        f"**Duração:** {len(weeks)} semanas · **Dedicação:** {daily_hours} h/dia "
+        f"({plan['total_hours']} h no total) · **Nível:** {current_level}",
+    ]
+    phase = None
+    for week in weeks:
+        if week["phase"] != phase:
+            phase = week["phase"]
+            lines.append(f"\n## 🧭 {phase}")
+        lines.append(f"\n### Semana {week['week']}: {week['topic'] or 'Conteúdo a definir'} ({week['hours']} h)")
+        if week["goals"]:
+            lines.append("**🎯 Objetivos:**\n" + "\n".join(f"- {goal}" for goal in week["goals"]))
+        if week["activities"]:
+            lines.append("**🛠️ Atividades:**\n" + "\n".join(f"- {activity}" for activity in week["activities"]))
+        routine = " · ".join(f"{block['activity']} {block['minutes']} min" for block in week["daily_blocks"])
+        lines.append(f"**⏰ Rotina ({week['study_days']} dias):** {routine}")
+        lines.append(f"**📌 Dia 7:** {week['day_7']['activity']} ({week['day_7']['minutes']} min)")
+        if week["milestone"]:
+            lines.append(f"**🏁 Marco:** {week['milestone']['title']}")
+    return "\n".join(lines)
@@ -0,0 +1,69 @@
+"""
+Identidade de tenant (escola) por API key
+O tenant e a lane (interativa ou background) da requisição atual ficam em
+contextvars, para que o cliente upstream agende a chamada sem precisar
+receber esses dados por parâmetro.
+"""
+
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, BACKGROUND)
+
+DEFAULT_TENANT = "public"
+
+current_tenant: ContextVar[str] = ContextVar("current_tenant", default=DEFAULT_TENANT)
+current_lane: ContextVar[str] = ContextVar("current_lane", default=INTERACTIVE)
+# Aluno/sessão da requisição (header X-Client-Id), quando informado
+current_client: ContextVar[Optional[str]] = ContextVar("current_client", default=None)
+
+
+class TenantPolicy(BaseModel):
+    name: str = Field(..., description="Nome do tenant (usado nas métricas)")
+    weight: float = Field(1.0, gt=0, description="Peso na divisão da capacidade upstream")
+    burst: int = Field(2, ge=1, description="Máximo de chamadas upstream simultâneas do tenant")
+
+
+class TenantRegistry:
+    """Mapeia API keys para políticas de tenant"""
+
+    def __init__(self, by_key: Dict[str, TenantPolicy], default: TenantPolicy):
+        self.by_key = by_key
+        self.default = default
+
+    @classmethod
+    def from_json(cls, raw: str, default_weight: float = 1.0, default_burst: int = 2) -> "TenantRegistry":
+        """Lê '{"api-key": {"name": "escola-a", "weight": 3, "burst": 4}}'"""
+        by_key = {key: TenantPolicy(**values) for key, values in (json.loads(raw) if raw else {}).items()}
+        default = TenantPolicy(name=DEFAULT_TENANT, weight=default_weight, burst=default_burst)
+        return cls(by_key, default)
+
+    def resolve(self, api_key: Optional[str]) -> Optional[TenantPolicy]:
+        """Política do tenant; sem chave = tenant público; chave desconhecida = None"""
+        if not api_key:
+            return self.default
+        return self.by_key.get(api_key)
+
+    def policies(self) -> Dict[str, TenantPolicy]:
+        """Políticas por nome de tenant"""
+        policies = {policy.name: policy for policy in self.by_key.values()}
+        policies.setdefault(self.default.name, self.default)
+        return policies
+
+
+@contextmanager
+def tenant_context(tenant: str, lane: str = INTERACTIVE):
+    """Executa um bloco como se fosse uma requisição do tenant/lane informados"""
+    tenant_token = current_tenant.set(tenant)
+    lane_token = current_lane.set(lane)
+    try:
+        yield
+    finally:
+        current_lane.reset(lane_token)
+        current_tenant.reset(tenant_token)
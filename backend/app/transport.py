@@ -0,0 +1,204 @@
+"""
+Transporte upstream para o Gemini
+Escolha entre gRPC e REST com conexões persistentes (keepalive), pool de
+conexões configurável e aquecimento (warm-up) antes do app ficar saudável.
+"""
+
+import asyncio
+import itertools
+import logging
+import socket
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+import grpc
+from google.ai import generativelanguage_v1beta as glm
+from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+    GenerativeServiceGrpcAsyncIOTransport,
+    GenerativeServiceRestTransport,
+)
+from google.auth import api_key as api_key_credentials
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINT = "generativelanguage.googleapis.com"
+TRANSPORTS = ("grpc", "rest")
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter com TCP keepalive nos sockets do pool"""
+
+    def __init__(self, keepalive_seconds: int, **kwargs):
+        self.keepalive_seconds = keepalive_seconds
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        options = list(HTTPConnection.default_socket_options)
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_seconds))
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.keepalive_seconds))
+        kwargs["socket_options"] = options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class ModelPool:
+    """Pool de GenerativeModel sobre conexões persistentes
+
+    Expõe generate_content_async como um GenerativeModel, distribuindo as
+    chamadas em round-robin. No gRPC cada modelo tem seu próprio canal HTTP/2;
+    no REST todos compartilham uma sessão com pool de conexões e as chamadas
+    síncronas rodam em threads (limitadas ao tamanho do pool).
+    As conexões são abertas dentro do event loop, no warm-up ou na primeira chamada.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        generation_config: dict,
+        api_key: Optional[str],
+        transport: str = "grpc",
+        pool_size: int = 4,
+        keepalive_seconds: int = 30,
+        endpoint: str = DEFAULT_ENDPOINT,
+        insecure: bool = False,
+    ):
+        if transport not in TRANSPORTS:
+            raise ValueError(f"GEMINI_TRANSPORT must be one of {TRANSPORTS}, got {transport!r}")
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.api_key = api_key
+        self.transport = transport
+        self.pool_size = max(1, pool_size)
+        self.keepalive_seconds = keepalive_seconds
+        self.endpoint = endpoint
+        self.insecure = insecure
+        self.models: List[Any] = []
+        # (slot, modelo) -> GenerativeModel compartilhando o cliente/conexão do slot
+        self._variants: Dict[Tuple[int, str], Any] = {}
+        self.channels: list = []
+        self.sessions: list = []
+        self._next = None
+        self._rest_slots: Optional[asyncio.Semaphore] = None
+
+    def _open(self) -> None:
+        credentials = api_key_credentials.Credentials(self.api_key or "")
+        if self.transport == "grpc":
+            options = [
+                ("grpc.keepalive_time_ms", self.keepalive_seconds * 1000),
+                ("grpc.keepalive_timeout_ms", 10000),
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.http2.max_pings_without_data", 0),
+                ("grpc.max_send_message_length", -1),
+                ("grpc.max_receive_message_length", -1),
+            ]
+            for index in range(self.pool_size):
+                # Argumento distinto por canal = conexões distintas (sem compartilhar subchannel)
+                channel_options = options + [("grpc.channel_pool_index", index)]
+                if self.insecure:
+                    channel = grpc.aio.insecure_channel(self.endpoint, options=channel_options)
+                else:
+                    channel = GenerativeServiceGrpcAsyncIOTransport.create_channel(
+                        self.endpoint, credentials=credentials, options=channel_options
+                    )
+                client = glm.GenerativeServiceAsyncClient(
+                    transport=GenerativeServiceGrpcAsyncIOTransport(host=self.endpoint, channel=channel)
+                )
+                model = genai.GenerativeModel(self.model_name, generation_config=self.generation_config)
+                model._async_client = client
+                self.models.append(model)
+                self.channels.append(channel)
+        else:
+            rest_transport = GenerativeServiceRestTransport(
+                host=self.endpoint,
+                credentials=credentials,
+                url_scheme="http" if self.insecure else "https",
+            )
+            session = rest_transport._session
+            adapter = _KeepAliveAdapter(
+                self.keepalive_seconds, pool_connections=1, pool_maxsize=self.pool_size, max_retries=0
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            client = glm.GenerativeServiceClient(transport=rest_transport)
+            for _ in range(self.pool_size):
+                model = genai.GenerativeModel(self.model_name, generation_config=self.generation_config)
+                model._client = client
+                self.models.append(model)
+            self.sessions.append(session)
+            self._rest_slots = asyncio.Semaphore(self.pool_size)
+        self._next = itertools.cycle(range(len(self.models)))
+
+    def _model_for(self, slot: int, model_name: Optional[str]) -> Any:
+        """Modelo do slot; outros modelos (tiers) reutilizam a mesma conexão"""
+        base = self.models[slot]
+        if not model_name or model_name == self.model_name:
+            return base
+        variant = self._variants.get((slot, model_name))
+        if variant is None:
+            variant = genai.GenerativeModel(model_name, generation_config=self.generation_config)
+            variant._client = base._client
+            variant._async_client = base._async_client
+            self._variants[(slot, model_name)] = variant
+        return variant
+
+    async def generate_content_async(self, prompt, model_name: Optional[str] = None, **kwargs):
+        if not self.models:
+            self._open()
+        model = self._model_for(next(self._next), model_name)
+        if self.transport == "grpc":
+            return await model.generate_content_async(prompt, **kwargs)
+        if kwargs.get("stream"):
+            return self._rest_stream(model, prompt, **kwargs)
+        async with self._rest_slots:
+            return await asyncio.to_thread(model.generate_content, prompt, **kwargs)
+
+    async def _rest_stream(self, model: Any, prompt, **kwargs) -> AsyncIterator[Any]:
+        """Streaming REST: cada chunk é lido numa thread; a conexão fica ocupada até o fim"""
+        async with self._rest_slots:
+            chunks = iter(await asyncio.to_thread(model.generate_content, prompt, **kwargs))
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+    async def warm_up(self, timeout: float = 10.0) -> dict:
+        """Abre as conexões (TCP + TLS + HTTP/2) sem consumir cota; retorna o tempo gasto"""
+        start = time.monotonic()
+        try:
+            if not self.models:
+                self._open()
+            if self.transport == "grpc":
+                await asyncio.wait_for(
+                    asyncio.gather(*(channel.channel_ready() for channel in self.channels)),
+                    timeout=timeout,
+                )
+            else:
+                scheme = "http" if self.insecure else "https"
+                session = self.sessions[0]
+                # Requisições paralelas para abrir várias conexões no pool
+                await asyncio.wait_for(
+                    asyncio.gather(*(
+                        asyncio.to_thread(session.head, f"{scheme}://{self.endpoint}/", timeout=timeout)
+                        for _ in self.models
+                    )),
+                    timeout=timeout,
+                )
+        except Exception as e:
+            logger.warning("Upstream warm-up failed (%s): %r", self.transport, e)
+            return {"transport": self.transport, "warm": False, "seconds": round(time.monotonic() - start, 3)}
+        seconds = round(time.monotonic() - start, 3)
+        logger.info("Upstream warm-up done: %s, %d connections in %.3fs", self.transport, len(self.models), seconds)
+        return {"transport": self.transport, "warm": True, "seconds": seconds}
+
+    async def close(self) -> None:
+        for channel in self.channels:
+            await channel.close()
+        for session in self.sessions:
+            session.close()
+        self.models, self.channels, self.sessions = [], [], []
+        self._variants = {}
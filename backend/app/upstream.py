@@ -0,0 +1,180 @@
+"""
+Cliente upstream para o Gemini
+Centraliza timeout, circuit breaker, limite de concorrência adaptativo,
+agendamento justo entre tenants e contagem de cota de todas as chamadas de
+geração.
+"""
+
+import asyncio
+import time
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Optional
+
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.limiter import AdaptiveLimiter
+from app.quota import QuotaTracker
+from app.scheduler import FairScheduler
+from app.tenants import INTERACTIVE, current_lane, current_tenant
+
+
+class UpstreamClient:
+    """Envolve o GenerativeModel com timeout e circuit breaker"""
+
+    def __init__(
+        self,
+        model: Any,
+        breaker: CircuitBreaker,
+        timeout: float = 30.0,
+        quota: Optional[QuotaTracker] = None,
+        scheduler: Optional[FairScheduler] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        self.model = model
+        self.breaker = breaker
+        self.timeout = timeout
+        self.quota = quota
+        self.scheduler = scheduler
+        self.limiter = limiter
+
+    async def generate(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        generation_config: Optional[dict] = None,
+        model_name: Optional[str] = None,
+    ) -> Any:
+        """Chama o modelo; levanta CircuitOpenError sem chamar se o circuito estiver aberto
+
+        Chamadas interativas acima do limite de concorrência levantam
+        ConcurrencyLimitExceeded na hora; background já é contido pelo scheduler.
+        """
+        if self.limiter is not None and current_lane.get() == INTERACTIVE:
+            # Limiter antes do breaker: recusa por concorrência não ocupa a vaga de teste do half-open
+            with self.limiter.guard(neutral=(CircuitOpenError,)):
+                return await self._probed(prompt, timeout, generation_config, model_name)
+        return await self._probed(prompt, timeout, generation_config, model_name)
+
+    async def _probed(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        generation_config: Optional[dict],
+        model_name: Optional[str],
+    ) -> Any:
+        probe = self.breaker.before_call()
+        try:
+            return await self._scheduled(prompt, timeout, generation_config, model_name)
+        except Exception:
+            raise  # resultado já registrado no breaker por _call
+        except BaseException:
+            # Cancelada (cliente saiu, deadline) na fila ou no upstream: sem resultado, devolve a vaga
+            self.breaker.cancel_call(probe)
+            raise
+
+    async def _scheduled(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        generation_config: Optional[dict],
+        model_name: Optional[str],
+    ) -> Any:
+        if self.scheduler is None:
+            return await self._call(prompt, timeout, generation_config, model_name)
+        # Tenant e lane vêm do contexto da requisição (middleware / workers de background)
+        async with self.scheduler.slot(current_tenant.get(), current_lane.get()):
+            return await self._call(prompt, timeout, generation_config, model_name)
+
+    async def _call(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        generation_config: Optional[dict],
+        model_name: Optional[str],
+    ) -> Any:
+        timeout = timeout or self.timeout
+        if self.quota is not None:
+            self.quota.record()
+        kwargs = {"request_options": {"timeout": timeout}}
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        if model_name:
+            kwargs["model_name"] = model_name
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                self.model.generate_content_async(prompt, **kwargs),
+                timeout=timeout,
+            )
+            if not result or not result.text:
+                raise ValueError("Empty response from model")
+        except Exception:
+            self.breaker.record_failure(time.monotonic() - start)
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return result
+
+    async def stream(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        generation_config: Optional[dict] = None,
+        model_name: Optional[str] = None,
+    ) -> AsyncIterator[Any]:
+        """Gera em streaming, chunk a chunk; fechar o gerador (cliente saiu) cancela a chamada upstream
+
+        Breaker e limiter medem o tempo até o primeiro chunk: a duração total
+        depende do tamanho da resposta, não da saúde do upstream.
+        """
+        limited = self.limiter is not None and current_lane.get() == INTERACTIVE
+        if limited:
+            self.limiter.acquire()
+        try:
+            probe = self.breaker.before_call()
+        except CircuitOpenError:
+            if limited:
+                self.limiter.release(None)
+            raise
+        slot = self.scheduler.slot(current_tenant.get(), current_lane.get()) if self.scheduler else nullcontext()
+        timeout = timeout or self.timeout
+        kwargs = {"stream": True, "request_options": {"timeout": timeout}}
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        if model_name:
+            kwargs["model_name"] = model_name
+        first_chunk: Optional[float] = None
+        try:
+            async with slot:
+                if self.quota is not None:
+                    self.quota.record()
+                start = time.monotonic()
+                try:
+                    response = await asyncio.wait_for(self.model.generate_content_async(prompt, **kwargs), timeout)
+                    chunks = aiter(response)
+                    while True:
+                        try:
+                            # Timeout entre chunks, não do streaming inteiro
+                            chunk = await asyncio.wait_for(anext(chunks), timeout)
+                        except StopAsyncIteration:
+                            break
+                        if first_chunk is None:
+                            first_chunk = time.monotonic() - start
+                        yield chunk
+                    if first_chunk is None:
+                        raise ValueError("Empty response from model")
+                except (asyncio.CancelledError, GeneratorExit):
+                    raise
+                except Exception:
+                    self.breaker.record_failure(time.monotonic() - start)
+                    raise
+                self.breaker.record_success(first_chunk)
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.cancel_call(probe)
+            if limited:
+                self.limiter.release(None)  # cliente desistiu: não diz nada sobre a saúde do upstream
+            raise
+        except BaseException:
+            if limited:
+                self.limiter.release(first_chunk or 0.0, ok=False)
+            raise
+        if limited:
+            self.limiter.release(first_chunk)
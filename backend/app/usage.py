@@ -0,0 +1,282 @@
+"""
+Ledger de uso do upstream (tokens, latência, cache) por endpoint/modelo/tenant
+Cada chamada vira uma linha compacta (array JSON) num arquivo diário,
+append-only, com rotação e retenção por dias. Rollups por hora ficam em
+memória (reconstruídos dos arquivos no startup), então as consultas de
+/usage não varrem o disco. A escrita é feita em lotes por uma task em
+background.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ordem das colunas de cada linha do ledger
+FIELDS = ("ts", "endpoint", "model", "key", "prompt_tokens", "output_tokens", "latency_ms", "cache", "ok")
+
+# Status de cache: miss/bypass chamaram o upstream; hit/reuse/stale/coalesced não
+UPSTREAM_STATUSES = ("miss", "bypass")
+GROUP_BY = {"endpoint": 1, "model": 2, "key": 3}
+
+FILE_PREFIX = "usage-"
+FILE_SUFFIX = ".jsonl"
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+
+class _Counters:
+    __slots__ = ("requests", "upstream_calls", "cache_hits", "errors", "prompt_tokens", "output_tokens", "latency_ms")
+
+    def __init__(self):
+        self.requests = 0
+        self.upstream_calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latency_ms = 0
+
+    def add(self, row: list) -> None:
+        self.requests += 1
+        if row[7] in UPSTREAM_STATUSES:
+            self.upstream_calls += 1
+            self.latency_ms += row[6]
+        else:
+            self.cache_hits += 1
+        if not row[8]:
+            self.errors += 1
+        self.prompt_tokens += row[4]
+        self.output_tokens += row[5]
+
+    def merge(self, other: "_Counters") -> None:
+        for field in self.__slots__:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "avg_latency_ms": round(self.latency_ms / self.upstream_calls) if self.upstream_calls else None,
+        }
+
+
+class UsageLedger:
+    """Registro append-only de uso com rollups por hora"""
+
+    def __init__(
+        self,
+        directory: str,
+        retention_days: int = 30,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_pending: int = 50000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._clock = clock
+        # hora (epoch // 3600) -> (endpoint, model, key) -> contadores
+        self._hourly: Dict[int, Dict[Tuple[str, str, str], _Counters]] = defaultdict(lambda: defaultdict(_Counters))
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._buffer: List[list] = []
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    # Registro
+
+    def record(
+        self,
+        endpoint: str,
+        model: str,
+        key: str,
+        cache: str,
+        prompt_tokens: int = 0,
+        output_tokens: int = 0,
+        latency: float = 0.0,
+        ok: bool = True,
+    ) -> None:
+        """Contabiliza uma chamada; nunca bloqueia (a linha vai para a fila de escrita)"""
+        row = [round(self._clock(), 3), endpoint, model, key, prompt_tokens or 0, output_tokens or 0,
+               round(latency * 1000), cache, ok]
+        self._aggregate(row)
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _aggregate(self, row: list) -> None:
+        self._hourly[int(row[0] // 3600)][(row[1], row[2], row[3])].add(row)
+
+    # Arquivos
+
+    def _path_for(self, ts: float) -> str:
+        day = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+        return os.path.join(self.directory, f"{FILE_PREFIX}{day}{FILE_SUFFIX}")
+
+    def _files(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory) if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)
+        )
+
+    def _write_batch(self, rows: List[list]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        by_file: Dict[str, List[str]] = defaultdict(list)
+        for row in rows:
+            by_file[self._path_for(row[0])].append(json.dumps(row, separators=(",", ":")))
+        for path, lines in by_file.items():
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def rotate(self) -> int:
+        """Remove arquivos e rollups fora da retenção; retorna quantos arquivos foram apagados"""
+        cutoff = self._clock() - self.retention_days * 86400
+        oldest_kept = os.path.basename(self._path_for(cutoff))
+        removed = 0
+        for name in self._files():
+            if name < oldest_kept:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        cutoff_hour = int(cutoff // 3600)
+        for hour in [hour for hour in self._hourly if hour < cutoff_hour]:
+            del self._hourly[hour]
+        return removed
+
+    def load(self) -> int:
+        """Reconstrói os rollups a partir dos arquivos dentro da retenção"""
+        self.rotate()
+        loaded = 0
+        for name in self._files():
+            with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # linha truncada por crash no meio da escrita
+                    if len(row) == len(FIELDS):
+                        self._aggregate(row)
+                        loaded += 1
+        return loaded
+
+    # Writer em background
+
+    async def _next_batch(self) -> List[list]:
+        self._buffer.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(self._buffer) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._buffer.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    async def _write(self, batch: List[list]) -> None:
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error("Usage ledger write failed (%d rows): %r", len(batch), e)
+            return
+        self.written += len(batch)
+
+    async def _run(self) -> None:
+        last_rotation = 0.0
+        while True:
+            await self._write(await self._next_batch())
+            if self._clock() - last_rotation >= 3600:
+                await asyncio.to_thread(self.rotate)
+                last_rotation = self._clock()
+
+    async def flush(self) -> None:
+        batch, self._buffer = self._buffer, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write(batch)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    # Consultas
+
+    def rollup(self, granularity: str = "hour", hours: int = 24, group_by: str = "endpoint") -> dict:
+        """Contadores por período (hora ou dia UTC) e por endpoint/modelo/key"""
+        index = GROUP_BY[group_by]
+        bucket_seconds = 3600 if granularity == "hour" else 86400
+        now = self._clock()
+        first_hour = int(now // 3600) - hours + 1
+        buckets: Dict[int, Dict[str, _Counters]] = defaultdict(lambda: defaultdict(_Counters))
+        totals: Dict[str, _Counters] = defaultdict(_Counters)
+        for hour, groups in self._hourly.items():
+            if hour < first_hour:
+                continue
+            start = hour * 3600 // bucket_seconds * bucket_seconds
+            for key, counters in groups.items():
+                name = key[index - 1]
+                buckets[start][name].merge(counters)
+                totals[name].merge(counters)
+        return {
+            "granularity": granularity,
+            "group_by": group_by,
+            "since": _iso(first_hour * 3600),
+            "totals": {name: counters.as_dict() for name, counters in sorted(totals.items())},
+            "buckets": [
+                {"start": _iso(start), "groups": {name: c.as_dict() for name, c in sorted(groups.items())}}
+                for start, groups in sorted(buckets.items())
+            ],
+        }
+
+    def upstream_calls_since(self, since: float) -> int:
+        first_hour = int(since // 3600)
+        return sum(
+            counters.upstream_calls
+            for hour, groups in self._hourly.items() if hour >= first_hour
+            for counters in groups.values()
+        )
+
+    def projection(self, day_remaining: int, window_hours: int = 3) -> dict:
+        """Ritmo recente de chamadas upstream e quando a cota diária acaba nesse ritmo"""
+        now = self._clock()
+        window_start = (int(now // 3600) - window_hours + 1) * 3600
+        calls = self.upstream_calls_since(window_start)
+        rate_per_hour = calls / max((now - window_start) / 3600, 1 / 60)
+        exhaustion = now + day_remaining / rate_per_hour * 3600 if rate_per_hour > 0 else None
+        return {
+            "calls_last_24h": self.upstream_calls_since(now - 86400),
+            "rate_per_hour": round(rate_per_hour, 2),
+            "day_remaining": day_remaining,
+            "projected_exhaustion_at": _iso(exhaustion) if exhaustion is not None else None,
+            "exhausts_within_24h": exhaustion is not None and exhaustion - now < 86400,
+        }
+
+    def stats(self) -> dict:
+        return {"pending": self._queue.qsize(), "written": self.written, "dropped": self.dropped, "hours": len(self._hourly)}
@@ -0,0 +1 @@
+# Benchmarks do IsCoolGPT (não rodam no CI)
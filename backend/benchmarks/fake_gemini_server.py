@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Stand-in local do Gemini para benchmarks
+Responde GenerateContent via gRPC e REST com latência simulada, sem
+consumir cota. Uso:
+
+    python -m benchmarks.fake_gemini_server --grpc-port 50051 --rest-port 8081
+"""
+
+import argparse
+import asyncio
+
+import grpc
+import uvicorn
+from fastapi import FastAPI, Request
+from google.ai import generativelanguage_v1beta as glm
+
+SERVICE = "google.ai.generativelanguage.v1beta.GenerativeService"
+
+
+def fake_text(prompt: str) -> str:
+    return f"Resposta simulada para: {prompt[:40]}"
+
+
+def build_response(prompt: str) -> glm.GenerateContentResponse:
+    text = fake_text(prompt)
+    return glm.GenerateContentResponse(
+        candidates=[glm.Candidate(
+            content=glm.Content(parts=[glm.Part(text=text)], role="model"),
+            finish_reason=glm.Candidate.FinishReason.STOP,
+        )],
+        usage_metadata=glm.GenerateContentResponse.UsageMetadata(
+            prompt_token_count=max(1, len(prompt) // 4),
+            candidates_token_count=max(1, len(text) // 4),
+            total_token_count=max(1, len(prompt) // 4) + max(1, len(text) // 4),
+        ),
+    )
+
+
+def prompt_of(request: glm.GenerateContentRequest) -> str:
+    return " ".join(part.text for content in request.contents for part in content.parts)
+
+
+async def start_grpc(port: int, latency: float) -> grpc.aio.Server:
+    async def generate_content(request, context):
+        await asyncio.sleep(latency)
+        return build_response(prompt_of(request))
+
+    async def stream_generate_content(request, context):
+        # Dois chunks: metade da latência até o primeiro, metade até o segundo
+        text = fake_text(prompt_of(request))
+        for part in (text[:len(text) // 2], text[len(text) // 2:]):
+            await asyncio.sleep(latency / 2)
+            chunk = build_response(prompt_of(request))
+            chunk.candidates[0].content.parts[0].text = part
+            yield chunk
+
+    handler = grpc.method_handlers_generic_handler(SERVICE, {
+        "GenerateContent": grpc.unary_unary_rpc_method_handler(
+            generate_content,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=glm.GenerateContentResponse.serialize,
+        ),
+        "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+            stream_generate_content,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=glm.GenerateContentResponse.serialize,
+        ),
+    })
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((handler,))
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    await server.start()
+    return server
+
+
+def build_rest_app(latency: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.head("/")
+    async def warm_up_probe():
+        return None
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request):
+        body = await request.body()
+        parsed = glm.GenerateContentRequest.from_json(body, ignore_unknown_fields=True)
+        await asyncio.sleep(latency)
+        return glm.GenerateContentResponse.to_dict(build_response(prompt_of(parsed)))
+
+    return app
+
+
+async def start_rest(port: int, latency: float) -> asyncio.Task:
+    """Sobe o servidor REST em background; para encerrar, cancele a task retornada"""
+    config = uvicorn.Config(
+        build_rest_app(latency), host="127.0.0.1", port=port, log_level="warning", lifespan="off"
+    )
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    task.server = server
+    return task
+
+
+async def stop_rest(task: asyncio.Task) -> None:
+    task.server.should_exit = True
+    await task
+
+
+async def main(args) -> None:
+    latency = args.latency_ms / 1000
+    grpc_server = await start_grpc(args.grpc_port, latency)
+    await start_rest(args.rest_port, latency)
+    print(f"🧪 Stand-in do Gemini: gRPC em :{args.grpc_port}, REST em :{args.rest_port} ({args.latency_ms}ms)")
+    await grpc_server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in local do Gemini")
+    parser.add_argument("--grpc-port", type=int, default=50051)
+    parser.add_argument("--rest-port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Replay do tráfego capturado contra uma instância em execução
+Reenvia as requisições do log de captura (CAPTURE_ENABLED=true) em malha
+aberta: cada requisição sai no seu horário, tenham as anteriores respondido
+ou não, como chegam alunos reais. As chegadas seguem os instantes gravados
+(acelerados por --speed) ou um processo de Poisson com a mesma taxa média.
+Mostra percentis de latência, taxa de erro e acerto de cache por endpoint
+(acertos vêm da diferença do /usage do servidor antes e depois do replay).
+Uso:
+
+    python -m benchmarks.replay capture/ --target http://localhost:8000 --speed 4
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.capture import read_capture
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def arrival_offsets(
+    timestamps: List[float], speed: float = 1.0, mode: str = "recorded", rng: random.Random = None
+) -> List[float]:
+    """Segundos, desde o início do replay, em que cada requisição deve sair"""
+    if not timestamps:
+        return []
+    if mode == "recorded":
+        return [(ts - timestamps[0]) / speed for ts in timestamps]
+    # Poisson: mesma taxa média da captura, intervalos exponenciais
+    rng = rng or random.Random()
+    span = timestamps[-1] - timestamps[0]
+    if span <= 0:
+        return [0.0] * len(timestamps)
+    rate = (len(timestamps) - 1) / span * speed
+    offsets, elapsed = [0.0], 0.0
+    for _ in timestamps[1:]:
+        elapsed += rng.expovariate(rate)
+        offsets.append(elapsed)
+    return offsets
+
+
+def is_error(status: Optional[int]) -> bool:
+    """Falha de conexão, 5xx (inclui 503 de load shedding) ou 429"""
+    return status is None or status >= 500 or status == 429
+
+
+async def send(client: httpx.AsyncClient, record: dict, api_key: str, results: list) -> None:
+    headers = {}
+    if record["client"]:
+        headers["X-Client-Id"] = record["client"]
+    if api_key:
+        headers["X-API-Key"] = api_key
+    start = time.perf_counter()
+    try:
+        response = await client.request(
+            record["method"], record["path"], params=record["query"], json=record["body"], headers=headers
+        )
+        status = response.status_code
+    except httpx.HTTPError:
+        status = None
+    results.append((record["path"], status, time.perf_counter() - start))
+
+
+async def usage_totals(client: httpx.AsyncClient) -> Optional[dict]:
+    """Contadores do ledger de uso do servidor por endpoint (None se indisponível)"""
+    try:
+        response = await client.get("/usage", params={"hours": 24})
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    return response.json()["totals"]
+
+
+def cache_hit_ratio(before: Optional[dict], after: Optional[dict], endpoint: str) -> Optional[float]:
+    if before is None or after is None or endpoint not in after:
+        return None
+    old = before.get(endpoint, {})
+    requests = after[endpoint]["requests"] - old.get("requests", 0)
+    hits = after[endpoint]["cache_hits"] - old.get("cache_hits", 0)
+    return hits / requests if requests > 0 else None
+
+
+async def replay(records: List[dict], offsets: List[float], args) -> tuple:
+    results, lags = [], []
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        before = await usage_totals(client)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = []
+        for record, offset in zip(records, offsets):
+            delay = start + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, loop.time() - start - offset))
+            tasks.append(asyncio.create_task(send(client, record, args.api_key, results)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+        after = await usage_totals(client)
+    return results, lags, elapsed, before, after
+
+
+def report(results: list, lags: list, elapsed: float, before, after, args) -> None:
+    print(
+        f"\n📊 Replay: {len(results)} requisições em {elapsed:.1f}s "
+        f"({args.speed:g}×, chegadas {args.arrivals}; atraso máx. de disparo {max(lags) * 1000:.0f}ms)"
+    )
+    print(f"{'endpoint':<22} {'reqs':>6} {'erros':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'cache':>7}")
+    for path in sorted({path for path, _, _ in results}):
+        rows = [(status, latency) for p, status, latency in results if p == path]
+        latencies = [latency * 1000 for _, latency in rows]
+        errors = sum(1 for status, _ in rows if is_error(status))
+        # /explain/stream é contabilizado como /explain no ledger
+        ratio = cache_hit_ratio(before, after, path.removesuffix("/stream"))
+        print(
+            f"{path:<22} {len(rows):>6} {errors / len(rows):>6.1%} {percentile(latencies, 50):>6.0f}ms "
+            f"{percentile(latencies, 95):>6.0f}ms {percentile(latencies, 99):>6.0f}ms "
+            f"{f'{ratio:.0%}' if ratio is not None else '-':>7}"
+        )
+    statuses = {}
+    for _, status, _ in results:
+        statuses[status or "conexão"] = statuses.get(status or "conexão", 0) + 1
+    print("status: " + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items(), key=str)))
+    if before is None or after is None:
+        print("💡 /usage indisponível no alvo: acerto de cache não calculado.")
+
+
+def main(args) -> None:
+    records = sorted(read_capture(args.paths), key=lambda record: record["ts"])
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        sys.exit("Nenhuma requisição capturada encontrada")
+    offsets = arrival_offsets(
+        [record["ts"] for record in records], args.speed, args.arrivals, random.Random(args.seed)
+    )
+    results, lags, elapsed, before, after = asyncio.run(replay(records, offsets, args))
+    report(results, lags, elapsed, before, after, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay em malha aberta do tráfego capturado")
+    parser.add_argument("paths", nargs="+", help="Arquivos ou diretórios de captura")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Fator de aceleração (4 = 4× mais rápido)")
+    parser.add_argument("--arrivals", choices=("recorded", "poisson"), default="recorded")
+    parser.add_argument("--seed", type=int, default=None, help="Semente das chegadas Poisson")
+    parser.add_argument("--limit", type=int, default=0, help="Reenvia só as primeiras N requisições")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument("--api-key", default="", help="X-API-Key do tenant usado no replay")
+    main(parser.parse_args())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark da fila de revisão espaçada com milhões de questões agendadas
+Agenda --cards questões distribuídas entre --students alunos, mede o custo
+de registrar um resultado (reagendamento SM-2) e de buscar a próxima
+questão vencida (heap, O(log n)), comparado a varrer o deck inteiro atrás
+do menor vencimento, e a memória por questão agendada.
+Uso:
+
+    python -m benchmarks.review_benchmark --cards 2000000 --students 1000
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.review import ReviewScheduler
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def schedule(review: ReviewScheduler, students: int, cards: int, rng: random.Random) -> float:
+    """Agenda `cards` questões com notas aleatórias; devolve o tempo total"""
+    start = time.perf_counter()
+    for i in range(cards):
+        review.record(f"aluno-{i % students}", f"{rng.getrandbits(64):016x}", rng.randint(0, 5))
+    return time.perf_counter() - start
+
+
+def scan_next_due(review: ReviewScheduler, student: str):
+    """Linha de base: varre o deck inteiro atrás do menor vencimento"""
+    deck = review._decks[student]
+    return min(deck.slot_of.values(), key=deck.due.__getitem__)
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    clock = Clock()
+    review = ReviewScheduler(max_students=args.students, clock=clock)
+
+    if args.memory:
+        tracemalloc.start()
+    elapsed = schedule(review, args.students, args.cards, rng)
+    if args.memory:
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+    # Todo mundo com revisões vencidas: cada busca encontra questão no topo
+    clock.now += 30 * 86400
+    students = [f"aluno-{rng.randrange(args.students)}" for _ in range(args.lookups)]
+    next_timings, record_timings = [], []
+    for student in students:
+        start = time.perf_counter()
+        card = review.next_due(student)
+        next_timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        review.record(student, card["question_id"], rng.randint(0, 5))
+        record_timings.append(time.perf_counter() - start)
+
+    scan_timings = []
+    for student in students[:args.scan_lookups]:
+        start = time.perf_counter()
+        scan_next_due(review, student)
+        scan_timings.append(time.perf_counter() - start)
+
+    per_student = args.cards // args.students
+    print(f"\n📊 Revisão espaçada: {args.cards:,} questões agendadas, {args.students:,} alunos (~{per_student:,} por aluno)")
+    print(f"agendamento inicial: {elapsed:.1f}s ({args.cards / elapsed:,.0f} questões/s)")
+    if args.memory:
+        print(f"memória: {memory / 2**20:,.0f} MiB ({memory / args.cards:.0f} bytes por questão)")
+    print(f"{'operação':<32} {'p50':>9} {'p99':>9}")
+    for label, timings in (
+        ("próxima vencida (heap)", next_timings),
+        ("registrar resultado (SM-2)", record_timings),
+        ("próxima vencida (varredura)", scan_timings),
+    ):
+        print(f"{label:<32} {percentile(timings, 50) * 1e6:>7.1f}µs {percentile(timings, 99) * 1e6:>7.1f}µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da fila de revisão SM-2")
+    parser.add_argument("--cards", type=int, default=1_000_000)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=20000, help="Buscas + respostas medidas após o agendamento")
+    parser.add_argument("--scan-lookups", type=int, default=200, help="Buscas da linha de base por varredura")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--memory", action="store_true", help="Mede a memória com tracemalloc (mais lento)")
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark de transporte upstream (gRPC x REST)
+Mede a latência da primeira requisição com conexão fria e a latência em
+regime com o pool aquecido, contra o stand-in local (sem consumir cota).
+Uso:
+
+    python -m benchmarks.transport_benchmark --requests 50 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.transport import ModelPool
+from benchmarks.fake_gemini_server import start_grpc, start_rest, stop_rest
+
+MODEL = "gemini-2.0-flash-lite"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def make_pool(transport, port, pool_size):
+    return ModelPool(
+        MODEL, {"max_output_tokens": 256}, "fake-key",
+        transport=transport, pool_size=pool_size,
+        endpoint=f"127.0.0.1:{port}", insecure=True,
+    )
+
+
+async def timed_call(pool) -> float:
+    start = time.perf_counter()
+    response = await pool.generate_content_async("Explique fotossíntese", request_options={"timeout": 10})
+    assert response.text
+    return (time.perf_counter() - start) * 1000
+
+
+async def bench_transport(transport, port, args) -> dict:
+    # Frio: pool novo, sem warm-up - a primeira chamada paga o setup da conexão
+    cold_pool = make_pool(transport, port, args.pool_size)
+    cold_ms = await timed_call(cold_pool)
+    await cold_pool.close()
+
+    # Aquecido: warm-up no "startup", depois tráfego
+    warm_pool = make_pool(transport, port, args.pool_size)
+    warmup = await warm_pool.warm_up(timeout=5)
+    first_warm_ms = await timed_call(warm_pool)
+    latencies = [await timed_call(warm_pool) for _ in range(args.requests)]
+    await warm_pool.close()
+
+    return {
+        "transport": transport,
+        "cold_first_ms": cold_ms,
+        "warmup_ms": warmup["seconds"] * 1000,
+        "warm_first_ms": first_warm_ms,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+async def main(args) -> None:
+    latency = args.latency_ms / 1000
+    grpc_server = await start_grpc(args.grpc_port, latency)
+    rest_task = await start_rest(args.rest_port, latency)
+    try:
+        results = [
+            await bench_transport("grpc", args.grpc_port, args),
+            await bench_transport("rest", args.rest_port, args),
+        ]
+    finally:
+        await grpc_server.stop(None)
+        await stop_rest(rest_task)
+
+    print(f"\n📊 Transporte upstream - stand-in local ({args.latency_ms}ms de latência simulada, {args.requests} requisições)")
+    print(f"{'transporte':<10} {'1ª fria':>10} {'warm-up':>10} {'1ª aquecida':>12} {'p50':>8} {'p95':>8}")
+    for r in results:
+        print(
+            f"{r['transport']:<10} {r['cold_first_ms']:>8.1f}ms {r['warmup_ms']:>8.1f}ms "
+            f"{r['warm_first_ms']:>10.1f}ms {r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms"
+        )
+    print("\n💡 Stand-in sem TLS: em produção o custo frio inclui o handshake TLS e é bem maior.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark gRPC x REST")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency-ms", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--grpc-port", type=int, default=50051)
+    parser.add_argument("--rest-port", type=int, default=8081)
+    asyncio.run(main(parser.parse_args()))
@@ -3,15 +3,34 @@
 import sys
 import os
 from pathlib import Path
+from types import SimpleNamespace
 
 # Adiciona o diretório pai (backend) ao Python path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
+# Os testes mantêm os handlers do pytest no logger raiz (sem o pipeline em fila do lifespan)
+os.environ.setdefault("LOG_CONFIGURE", "false")
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path_factory, monkeypatch):
+    """Bancos e arquivos da aplicação num diretório temporário: nada fica em backend/ nem passa de um teste para outro"""
+    from app import main
+
+    storage = tmp_path_factory.mktemp("storage")  # separado do tmp_path do teste
+    monkeypatch.setattr(main.job_queue, "db_path", str(storage / "jobs.db"))
+    monkeypatch.setattr(main.settings, "CONTENT_DB_PATH", str(storage / "content.db"))
+    monkeypatch.setattr(main.settings, "DOCUMENTS_DB_PATH", str(storage / "documents.db"))
+    monkeypatch.setattr(main.settings, "USAGE_LEDGER_DIR", str(storage / "usage"))
+    monkeypatch.setattr(main.settings, "REVIEW_DB_PATH", str(storage / "review.db"))
+    main.open_stores()
+    yield storage
+    main.close_stores()
+
 @pytest.fixture
 def client():
     """Cliente de teste FastAPI"""
@@ -61,4 +80,59 @@ def sample_study_plan_request():
 # Constantes para testes
 VALID_DIFFICULTY_LEVELS = ["easy", "medium", "hard"]
 VALID_QUESTION_TYPES = ["multiple_choice", "open_ended", "true_false"]
-VALID_EXPLANATION_LEVELS = ["beginner", "intermediate", "advanced"]
\ No newline at end of file
+VALID_EXPLANATION_LEVELS = ["beginner", "intermediate", "advanced"]
+
+class FakeResponse:
+    """Resposta mínima no formato do google.generativeai"""
+
+    def __init__(self, text, output_tokens=None, finish_reason="STOP"):
+        self.text = text
+        tokens = output_tokens if output_tokens is not None else max(1, len(text) // 4)
+        self.usage_metadata = SimpleNamespace(prompt_token_count=10, candidates_token_count=tokens)
+        self.candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name=finish_reason))]
+
+
+class FakeModel:
+    """Modelo Gemini falso: não consome tokens, permite simular falhas"""
+
+    def __init__(self, text="Resposta gerada"):
+        self.text = text
+        self.fail = False
+        self.finish_reason = "STOP"
+        self.calls = []
+        self.call_kwargs = []
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls.append(prompt)
+        self.call_kwargs.append(kwargs)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return FakeResponse(self.text, finish_reason=self.finish_reason)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Substitui o modelo real por um FakeModel e limpa cache/circuit breaker"""
+    from app import main
+    from app.cache import ResponseCache
+    from app.circuit_breaker import CircuitBreaker
+    from app.limiter import AdaptiveLimiter
+    from app.profiles import ProfileRegistry, load_profiles
+    from app.scheduler import FairScheduler
+
+    model = FakeModel()
+    monkeypatch.setattr(main, "is_ci", False)
+    monkeypatch.setattr(main, "skip_api_validation", False)
+    monkeypatch.setattr(main, "model", model)
+    monkeypatch.setattr(main.upstream, "model", model)
+    monkeypatch.setattr(main.upstream, "breaker", CircuitBreaker(min_requests=2, open_seconds=30))
+    monkeypatch.setattr(main, "breaker", main.upstream.breaker)
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    monkeypatch.setattr(main, "profiles", ProfileRegistry(load_profiles()))
+    scheduler = FairScheduler(main.tenants.policies(), main.tenants.default, concurrency=4)
+    monkeypatch.setattr(main.upstream, "scheduler", scheduler)
+    monkeypatch.setattr(main, "scheduler", scheduler)
+    limiter = AdaptiveLimiter()
+    monkeypatch.setattr(main.upstream, "limiter", limiter)
+    monkeypatch.setattr(main, "limiter", limiter)
+    return model
@@ -0,0 +1,97 @@
+# Testes da captura de tráfego e do replay
+
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.capture import Anonymizer, TrafficCapture, capture_files, read_capture
+from benchmarks.replay import arrival_offsets, cache_hit_ratio
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_anonymizer_keeps_sizes_repetitions_and_categories():
+    anonymizer = Anonymizer("salt")
+    payload = {"concept": "Fotossíntese", "level": "beginner", "subject": "Biologia", "duration_weeks": 8}
+    scrubbed = anonymizer.scrub(payload)
+
+    assert scrubbed["concept"] != "Fotossíntese" and len(scrubbed["concept"]) == len("Fotossíntese")
+    assert scrubbed["level"] == "beginner"
+    assert scrubbed["duration_weeks"] == 8
+    assert anonymizer.scrub(payload) == scrubbed  # mesma entrada, mesmo token: acertos de cache se mantêm
+    assert Anonymizer("outro").scrub(payload)["concept"] != scrubbed["concept"]
+    assert len(anonymizer.token("x" * 500)) == 500
+
+
+def test_sampling_respects_paths_and_rate():
+    capture = TrafficCapture("unused", Anonymizer("s"), paths=["/explain"], enabled=True, sample_rate=0.5,
+                             rng=random.Random(1))
+    assert not capture.wants("GET", "/health")
+    sampled = sum(capture.wants("POST", "/explain") for _ in range(1000))
+    assert 400 < sampled < 600
+    assert not TrafficCapture("unused", Anonymizer("s"), paths=["/explain"], sample_rate=1.0).wants("POST", "/explain")
+
+
+@pytest.mark.asyncio
+async def test_capture_rotates_and_prunes_files(tmp_path):
+    clock = FakeClock()
+    capture = TrafficCapture(str(tmp_path), Anonymizer("s"), enabled=True, max_file_bytes=300, max_files=2,
+                             clock=clock)
+    for i in range(12):
+        clock.now += 1
+        capture.record("POST", "/explain", {}, b'{"concept": "Conceito %d", "level": "advanced"}' % i)
+        await capture.flush()
+
+    files = capture_files(str(tmp_path))
+    assert len(files) == 2
+    assert capture.stats()["rotations"] >= 2
+    rows = list(read_capture([str(tmp_path)]))
+    assert rows and all(row["path"] == "/explain" and row["body"]["level"] == "advanced" for row in rows)
+    assert rows == sorted(rows, key=lambda row: row["ts"])
+    assert "Conceito" not in "".join(open(name).read() for name in files)
+
+
+@pytest.mark.asyncio
+async def test_middleware_captures_generation_requests(fake_model, monkeypatch, tmp_path, sample_explain_request):
+    from app import main
+
+    capture = TrafficCapture(str(tmp_path), Anonymizer("s"), paths=["/explain"], enabled=True, sample_rate=1.0)
+    monkeypatch.setattr(main, "capture", capture)
+
+    client = TestClient(main.app)
+    client.get("/health")
+    response = client.post("/explain", json=sample_explain_request, headers={"X-Client-Id": "aluno-42"})
+    assert response.status_code == 200
+    await capture.flush()
+
+    rows = list(read_capture([str(tmp_path)]))
+    assert len(rows) == 1
+    assert rows[0]["method"] == "POST" and rows[0]["path"] == "/explain"
+    assert rows[0]["body"]["level"] == sample_explain_request["level"]
+    assert rows[0]["body"]["concept"] != sample_explain_request["concept"]
+    assert rows[0]["client"] and rows[0]["client"] != "aluno-42"
+
+
+def test_arrival_offsets_scale_and_poisson_rate():
+    timestamps = [100.0, 101.0, 103.0, 107.0]
+    assert arrival_offsets(timestamps, speed=2.0) == [0.0, 0.5, 1.5, 3.5]
+
+    many = [float(i) for i in range(2001)]  # 1 req/s
+    offsets = arrival_offsets(many, speed=4.0, mode="poisson", rng=random.Random(7))
+    assert offsets == sorted(offsets)
+    assert 450 < offsets[-1] < 550  # ~2000 chegadas a 4 req/s
+
+
+def test_cache_hit_ratio_from_usage_diff():
+    before = {"/explain": {"requests": 10, "cache_hits": 2}}
+    after = {"/explain": {"requests": 30, "cache_hits": 12}, "/summarize": {"requests": 4, "cache_hits": 1}}
+    assert cache_hit_ratio(before, after, "/explain") == 0.5
+    assert cache_hit_ratio(before, after, "/summarize") == 0.25
+    assert cache_hit_ratio(None, after, "/explain") is None
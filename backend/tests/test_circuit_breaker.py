@@ -0,0 +1,134 @@
+"""
+Testes do circuit breaker e do fallback stale
+Usam um modelo falso - NÃO consomem tokens da API
+"""
+
+import pytest
+
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Transições closed -> open -> half_open -> closed"""
+
+    def test_opens_on_error_rate(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_requests=4, error_rate_threshold=0.5, clock=clock)
+        breaker.record_success(0.1)
+        breaker.record_success(0.1)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_slow_calls_count_as_bad(self):
+        breaker = CircuitBreaker(min_requests=2, slow_call_seconds=5, clock=FakeClock())
+        breaker.record_success(10)
+        breaker.record_success(10)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_half_open_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_requests=1, open_seconds=30, clock=clock)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        clock.now = 31
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()  # chamada de teste permitida
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()  # apenas uma por vez
+        breaker.record_success(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_failure_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_requests=1, open_seconds=30, clock=clock)
+        breaker.record_failure()
+        clock.now = 31
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_cancelled_probe_returns_slot(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_requests=1, open_seconds=30, clock=clock)
+        breaker.record_failure()
+        clock.now = 31
+        probe = breaker.before_call()
+        breaker.cancel_call(probe)  # teste cancelado antes do resultado
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()  # a vaga voltou
+
+        breaker.record_failure()
+        clock.now = 62
+        fresh = breaker.before_call()
+        breaker.cancel_call(probe)  # token de um half-open anterior não devolve a vaga atual
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.cancel_call(fresh)
+        breaker.before_call()
+
+    def test_old_calls_leave_window(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(window_seconds=60, min_requests=2, clock=clock)
+        breaker.record_failure()
+        clock.now = 120
+        breaker.record_success(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.error_rate() == 0.0
+
+
+class TestStaleFallback:
+    """Endpoints com Gemini degradado"""
+
+    def test_serves_stale_when_upstream_fails(self, client, fake_model):
+        from app import main
+
+        data = {"concept": "Fotossíntese", "level": "beginner"}
+        response = client.post("/explain", json=data)
+        assert response.status_code == 200
+        assert "stale" not in response.json()
+
+        # Expira o cache e derruba o upstream
+        main.response_cache.ttl_seconds = -1
+        fake_model.fail = True
+        response = client.post("/explain", json=data)
+        assert response.status_code == 200
+        assert response.json()["stale"] is True
+        assert response.json()["explanation"] == "Resposta gerada"
+
+    def test_fails_fast_when_open(self, client, fake_model):
+        fake_model.fail = True
+        for _ in range(2):
+            response = client.post("/summarize", json={"content": "abc"})
+            assert response.status_code == 502
+            assert "upstream down" not in response.text
+
+        calls = len(fake_model.calls)
+        response = client.post("/summarize", json={"content": "abc"})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        assert len(fake_model.calls) == calls  # não chamou o Gemini
+
+    def test_full_health_check_goes_through_breaker(self, client, fake_model):
+        from app import main
+
+        assert client.get("/health/full").json()["gemini_connection"] == "ok"
+        fake_model.fail = True
+        for _ in range(2):
+            assert client.get("/health/full").json()["status"] == "degraded"
+        calls = len(fake_model.calls)
+        assert client.get("/health/full").json()["status"] == "degraded"
+        assert len(fake_model.calls) == calls  # circuito aberto: o health check não chama o Gemini
+        assert main.breaker.state == main.CircuitBreaker.OPEN
@@ -0,0 +1,138 @@
+# Testes do acervo pesquisável de conteúdo gerado
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.content_store import ContentStore, ContentWriter, match_query
+
+
+def record(title, body, endpoint="/explain", subject="Biologia", **payload):
+    return {"endpoint": endpoint, "title": title, "subject": subject, "body": body, "payload": payload}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ContentStore(str(tmp_path / "content.db"))
+    yield store
+    store.close()
+
+
+def test_match_query_is_safe_for_fts_syntax():
+    assert match_query('Fotossíntese "C4" OR -x*') == '"fotossintese" "c4" "or" "x"'
+    assert match_query("?!") is None
+
+
+def test_search_ranks_title_matches_first_and_paginates(store):
+    store.append_many([
+        record("Respiração celular", "Processo que usa o oxigênio; diferente da fotossíntese"),
+        record("Fotossíntese", "Converte luz em energia química"),
+        record("Mitose", "Divisão celular", subject="Genética"),
+    ])
+
+    total, results = store.search("fotossintese")
+    assert total == 2
+    assert results[0]["title"] == "Fotossíntese"
+    assert "[fotossíntese]" in results[1]["snippet"]
+
+    total, page = store.search("celular", limit=1, offset=1)
+    assert total == 2 and len(page) == 1
+    assert store.search("celular", subject="genética")[0] == 1
+
+
+def test_find_reusable_requires_strong_match(store):
+    store.append_many([
+        record("Fotossíntese C4", "Plantas C4", level="beginner"),
+        record("fotossintese", "Explicação básica", level="beginner"),
+    ])
+
+    found = store.find_reusable("/explain", "Fotossíntese", "Biologia", {"level": "beginner"})
+    assert found["body"] == "Explicação básica"
+    assert store.find_reusable("/explain", "Fotossíntese", "Biologia", {"level": "advanced"}) is None
+    assert store.find_reusable("/explain", "Fotossíntese", "Química", {"level": "beginner"}) is None
+    assert store.find_reusable("/generate-question", "Fotossíntese", "Biologia") is None
+
+
+@pytest.mark.asyncio
+async def test_writer_batches_off_request_path(store):
+    writer = ContentWriter(store, batch_size=3, flush_interval=0.05)
+    writer.start()
+    for i in range(7):
+        writer.submit("/explain", f"Conceito {i}", "texto")
+    await asyncio.sleep(0.2)
+    await writer.stop()
+
+    assert store.count() == 7
+    assert writer.stats()["batches"] == 3
+
+
+def test_generated_content_is_searchable_and_reusable(fake_model, monkeypatch, tmp_path):
+    from app import main
+    from app.cache import ResponseCache
+
+    store = ContentStore(str(tmp_path / "content.db"))
+    writer = ContentWriter(store)
+    monkeypatch.setattr(main, "content_store", store)
+    monkeypatch.setattr(main, "content_writer", writer)
+    client = TestClient(main.app)
+    fake_model.text = "A fotossíntese transforma luz em energia química"
+
+    explain = {"concept": "Fotossíntese", "level": "beginner", "subject": "Biologia"}
+    assert client.post("/explain", json=explain).status_code == 200
+    asyncio.run(writer.flush())
+
+    response = client.get("/search", params={"q": "energia luz"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == 1
+    content_id = body["results"][0]["id"]
+    assert client.get(f"/content/{content_id}").json()["payload"]["concept"] == "Fotossíntese"
+
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    reused = client.post("/explain", params={"reuse": "true"}, json={**explain, "concept": "fotossintese"})
+    assert reused.json()["reused_content_id"] == content_id
+    assert len(fake_model.calls) == 1
+    store.close()
+
+
+def test_study_plan_stored_as_markdown_and_reused(fake_model, monkeypatch, tmp_path):
+    import json
+
+    from app import main
+    from app.cache import ResponseCache
+
+    store = ContentStore(str(tmp_path / "content.db"))
+    writer = ContentWriter(store)
+    monkeypatch.setattr(main, "content_store", store)
+    monkeypatch.setattr(main, "content_writer", writer)
+    client = TestClient(main.app)
+    fake_model.text = json.dumps([
+        {"week": week, "topic": f"Tópico {week}", "goals": ["Objetivo"], "activities": ["Atividade"]}
+        for week in range(1, 3)
+    ])
+    request = {"subject": "Química", "duration_weeks": 2, "daily_hours": 1}
+    plan = client.post("/study-plan", json=request).json()
+    asyncio.run(writer.flush())
+
+    content_id = client.get("/search", params={"q": "Química"}).json()["results"][0]["id"]
+    body = client.get(f"/content/{content_id}").json()["body"]
+    assert body == plan["study_plan"] and "Semana 2: Tópico 2" in body
+
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    reused = client.post("/study-plan", params={"reuse": "true"}, json=request).json()
+    assert reused["reused_content_id"] == content_id and reused["study_plan"] == plan["study_plan"]
+    assert len(fake_model.calls) == 1
+    store.close()
+
+
+def test_lifespan_opens_and_closes_store(monkeypatch, tmp_path):
+    from app import main
+
+    monkeypatch.setattr(main.settings, "CONTENT_DB_PATH", str(tmp_path / "lifespan.db"))
+    main.close_stores()  # o conftest já abriu; o lifespan só cuida do que ele mesmo abrir
+    with TestClient(main.app) as client:
+        assert client.get("/metrics").status_code == 200
+        assert (tmp_path / "lifespan.db").exists()
+    assert main.content_store is None
+    main.open_stores()  # para o teardown do conftest
@@ -0,0 +1,345 @@
+# Testes de cancelamento quando o cliente desconecta
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.disconnect import ClientDisconnected, InFlight, current_disconnect, until_disconnected
+from tests.conftest import FakeResponse
+
+
+class SlowModel:
+    """Modelo que só responde quando `release` é sinalizado; registra cancelamentos"""
+
+    def __init__(self, chunks=("Parte 1. ", "Parte 2.")):
+        self.chunks = list(chunks)
+        self.release = asyncio.Event()
+        self.calls = 0
+        self.cancelled = 0
+        self.stream_closed = False
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return self._stream()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return FakeResponse("".join(self.chunks))
+
+    async def _stream(self):
+        try:
+            yield FakeResponse(self.chunks[0])
+            await self.release.wait()
+            for text in self.chunks[1:]:
+                yield FakeResponse(text)
+        finally:
+            self.stream_closed = True
+
+
+async def call_asgi(
+    app, path: str, payload: dict, disconnect: asyncio.Event, sent: list = None, headers: list = ()
+) -> list:
+    """Requisição ASGI crua; o cliente "fecha a aba" quando `disconnect` é sinalizado"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json"), *headers],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    messages = [{"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}]
+    sent = [] if sent is None else sent
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def slow_model(fake_model, monkeypatch):
+    from app import main
+
+    model = SlowModel()
+    monkeypatch.setattr(main, "model", model)
+    monkeypatch.setattr(main.upstream, "model", model)
+    monkeypatch.setattr(main, "inflight", InFlight())
+    return model
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_generation():
+    flights = InFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await release.wait()
+        return "ok"
+
+    first = asyncio.create_task(flights.run("k", generate))
+    second = asyncio.create_task(flights.run("k", generate))
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(first, second) == ["ok", "ok"]
+    assert calls == [1]
+    assert flights.stats()["coalesced"] == 1
+    assert "k" not in flights
+
+
+@pytest.mark.asyncio
+async def test_generation_cancelled_only_when_last_waiter_leaves():
+    flights = InFlight()
+    release = asyncio.Event()
+    gone_a, gone_b = asyncio.Event(), asyncio.Event()
+
+    async def generate():
+        await release.wait()
+        return "ok"
+
+    async def waiter(event):
+        current_disconnect.set(event)
+        return await flights.run("k", generate, expected_tokens=500)
+
+    a = asyncio.create_task(waiter(gone_a))
+    b = asyncio.create_task(waiter(gone_b))
+    await asyncio.sleep(0)
+    gone_a.set()
+    with pytest.raises(ClientDisconnected):
+        await a
+    assert "k" in flights  # b ainda espera: a geração continua
+    gone_b.set()
+    with pytest.raises(ClientDisconnected):
+        await b
+    await asyncio.sleep(0)
+    assert "k" not in flights
+
+    stats = flights.stats()
+    assert stats["abandoned_requests"] == 2
+    assert stats["kept_for_other_waiters"] == 1
+    assert stats["upstream_cancelled"] == 1
+    assert stats["estimated_tokens_saved"] == 500
+
+
+@pytest.mark.asyncio
+async def test_waiter_without_request_keeps_generation_alive():
+    flights = InFlight()
+    release = asyncio.Event()
+    gone = asyncio.Event()
+
+    async def generate():
+        await release.wait()
+        return "ok"
+
+    async def client():
+        current_disconnect.set(gone)
+        return await flights.run("k", generate)
+
+    request = asyncio.create_task(client())
+    background = asyncio.create_task(flights.run("k", generate))  # job/prefetch: sem evento de disconnect
+    await asyncio.sleep(0)
+    gone.set()
+    with pytest.raises(ClientDisconnected):
+        await request
+    release.set()
+    assert await background == "ok"
+    assert flights.stats()["upstream_cancelled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_until_disconnected_passes_result_through():
+    assert await until_disconnected(asyncio.sleep(0, result=42), asyncio.Event()) == 42
+
+
+@pytest.mark.asyncio
+async def test_study_plan_upstream_cancelled_on_disconnect(slow_model, sample_study_plan_request):
+    from app import main
+
+    gone = asyncio.Event()
+    request = asyncio.create_task(call_asgi(main.app, "/study-plan", sample_study_plan_request, gone))
+    await wait_until(lambda: slow_model.calls == 1)
+    gone.set()
+    sent = await request
+
+    assert sent[0]["status"] == 499
+    assert slow_model.cancelled == 1
+    stats = main.inflight.stats()
+    assert stats["upstream_cancelled"] == 1
+    assert stats["estimated_tokens_saved"] > 0
+    assert main.response_cache.get(main.response_cache.make_key("/study-plan", sample_study_plan_request)) is None
+
+
+@pytest.mark.asyncio
+async def test_coalesced_request_keeps_generation_and_fills_cache(slow_model, sample_study_plan_request):
+    from app import main
+
+    gone, stays = asyncio.Event(), asyncio.Event()
+    leaving = asyncio.create_task(call_asgi(main.app, "/study-plan", sample_study_plan_request, gone))
+    await wait_until(lambda: slow_model.calls == 1)
+    staying = asyncio.create_task(call_asgi(main.app, "/study-plan", sample_study_plan_request, stays))
+    await wait_until(lambda: main.inflight.stats()["coalesced"] == 1)
+
+    gone.set()
+    assert (await leaving)[0]["status"] == 499
+    slow_model.release.set()
+    sent = await staying
+
+    assert sent[0]["status"] == 200
+    assert slow_model.calls == 1 and slow_model.cancelled == 0
+    assert main.inflight.stats()["kept_for_other_waiters"] == 1
+    assert main.response_cache.get(main.response_cache.make_key("/study-plan", sample_study_plan_request))
+
+
+@pytest.mark.asyncio
+async def test_idempotent_retry_keeps_original_generation(slow_model, monkeypatch, sample_study_plan_request):
+    from app import main
+    from app.idempotency import IdempotencyStore
+
+    monkeypatch.setattr(main, "idempotency", IdempotencyStore())
+    key = [(b"idempotency-key", b"plano-1")]
+    gone, stays = asyncio.Event(), asyncio.Event()
+    original = asyncio.create_task(call_asgi(main.app, "/study-plan", sample_study_plan_request, gone, headers=key))
+    await wait_until(lambda: slow_model.calls == 1)
+    retry = asyncio.create_task(call_asgi(main.app, "/study-plan", sample_study_plan_request, stays, headers=key))
+    await wait_until(lambda: main.idempotency.stats()["attached"] == 1)
+
+    gone.set()  # o frontend abortou a primeira tentativa, a retentativa segue aguardando
+    await asyncio.sleep(0.05)
+    assert slow_model.cancelled == 0 and not original.done()
+
+    slow_model.release.set()
+    await original
+    sent = await retry
+    assert sent[0]["status"] == 200
+    assert (b"idempotent-replayed", b"true") in sent[0]["headers"]
+    assert slow_model.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_explain_stream_closes_upstream_on_disconnect(slow_model, sample_explain_request):
+    from app import main
+
+    gone, sent = asyncio.Event(), []
+    request = asyncio.create_task(call_asgi(main.app, "/explain/stream", sample_explain_request, gone, sent))
+    await wait_until(lambda: any(b"Parte 1" in m.get("body", b"") for m in sent))
+    gone.set()
+    await request
+
+    assert slow_model.stream_closed
+    stats = main.inflight.stats()
+    assert stats["abandoned_requests"] == 1 and stats["upstream_cancelled"] == 1
+    assert main.response_cache.get(main.response_cache.make_key("/explain", sample_explain_request)) is None
+
+
+@pytest.mark.asyncio
+async def test_explain_stream_with_idempotency_key_still_streams(slow_model, monkeypatch, sample_explain_request):
+    from app import main
+    from app.idempotency import IdempotencyStore
+
+    monkeypatch.setattr(main, "idempotency", IdempotencyStore())
+    gone, sent = asyncio.Event(), []
+    key = [(b"idempotency-key", b"stream-1")]
+    request = asyncio.create_task(
+        call_asgi(main.app, "/explain/stream", sample_explain_request, gone, sent, headers=key)
+    )
+    # O primeiro evento chega antes de o modelo terminar: nada é bufferizado
+    await wait_until(lambda: any(b"Parte 1" in m.get("body", b"") for m in sent))
+    assert not any(b"Parte 2" in m.get("body", b"") for m in sent)
+    assert main.idempotency.stats()["entries"] == 0
+
+    gone.set()
+    await request
+    assert slow_model.stream_closed and main.inflight.stats()["upstream_cancelled"] == 1
+
+
+def test_explain_stream_sends_chunks_and_fills_cache(slow_model, sample_explain_request):
+    from app import main
+
+    slow_model.release.set()
+    with TestClient(main.app) as client:
+        response = client.post("/explain/stream", json=sample_explain_request)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block for block in response.text.split("\n\n") if block]
+        deltas = [json.loads(block[len("data: "):])["delta"] for block in events[:-1]]
+        assert "".join(deltas) == "Parte 1. Parte 2."
+        assert events[-1].startswith("event: done")
+
+        again = client.post("/explain/stream", json=sample_explain_request)
+        assert '"cached": true' in again.text
+    assert slow_model.calls == 1
+
+
+def half_open_client(model, limiter=None):
+    from app.circuit_breaker import CircuitBreaker
+    from app.upstream import UpstreamClient
+
+    clock = [0.0]
+    breaker = CircuitBreaker(min_requests=1, open_seconds=30, clock=lambda: clock[0])
+    breaker.record_failure()
+    clock[0] = 31
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return UpstreamClient(model, breaker, timeout=5, limiter=limiter), breaker
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_probe_releases_breaker():
+    from app.circuit_breaker import CircuitBreaker
+
+    model = SlowModel()
+    upstream, breaker = half_open_client(model)
+    probe = asyncio.create_task(upstream.generate("teste"))
+    await wait_until(lambda: model.calls == 1)
+    probe.cancel()  # aluno fechou a aba durante o teste do half-open
+    await asyncio.gather(probe, return_exceptions=True)
+    assert model.cancelled == 1 and breaker.state == CircuitBreaker.HALF_OPEN
+
+    model.release.set()
+    await upstream.generate("teste")  # próxima chamada vira o teste e fecha o circuito
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    stream_model = SlowModel()
+    upstream, breaker = half_open_client(stream_model)
+    chunks = upstream.stream("teste")
+    await anext(chunks)
+    await chunks.aclose()
+    stream_model.release.set()
+    assert [chunk async for chunk in upstream.stream("teste")]
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_probe_shed_by_limiter_does_not_hold_breaker():
+    from app.circuit_breaker import CircuitBreaker
+    from app.limiter import AdaptiveLimiter, ConcurrencyLimitExceeded
+
+    model = SlowModel()
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1)
+    upstream, breaker = half_open_client(model, limiter)
+    limiter.acquire()  # limiter saturado
+    with pytest.raises(ConcurrencyLimitExceeded):
+        await upstream.generate("teste")
+    limiter.release(None)
+
+    model.release.set()
+    await upstream.generate("teste")
+    assert breaker.state == CircuitBreaker.CLOSED and limiter.snapshot()["in_flight"] == 0
@@ -0,0 +1,79 @@
+# Testes do índice de seções de planos e resumos
+
+import json
+
+from fastapi.testclient import TestClient
+
+from app.documents import DocumentStore, parse_sections, slugify
+
+SUMMARY = """Resumo de fotossíntese.
+
+## 🎯 Pontos principais
+- Luz vira energia química
+
+## 📝 Possíveis Perguntas de Prova
+1. O que é clorofila?
+
+```python
+# comentário, não é título
+```
+
+## 📝 Possíveis Perguntas de Prova
+Repetida.
+"""
+
+
+def test_parse_sections_by_heading():
+    sections = parse_sections(SUMMARY)
+    assert [s["id"] for s in sections] == [
+        "introducao", "pontos-principais", "possiveis-perguntas-de-prova", "possiveis-perguntas-de-prova-2"
+    ]
+    assert "# comentário" in sections[2]["body"]
+    assert sections[1]["bytes"] == len("- Luz vira energia química".encode())
+    assert sections[1]["etag"] != sections[2]["etag"]
+    assert parse_sections("### Semana 12: Revisão\nx")[0]["week"] == 12
+    assert slugify("**Dicas** 💡 finais") == "dicas-finais"
+
+
+def test_store_is_idempotent_and_pages_by_week(tmp_path):
+    store = DocumentStore(str(tmp_path / "documents.db"))
+    text = "# Plano\n" + "".join(f"### Semana {week}: Tópico {week}\nConteúdo {week}\n" for week in range(1, 6))
+    saved = store.save("/study-plan", "Física", text)
+    assert store.save("/study-plan", "Física", text) == saved and store.stats()["saved"] == 1
+    assert saved["sections"] == 6
+
+    weeks = store.sections(saved["document_id"], week_from=2, week_to=4)
+    assert [s["week"] for s in weeks] == [2, 3, 4] and weeks[0]["body"] == "Conteúdo 2"
+    assert [s["index"] for s in store.sections(saved["document_id"], offset=4, limit=1)] == [4]
+    assert store.section(saved["document_id"], "semana-5-topico-5")["body"] == "Conteúdo 5"
+    assert "body" not in store.get(saved["document_id"])["sections"][0]
+    for ref in ("١", "²", "9" * 30):  # dígitos Unicode e índices enormes são slugs inexistentes
+        assert store.section(saved["document_id"], ref) is None
+
+
+def test_study_plan_sections_served_with_etags(fake_model, monkeypatch, tmp_path):
+    from app import main
+
+    monkeypatch.setattr(main, "document_store", DocumentStore(str(tmp_path / "documents.db")))
+    fake_model.text = json.dumps([
+        {"week": week, "topic": f"Tópico {week}", "goals": ["Objetivo"], "activities": ["Atividade"]}
+        for week in range(1, 5)
+    ])
+    client = TestClient(main.app)
+    plan = client.post("/study-plan", json={"subject": "Química", "duration_weeks": 4, "daily_hours": 1}).json()
+    doc_id = plan["document_id"]
+
+    index = client.get(f"/documents/{doc_id}")
+    assert index.status_code == 200 and len(index.json()["sections"]) == plan["document_sections"]
+
+    weeks = client.get(f"/documents/{doc_id}/sections", params={"week_from": 3, "week_to": 4}).json()["sections"]
+    assert [s["title"] for s in weeks] == ["Semana 3: Tópico 3 (7 h)", "Semana 4: Tópico 4 (7 h)"]
+
+    section = client.get(f"/documents/{doc_id}/sections/{weeks[0]['index']}")
+    assert section.headers["etag"] == weeks[0]["etag"]
+    assert client.get(section.url, headers={"If-None-Match": weeks[0]["etag"]}).status_code == 304
+    assert len(fake_model.calls) == 1  # rever não regenera
+
+    assert client.get("/documents/desconhecido").status_code == 404
+    assert client.get(f"/documents/{doc_id}/sections/nao-existe").status_code == 404
+    assert client.get(f"/documents/{doc_id}/sections/{'9' * 30}").status_code == 404
@@ -0,0 +1,153 @@
+# Testes da correção de respostas
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.grading import (
+    MULTIPLE_CHOICE, OPEN_ENDED, TRUE_FALSE, AnswerKeyStore, GradingEngine, grade_local, parse_grades,
+    question_id, question_type_of,
+)
+
+MC_ITEM = {
+    "statement": "Quanto é 2 + 2?",
+    "options": ["A) 3", "B) 4", "C) 5", "D) 22"],
+    "answer": "B",
+    "explanation": "2 + 2 = 4",
+}
+TF_ITEM = {
+    "statement": "A água ferve a 100 °C ao nível do mar.",
+    "options": ["Verdadeiro", "Falso"],
+    "answer": "Verdadeiro",
+    "explanation": "Sob 1 atm, sim.",
+}
+OPEN_ITEM = {
+    "statement": "Explique a fotossíntese.",
+    "options": [],
+    "answer": "Cita luz, CO2, água, glicose e oxigênio",
+    "explanation": "Processo de conversão de energia luminosa.",
+}
+
+
+def test_question_type_inferred_from_options():
+    assert question_type_of(MC_ITEM) == MULTIPLE_CHOICE
+    assert question_type_of(TF_ITEM) == TRUE_FALSE
+    assert question_type_of(OPEN_ITEM) == OPEN_ENDED
+
+
+@pytest.mark.parametrize("answer,correct", [
+    ("B", True), ("b)", True), ("B) 4", True), ("4", True), (" (b) ", True), ("A", False), ("C) 5", False),
+])
+def test_multiple_choice_accepts_letter_or_option_text(answer, correct):
+    assert grade_local(MC_ITEM, MULTIPLE_CHOICE, answer)["correct"] is correct
+
+
+@pytest.mark.parametrize("answer,correct", [("verdadeiro", True), ("V", True), ("true", True), ("Não", False)])
+def test_true_false_normalizes_answers(answer, correct):
+    assert grade_local(TF_ITEM, TRUE_FALSE, answer)["correct"] is correct
+
+
+def test_unrecognized_answer_is_wrong_not_an_error():
+    result = grade_local(MC_ITEM, MULTIPLE_CHOICE, "não sei")
+    assert result["correct"] is False and result["graded_by"] == "local"
+
+
+def test_parse_grades_clamps_and_skips_invalid_items():
+    text = json.dumps([
+        {"index": 0, "score": 0.8, "feedback": "Bom"},
+        {"index": 1, "score": 75, "feedback": "Escala 0-100"},
+        {"index": "x", "score": 1},
+    ])
+    assert parse_grades(text) == {0: {"score": 0.8, "feedback": "Bom"}, 1: {"score": 0.75, "feedback": "Escala 0-100"}}
+
+
+def test_answer_key_store_is_bounded():
+    store = AnswerKeyStore(max_entries=2)
+    first = store.add(MC_ITEM)
+    store.add(TF_ITEM)
+    store.add(OPEN_ITEM)
+    assert store.get(first) is None and len(store) == 2
+
+
+@pytest.mark.asyncio
+async def test_open_answers_packed_into_few_calls():
+    batches = []
+
+    async def grade_batch(entries):
+        batches.append([entry["index"] for entry in entries])
+        return {entry["index"]: {"score": 0.7, "feedback": "ok"} for entry in entries}
+
+    engine = GradingEngine(grade_batch)
+    submissions = [{"item": MC_ITEM, "question_type": MULTIPLE_CHOICE, "answer": "B"}]
+    submissions += [{"item": OPEN_ITEM, "question_type": OPEN_ENDED, "answer": f"resposta {i}"} for i in range(10)]
+    results, calls = await engine.grade(submissions, per_call=4)
+
+    assert calls == 3 and sorted(sum(batches, [])) == list(range(1, 11))
+    assert results[0]["graded_by"] == "local"
+    assert all(result["graded_by"] == "model" and result["correct"] for result in results[1:])
+    assert engine.stats()["answers_per_upstream_call"] == round(11 / 3, 2)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_keeps_local_results():
+    async def grade_batch(entries):
+        raise RuntimeError("upstream down")
+
+    engine = GradingEngine(grade_batch)
+    submissions = [
+        {"item": TF_ITEM, "question_type": TRUE_FALSE, "answer": "Falso"},
+        {"item": OPEN_ITEM, "question_type": OPEN_ENDED, "answer": "luz"},
+    ]
+    results, _ = await engine.grade(submissions)
+    assert results[0]["correct"] is False and results[1]["graded_by"] == "unavailable"
+
+    with pytest.raises(RuntimeError):
+        await engine.grade(submissions[1:])
+
+
+def test_grade_endpoint_local_and_batched(fake_model, monkeypatch):
+    from app import main
+
+    store = AnswerKeyStore()
+    monkeypatch.setattr(main, "answer_keys", store)
+    mc_id = store.add(MC_ITEM)
+    fake_model.text = json.dumps([{"index": 1, "score": 0.9, "feedback": "Completa"},
+                                  {"index": 2, "score": 0.2, "feedback": "Faltou o oxigênio"}])
+
+    response = TestClient(main.app).post("/grade", json={"answers": [
+        {"question_id": mc_id, "answer": "B"},
+        {"question": OPEN_ITEM, "answer": "Luz, CO2 e água viram glicose e oxigênio"},
+        {"question": OPEN_ITEM, "answer": "Planta come luz"},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["graded_by"] for result in body["results"]] == ["local", "model", "model"]
+    assert [result["correct"] for result in body["results"]] == [True, True, False]
+    assert body["report"] == {"upstream_calls": 1, "answers_per_upstream_call": 3.0}
+    assert len(fake_model.calls) == 1
+    assert fake_model.call_kwargs[0]["generation_config"]["response_mime_type"] == "application/json"
+
+
+def test_unknown_id_with_inline_question_returns_stored_id(client):
+    from app import main
+
+    response = client.post("/grade", headers={"X-Client-Id": "aluno"}, json={"answers": [
+        {"question_id": "id-do-cliente", "question": TF_ITEM, "answer": "F"},
+    ]})
+    qid = response.json()["results"][0]["question_id"]
+    assert qid == question_id(TF_ITEM)
+    assert main.answer_keys.get(qid)["answer"] == TF_ITEM["answer"]
+    assert main.review.cards("public:aluno") == 1
+
+
+def test_grade_endpoint_objective_only_needs_no_model(client):
+    from app import main
+
+    qid = main.answer_keys.add(TF_ITEM)
+    response = client.post("/grade", json={"answers": [{"question_id": qid, "answer": "V"}]})
+    assert response.status_code == 200  # mesmo em modo CI: correção local não consome cota
+    assert response.json()["report"]["upstream_calls"] == 0
+
+    missing = client.post("/grade", json={"answers": [{"question_id": "desconhecido", "answer": "V"}]})
+    assert missing.status_code == 404
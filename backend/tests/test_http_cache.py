@@ -0,0 +1,60 @@
+"""
+Testes das variantes GET cacheáveis (ETag / If-None-Match)
+Usam um modelo falso - NÃO consomem tokens da API
+"""
+
+from app.http_cache import compute_etag, etag_matches
+
+
+class TestEtag:
+    def test_deterministic(self):
+        assert compute_etag(b'{"a":1}') == compute_etag(b'{"a":1}')
+        assert compute_etag(b'{"a":1}') != compute_etag(b'{"a":2}')
+
+    def test_if_none_match_forms(self):
+        etag = compute_etag(b"x")
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"outro", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"outro"', etag)
+
+
+class TestCacheableEndpoints:
+    def test_explain_get_headers_and_304(self, client, fake_model):
+        params = {"concept": "Entropia", "level": "advanced", "subject": "Física"}
+        response = client.get("/explain", params=params)
+        assert response.status_code == 200
+        assert response.json()["explanation"] == "Resposta gerada"
+        assert "stale-while-revalidate" in response.headers["Cache-Control"]
+        assert response.headers["Vary"] == "X-API-Key"
+        etag = response.headers["ETag"]
+
+        again = client.get("/explain", params=params, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.headers["ETag"] == etag and again.headers["Vary"] == "X-API-Key"
+        assert again.content == b""
+        assert len(fake_model.calls) == 1  # segunda chamada veio do cache
+
+    def test_revalidation_after_expiry_skips_upstream(self, client, fake_model):
+        from app import main
+
+        params = {"subject": "Math", "topic": "Frações"}
+        etag = client.get("/generate-question", params=params).headers["ETag"]
+        main.response_cache.ttl_seconds = -1  # entrada expirada: sem o ETag, geraria de novo
+        again = client.get("/generate-question", params=params, headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.headers["ETag"] == etag
+        assert len(fake_model.calls) == 1
+
+        fake_model.text = "Outra questão"
+        fresh = client.get("/generate-question", params=params, headers={"If-None-Match": '"antigo"'})
+        assert fresh.status_code == 200 and fresh.json()["question"] == "Outra questão"
+
+    def test_generate_question_get_validation(self, client, fake_model):
+        response = client.get("/generate-question", params={"subject": "Math"})
+        assert response.status_code == 422
+
+        response = client.get("/generate-question", params={"subject": "Math", "topic": "Frações"})
+        assert response.status_code == 200
+        assert response.json()["difficulty"] == "medium"
+        assert "ETag" in response.headers
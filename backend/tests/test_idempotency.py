@@ -0,0 +1,116 @@
+# Testes de Idempotency-Key
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.idempotency import IdempotencyConflict, IdempotencyStore, StoredResponse, replayable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def stored(body=b"{}", status=200):
+    return StoredResponse(status, [(b"content-type", b"application/json")], body)
+
+
+@pytest.mark.asyncio
+async def test_retry_attaches_to_in_flight_execution():
+    store = IdempotencyStore()
+    assert await store.begin("k", "fp") is None
+
+    waiter = asyncio.create_task(store.begin("k", "fp"))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    store.finish("k", stored(b"ok"))
+
+    assert (await waiter).body == b"ok"
+    assert store.stats()["attached"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_execution_lets_retry_run_again():
+    store = IdempotencyStore()
+    await store.begin("k", "fp")
+    store.finish("k", None)
+    assert await store.begin("k", "fp") is None
+
+
+@pytest.mark.asyncio
+async def test_conflicting_payload_is_rejected():
+    store = IdempotencyStore()
+    await store.begin("k", "fp-1")
+    with pytest.raises(IdempotencyConflict):
+        await store.begin("k", "fp-2")
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_store_is_bounded():
+    clock = FakeClock()
+    store = IdempotencyStore(ttl_seconds=60, max_entries=2, clock=clock)
+    for key in ("a", "b", "c"):
+        await store.begin(key, "fp")
+        store.finish(key, stored())
+    assert store.stats()["entries"] == 2
+    assert await store.begin("a", "fp") is None  # despejada, executa de novo
+    store.finish("a", stored())
+
+    clock.now += 61
+    assert store.stats()["entries"] == 0
+
+
+def test_only_deterministic_responses_are_replayable():
+    json_type = [(b"content-type", b"application/json")]
+    assert replayable(200, json_type) and replayable(202, json_type)
+    assert replayable(404, json_type) and replayable(422, json_type)
+    for status in (401, 409, 429, 499, 500, 502, 503):
+        assert not replayable(status, json_type)
+    assert not replayable(200, [*json_type, (b"Retry-After", b"5")])
+
+
+def test_replay_has_correct_length_and_shed_responses_run_again(fake_model, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "idempotency", IdempotencyStore())
+    client = TestClient(main.app)
+    headers = {"Idempotency-Key": "resumo-1"}
+    first = client.post("/summarize", json={"content": "abc"}, headers=headers)
+    retry = client.post("/summarize", json={"content": "abc"}, headers=headers)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.headers["content-length"] == str(len(first.content)) and retry.json() == first.json()
+
+    fake_model.fail = True
+    shed = {"Idempotency-Key": "resumo-2"}
+    for _ in range(3):
+        response = client.post("/summarize", json={"content": "xyz"}, headers=shed)
+        assert "Idempotent-Replayed" not in response.headers  # cada tentativa executa de novo
+    assert response.status_code == 503 and "Retry-After" in response.headers
+
+
+def test_retry_with_same_key_does_not_regenerate(fake_model, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "idempotency", IdempotencyStore())
+    monkeypatch.setattr(main, "response_cache", main.ResponseCache(ttl_seconds=0, stale_ttl_seconds=0))
+    client = TestClient(main.app)
+    headers = {"Idempotency-Key": "plan-123"}
+    plan = {"subject": "Python", "duration_weeks": 2, "daily_hours": 1}
+
+    first = client.post("/study-plan", json=plan, headers=headers)
+    retry = client.post("/study-plan", json=plan, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(fake_model.calls) == 1
+
+    conflict = client.post("/study-plan", json={**plan, "duration_weeks": 3}, headers=headers)
+    assert conflict.status_code == 422
+
+    assert client.post("/study-plan", json=plan).status_code == 200  # sem chave: executa normalmente
+    assert len(fake_model.calls) == 2
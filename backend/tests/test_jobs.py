@@ -0,0 +1,119 @@
+"""
+Testes da fila de jobs assíncronos
+Usam um modelo falso - NÃO consomem tokens da API
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.jobs import JobStore, QUEUED, RUNNING, DONE
+
+
+@pytest.fixture
+def jobs_client(fake_model, monkeypatch):
+    """Cliente com lifespan ativo (workers rodando); o banco fica no tmp_path do conftest"""
+    from app import main
+
+    monkeypatch.setattr(main.job_queue, "poll_interval", 0.05)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def wait_for_job(client, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("job não terminou a tempo")
+
+
+class TestJobStore:
+    """Persistência e ordem da fila"""
+
+    def test_priority_then_fifo(self, tmp_path):
+        store = JobStore(str(tmp_path / "jobs.db"))
+        low = store.insert("summarize", "h1", {}, priority=0)
+        high = store.insert("summarize", "h2", {}, priority=5)
+        low2 = store.insert("summarize", "h3", {}, priority=0)
+        assert [store.claim_next()["id"] for _ in range(3)] == [high["id"], low["id"], low2["id"]]
+        assert store.claim_next() is None
+
+    def test_running_jobs_survive_restart(self, tmp_path):
+        path = str(tmp_path / "jobs.db")
+        store = JobStore(path)
+        job = store.insert("summarize", "h1", {"content": "x"}, priority=0)
+        store.claim_next()
+        store.close()
+
+        reopened = JobStore(path)
+        assert reopened.get(job["id"])["status"] == RUNNING
+        assert reopened.requeue_running() == 1
+        assert reopened.get(job["id"])["status"] == QUEUED
+
+    def test_shared_db_claims_each_job_once(self, tmp_path):
+        path = str(tmp_path / "jobs.db")
+        first, second = JobStore(path), JobStore(path)  # dois processos no mesmo banco
+        job, created = first.insert_unless_active("summarize", "h1", {}, priority=0)
+        again, created_again = second.insert_unless_active("summarize", "h1", {}, priority=0)
+        assert created and not created_again and again["id"] == job["id"]
+
+        assert first.claim_next()["id"] == job["id"]
+        assert second.claim_next() is None
+
+    def test_only_expired_leases_requeued(self, tmp_path):
+        store = JobStore(str(tmp_path / "jobs.db"))
+        stale = store.insert("summarize", "h1", {}, priority=0)
+        live = store.insert("summarize", "h2", {}, priority=0)
+        store.claim_next()
+        store.claim_next()
+        store.heartbeat([live["id"]])
+        cutoff = store.get(live["id"])["updated_at"]
+        assert store.requeue_running(cutoff) == 1
+        assert store.get(stale["id"])["status"] == QUEUED and store.get(live["id"])["status"] == RUNNING
+
+    def test_purge_finished(self, tmp_path):
+        store = JobStore(str(tmp_path / "jobs.db"))
+        job = store.insert("summarize", "h1", {}, priority=0)
+        store.finish(job["id"], result={"summary": "ok"})
+        assert store.get(job["id"])["status"] == DONE
+        assert store.purge_finished(time.time() + 1) == 1
+        assert store.get(job["id"]) is None
+
+
+class TestAsyncEndpoints:
+    """Modo async de /study-plan e /summarize"""
+
+    def test_submit_and_poll(self, jobs_client):
+        response = jobs_client.post("/summarize?mode=async", json={"content": "Texto longo"})
+        assert response.status_code == 202
+        body = response.json()
+        assert response.headers["Location"] == body["status_url"]
+
+        job = wait_for_job(jobs_client, body["job_id"])
+        assert job["status"] == "done"
+        assert job["result"]["summary"] == "Resposta gerada"
+
+    def test_deduplicates_same_request(self, jobs_client):
+        data = {"subject": "Python", "duration_weeks": 2, "daily_hours": 1}
+        first = jobs_client.post("/study-plan?mode=async", json=data).json()
+        second = jobs_client.post("/study-plan?mode=async", json=data).json()
+        assert second["job_id"] == first["job_id"]
+        assert second["deduplicated"] is True
+
+    def test_events_stream_ends_with_result(self, jobs_client):
+        job_id = jobs_client.post("/summarize?mode=async", json={"content": "SSE"}).json()["job_id"]
+        with jobs_client.stream("GET", f"/jobs/{job_id}/events") as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = [line for line in response.iter_lines() if line.startswith("data:")]
+        assert '"status": "done"' in events[-1]
+
+    def test_unknown_job(self, jobs_client):
+        assert jobs_client.get("/jobs/nao-existe").status_code == 404
+
+    def test_invalid_mode(self, jobs_client):
+        response = jobs_client.post("/summarize?mode=later", json={"content": "x"})
+        assert response.status_code == 422
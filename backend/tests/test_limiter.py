@@ -0,0 +1,89 @@
+# Testes do limite de concorrência adaptativo
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.limiter import AdaptiveLimiter, ConcurrencyLimitExceeded
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sheds_immediately_at_limit():
+    limiter = AdaptiveLimiter(initial_limit=2)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(ConcurrencyLimitExceeded) as exc:
+        limiter.acquire()
+    assert exc.value.retry_after >= 1
+    assert limiter.snapshot()["shed"] == 1
+
+
+def test_limit_backs_off_on_slow_calls_and_recovers():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial_limit=10, min_limit=2, target_latency=1.0, clock=clock)
+
+    for _ in range(20):
+        with limiter.guard():
+            clock.now += 3.0  # bem acima do alvo
+    assert limiter.limit == 2
+    assert limiter.snapshot()["limit_decreases"] > 0
+
+    for _ in range(30):
+        limiter.acquire()  # mantém o limite ocupado para permitir crescimento
+        with limiter.guard():
+            clock.now += 0.2
+        limiter.release(None)
+    assert limiter.limit > 2
+    assert limiter.snapshot()["limit_increases"] > 0
+
+
+def test_does_not_grow_when_underused():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial_limit=10, target_latency=1.0, clock=clock)
+    for _ in range(50):
+        with limiter.guard():
+            clock.now += 0.1
+    assert limiter.limit == 10
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_does_not_shrink_limit():
+    limiter = AdaptiveLimiter(initial_limit=4)
+
+    async def call():
+        with limiter.guard():
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert limiter.limit == 4 and limiter.in_flight == 0
+
+
+def test_overload_sheds_generation_but_not_cache_or_health(fake_model, monkeypatch):
+    from app import main
+
+    client = TestClient(main.app)
+    explain = {"concept": "Entropia", "level": "beginner", "subject": "Física"}
+    assert client.post("/explain", json=explain).status_code == 200
+
+    limiter = AdaptiveLimiter(initial_limit=1)
+    limiter.acquire()  # única vaga ocupada
+    monkeypatch.setattr(main.upstream, "limiter", limiter)
+
+    shed = client.post("/explain", json={**explain, "concept": "Calor"})
+    assert shed.status_code == 503
+    assert int(shed.headers["Retry-After"]) >= 1
+
+    assert client.post("/explain", json=explain).status_code == 200  # cache hit
+    assert client.get("/health").status_code == 200
+    assert len(fake_model.calls) == 1
@@ -0,0 +1,77 @@
+# Testes do pipeline de logs estruturados
+
+import io
+import json
+import logging
+import random
+
+import pytest
+
+from app.logging_setup import SamplingFilter, current_request_id, setup_logging
+
+
+@pytest.fixture
+def pipeline():
+    """Pipeline escrevendo num buffer; o stop restaura os handlers do logger raiz"""
+    stream = io.StringIO()
+    pipeline = setup_logging("INFO", "json", stream=stream)
+    yield pipeline, stream
+    pipeline.stop()
+
+
+def lines(pipeline, stream):
+    pipeline.stop()  # esvazia a fila
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_lines_carry_request_id_and_extra_fields(pipeline):
+    pipeline, stream = pipeline
+    token = current_request_id.set("req-42")
+    try:
+        logging.getLogger("app.test").info("Gerado %s", "ok", extra={"endpoint": "/explain"})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("app.test").exception("Falhou")
+    finally:
+        current_request_id.reset(token)
+
+    info, error = lines(pipeline, stream)
+    assert info["msg"] == "Gerado ok"
+    assert info["request_id"] == "req-42"
+    assert info["endpoint"] == "/explain"
+    assert error["level"] == "ERROR" and "ValueError: boom" in error["exc"]
+    assert pipeline.stats()["enqueued"] == 2
+
+
+def test_sampling_only_applies_to_marked_records():
+    sampler = SamplingFilter(0.25, rng=random.Random(1))
+    marked = [logging.makeLogRecord({"sampled": True}) for _ in range(1000)]
+    kept = sum(sampler.filter(record) for record in marked)
+    assert 150 < kept < 350
+    assert sampler.filter(logging.makeLogRecord({"levelno": logging.ERROR}))
+
+
+def test_requests_get_correlation_id(client):
+    generated = client.get("/health")
+    assert len(generated.headers["X-Request-ID"]) == 32
+
+    provided = client.get("/health", headers={"X-Request-ID": "abc-123"})
+    assert provided.headers["X-Request-ID"] == "abc-123"
+
+
+def test_lifespan_installs_and_stops_pipeline(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    monkeypatch.setattr(main.settings, "LOG_CONFIGURE", True)
+    root = logging.getLogger()
+    saved = list(root.handlers)
+    with TestClient(main.app) as client:
+        assert client.get("/metrics").json()["logging"]["enqueued"] >= 0
+        pipeline = main.log_pipeline
+        assert root.handlers == [pipeline.handler]
+    assert root.handlers == saved and main.log_pipeline is None
+    pipeline.stop()  # idempotente
+    assert not pipeline.listener._thread
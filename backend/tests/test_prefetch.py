@@ -0,0 +1,145 @@
+# Testes do prefetch especulativo
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.cache import ResponseCache
+from app.prefetch import PrefetchEngine, TransitionModel
+from app.quota import QuotaTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_engine(clock, quota=None, **kwargs):
+    executed = []
+    cache = set()
+
+    async def execute(endpoint, payload):
+        executed.append((endpoint, payload))
+        cache.add(ResponseCache.make_key(endpoint, payload))
+
+    engine = PrefetchEngine(
+        predictors={("/a", "/b"): lambda payload: {"x": payload["x"]}},
+        execute=execute,
+        key_fn=ResponseCache.make_key,
+        is_cached=lambda key: key in cache,
+        quota=quota or QuotaTracker(rpm=100, rpd=1000, clock=clock),
+        enabled=True,
+        max_per_hour=2,
+        hit_window_seconds=600,
+        clock=clock,
+        **kwargs,
+    )
+    engine.transitions.min_observations = 2
+    return engine, executed
+
+
+def teach(engine, client, steps):
+    for endpoint in steps:
+        engine.observe(client, endpoint, "bio", {"x": 1})
+
+
+def test_transition_model_falls_back_to_all_subjects():
+    model = TransitionModel(min_observations=3)
+    for subject in ("bio", "bio", "math"):
+        model.record(subject, "/explain", "/generate-question")
+    model.record("math", "/explain", "/summarize")
+
+    assert model.next_probabilities("bio", "/explain") == [("/generate-question", 0.75), ("/summarize", 0.25)]
+    assert model.next_probabilities("history", "/unknown") == []
+
+
+@pytest.mark.asyncio
+async def test_prefetches_likely_next_step_and_counts_hit():
+    clock = FakeClock()
+    engine, executed = make_engine(clock)
+    teach(engine, "c1", ["/a", "/b", "/a", "/b"])
+    executed.clear()
+
+    engine.observe("c2", "/a", "bio", {"x": 7})
+    await asyncio.sleep(0)
+
+    assert executed == [("/b", {"x": 7})]
+    assert engine.claim(ResponseCache.make_key("/b", {"x": 7})) is True
+    assert engine.claim(ResponseCache.make_key("/b", {"x": 7})) is False
+    assert engine.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unused_prefetch_counts_as_wasted():
+    clock = FakeClock()
+    engine, _ = make_engine(clock)
+    teach(engine, "c1", ["/a", "/b", "/a", "/b", "/a"])
+    await asyncio.sleep(0)
+
+    clock.now += 601
+    stats = engine.stats()
+    assert stats["wasted_requests"] == stats["issued"] > 0
+    assert stats["hit_rate"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_budget_caps_prefetches():
+    clock = FakeClock()
+    engine, executed = make_engine(clock)
+    teach(engine, "c1", ["/a", "/b", "/a", "/b"])
+    executed.clear()
+    for x in range(5):
+        engine.observe(f"s{x}", "/a", "bio", {"x": x})
+        await asyncio.sleep(0)
+
+    assert engine.issued == len(executed) == 2
+    assert engine.stats()["skipped_budget"] > 0
+
+
+@pytest.mark.asyncio
+async def test_no_prefetch_without_quota_headroom():
+    clock = FakeClock()
+    quota = QuotaTracker(rpm=10, rpd=1000, clock=clock)
+    quota.record(8)
+    engine, executed = make_engine(clock, quota=quota)
+    teach(engine, "c1", ["/a", "/b", "/a", "/b", "/a"])
+    await asyncio.sleep(0)
+
+    assert executed == []
+    assert engine.issued == 0
+
+
+def test_explain_then_question_is_served_from_prefetch(fake_model, monkeypatch):
+    from app import main
+
+    engine = PrefetchEngine(
+        predictors=main.prefetcher.predictors,
+        execute=main.run_prefetch,
+        key_fn=ResponseCache.make_key,
+        is_cached=lambda key: main.response_cache.get(key) is not None,
+        quota=QuotaTracker(rpm=100, rpd=1000),
+        enabled=True,
+    )
+    engine.transitions.min_observations = 1
+    engine.transitions.record("Biologia", "/explain", "/generate-question")
+    monkeypatch.setattr(main, "prefetcher", engine)
+    monkeypatch.setattr(main.question_pool, "pop", lambda key, client_id=None: None)
+
+    headers = {"X-Client-Id": "aluno-1"}
+    with TestClient(main.app) as client:
+        explain = {"concept": "Fotossíntese", "level": "beginner", "subject": "Biologia"}
+        assert client.post("/explain", json=explain, headers=headers).status_code == 200
+        deadline = time.time() + 2
+        while len(fake_model.calls) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        question = {"subject": "Biologia", "topic": "Fotossíntese", "difficulty": "easy"}
+        response = client.post("/generate-question", json=question, headers=headers)
+
+    assert response.status_code == 200
+    assert len(fake_model.calls) == 2  # a questão já estava no cache
+    assert engine.stats()["hits"] == 1
@@ -0,0 +1,58 @@
+"""
+Testes dos perfis de geração e do limite adaptativo de tokens
+Usam respostas falsas - NÃO consomem tokens da API
+"""
+
+from app.profiles import ProfileRegistry, load_profiles
+from tests.conftest import FakeResponse
+
+
+class TestProfiles:
+    def test_overrides_and_fallback(self):
+        registry = ProfileRegistry(load_profiles('{"explain": {"temperature": 0.2, "model": "gemini-2.0-flash"}}'))
+        model, config = registry.resolve("explain")
+        assert model == "gemini-2.0-flash"
+        assert config["temperature"] == 0.2
+        # Variante inexistente cai para o perfil base
+        assert registry.get("question:desconhecido")[0] == "question"
+        assert registry.get("inexistente")[0] == "generate"
+
+    def test_units_scale_cap(self):
+        registry = ProfileRegistry(load_profiles())
+        short = registry.cap_for("study_plan", units=1)
+        long = registry.cap_for("study_plan", units=52)
+        assert short < long <= 8192
+
+
+class TestAdaptiveCap:
+    def test_cap_follows_p99(self):
+        registry = ProfileRegistry(load_profiles(), adaptive=True, min_samples=10, headroom=1.1)
+        static = registry.cap_for("explain")
+        assert registry.cap_for("explain") == static  # sem amostras suficientes
+
+        for _ in range(20):
+            registry.observe("explain", FakeResponse("x", output_tokens=300))
+        cap = registry.cap_for("explain")
+        assert 300 < cap <= 340
+        assert registry.stats()["profiles"]["explain"]["max_tokens_rate"] == 0.0
+
+    def test_truncation_raises_cap_and_is_reported(self):
+        registry = ProfileRegistry(load_profiles(), adaptive=True, min_samples=10)
+        for _ in range(20):
+            registry.observe("explain", FakeResponse("x", output_tokens=300))
+        cap = registry.cap_for("explain")
+        registry.observe("explain", FakeResponse("x", output_tokens=cap, finish_reason="MAX_TOKENS"), cap=cap)
+        assert registry.cap_for("explain") > cap
+        assert registry.stats()["profiles"]["explain"]["max_tokens_finishes"] == 1
+
+
+class TestProfileEndpoints:
+    def test_endpoint_uses_profile_config(self, client, fake_model):
+        data = {"subject": "Python", "duration_weeks": 4, "daily_hours": 2}
+        assert client.post("/study-plan", json=data).status_code == 200
+        config = fake_model.call_kwargs[-1]["generation_config"]
+        assert config["temperature"] == 0.5
+        assert config["max_output_tokens"] == 256 + 110 * 4
+
+        metrics = client.get("/metrics").json()
+        assert metrics["generation_profiles"]["profiles"]["study_plan"]["responses"] == 1
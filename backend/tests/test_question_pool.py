@@ -0,0 +1,102 @@
+"""
+Testes do pool de questões pré-geradas
+NÃO consomem tokens da API
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.question_pool import QuestionPool, PoolRefiller, pool_key, parse_question_items
+from app.quota import QuotaTracker
+
+KEY = pool_key("Matemática", "Álgebra", "medium", "multiple_choice")
+
+
+def make_items(count):
+    return [
+        {"statement": f"Q{i}", "options": ["A) 1", "B) 2", "C) 3", "D) 4"], "answer": "A", "explanation": "..."}
+        for i in range(count)
+    ]
+
+
+class TestQuestionPool:
+    """Cursor por cliente e watermark"""
+
+    def test_clients_never_repeat(self):
+        pool = QuestionPool()
+        pool.add(KEY, make_items(3))
+        seen_a = [pool.pop(KEY, "aluno-a")["statement"] for _ in range(3)]
+        assert seen_a == ["Q0", "Q1", "Q2"]
+        assert pool.pop(KEY, "aluno-a") is None
+        # Outro aluno recebe as mesmas questões desde o início
+        assert pool.pop(KEY, "aluno-b")["statement"] == "Q0"
+
+    def test_trim_moves_stale_cursors(self):
+        pool = QuestionPool(max_items=2)
+        pool.add(KEY, make_items(1))
+        assert pool.pop(KEY, "aluno")["statement"] == "Q0"
+        pool.add(KEY, make_items(3))
+        # Só os 2 mais recentes ficam; cursores atrasados pulam para o mais antigo retido
+        assert pool.pop(KEY, "outro")["statement"] == "Q1"
+
+    def test_deficits_below_low_watermark(self):
+        pool = QuestionPool(low_watermark=2, target_size=5)
+        pool.touch(KEY)
+        assert pool.deficits() == [(KEY, 5)]
+        pool.add(KEY, make_items(5))
+        assert pool.deficits() == []
+        for _ in range(4):
+            pool.pop(KEY, "aluno")
+        assert pool.deficits() == [(KEY, 4)]
+
+    def test_parse_skips_invalid_items(self):
+        text = "```json\n" + json.dumps(make_items(2) + [{"statement": "sem resposta"}]) + "\n```"
+        assert len(parse_question_items(text)) == 2
+
+    def test_parse_rejects_scalar_json(self):
+        for text in ('"só texto"', "42", "null", '{"questions": 3}'):
+            with pytest.raises(ValueError):
+                parse_question_items(text)
+
+
+class TestPoolRefiller:
+    """Refill respeita a reserva de cota"""
+
+    def test_refills_only_with_headroom(self):
+        pool = QuestionPool(low_watermark=2, target_size=4)
+        pool.touch(KEY)
+        quota = QuotaTracker(rpm=10, rpd=100)
+        calls = []
+
+        async def generate_batch(key, count):
+            calls.append(count)
+            return make_items(count)
+
+        refiller = PoolRefiller(pool, generate_batch, quota, quota_reserve=0.5, batch_size=3)
+        assert asyncio.run(refiller.refill_once()) == 3
+        assert calls == [3]
+
+        quota.record(6)  # só 40% da cota do minuto livre
+        for _ in range(3):
+            pool.pop(KEY, "aluno")
+        assert asyncio.run(refiller.refill_once()) == 0
+
+
+class TestPoolEndpoint:
+    """/generate-question servido pelo pool"""
+
+    def test_serves_from_pool_without_upstream(self, client):
+        from app import main
+
+        data = {"subject": "Física", "topic": "Cinemática", "difficulty": "easy", "question_type": "true_false"}
+        key = pool_key(*data.values())
+        main.question_pool.add(key, make_items(1))
+
+        response = client.post("/generate-question", json=data, headers={"X-Client-Id": "aluno-1"})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["source"] == "pool"
+        assert body["item"]["statement"] == "Q0"
+        assert "## 📝 Questão" in body["question"]
@@ -0,0 +1,73 @@
+# Testes do quiz com várias questões por chamada
+
+import json
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.quiz import QuizPacker, split_count
+from tests.conftest import FakeResponse
+
+
+def question(statement):
+    return {"statement": statement, "options": ["A) 1", "B) 2"], "answer": "A", "explanation": "porque sim"}
+
+
+def test_split_count_respects_per_call_budget():
+    assert split_count(20, 8) == [7, 7, 6]
+    assert split_count(5, 15) == [5]
+    assert sum(split_count(50, 15)) == 50 and max(split_count(50, 15)) <= 15
+
+
+@pytest.mark.asyncio
+async def test_packer_dedups_and_tops_up_missing_items():
+    calls = []
+
+    async def generate_batch(key, count, avoid):
+        calls.append((count, avoid))
+        if avoid:
+            return [question(f"Extra {i}") for i in range(count)]
+        return [question("Repetida")] + [question(f"Q{len(calls)}-{i}") for i in range(count - 1)]
+
+    packer = QuizPacker(generate_batch)
+    items, used = await packer.build(("bio",) * 4, 6, per_call=3)
+
+    assert len(items) == 6
+    assert len({item["statement"] for item in items}) == 6
+    assert used == 3  # 2 partes + 1 complemento
+    assert "Repetida" in calls[-1][1]
+    assert packer.stats()["requests_saved"] == 3
+
+
+class QuizModel:
+    """Modelo falso que responde com o número de questões pedido no prompt"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        count = int(re.search(r"Gere (\d+) questões", prompt).group(1))
+        start = len(self.calls) * 100
+        return FakeResponse(json.dumps([question(f"Questão {start + i}") for i in range(count)]))
+
+
+def test_quiz_endpoint_packs_questions(fake_model, monkeypatch):
+    from app import main
+
+    model = QuizModel()
+    monkeypatch.setattr(main.upstream, "model", model)
+    monkeypatch.setattr(main, "quiz_packer", QuizPacker(main.quiz_packer.generate_batch))
+    client = TestClient(main.app)
+
+    body = {"subject": "Biologia", "topic": "Células", "difficulty": "easy", "count": 20}
+    response = client.post("/quiz", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 20
+    assert data["report"] == {"upstream_calls": 2, "requests_saved": 18}
+    assert all(call["generation_config"]["response_schema"]["type"] == "array" for call in model.calls)
+
+    assert client.post("/quiz", json=body).json()["report"]["upstream_calls"] == 0  # cache
+    assert len(model.calls) == 2
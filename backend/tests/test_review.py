@@ -0,0 +1,171 @@
+# Testes da revisão espaçada (SM-2)
+
+import json
+
+from fastapi.testclient import TestClient
+
+from app.grading import AnswerKeyStore
+from app.review import ReviewScheduler, ReviewStore, quality_of, sm2
+from app.tenants import DEFAULT_TENANT
+
+QID_A, QID_B, QID_C = "a" * 16, "b" * 16, "c" * 16
+TF_ITEM = {
+    "statement": "A água ferve a 100 °C ao nível do mar.",
+    "options": ["Verdadeiro", "Falso"],
+    "answer": "Verdadeiro",
+    "explanation": "Sob 1 atm, sim.",
+}
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_sm2_intervals_and_ease():
+    ease, interval, reps = 2.5, 0, 0
+    intervals = []
+    for _ in range(4):
+        ease, interval, reps = sm2(ease, interval, reps, 5)
+        intervals.append(interval)
+    assert intervals == [1, 6, 16, 45] and round(ease, 2) == 2.9
+
+    ease, interval, reps = sm2(ease, interval, reps, 1)
+    assert (interval, reps) == (1, 0) and round(ease, 2) == 2.36
+    assert sm2(1.3, 10, 3, 0)[0] == 1.3
+    assert quality_of(1.0) == 5 and quality_of(0.55) == 3 and quality_of(None) is None
+
+
+def test_next_due_follows_schedule_and_skips_stale_entries():
+    clock = FakeClock()
+    review = ReviewScheduler(day_seconds=100, clock=clock)
+    review.record("aluno", QID_A, 5)  # vence em 1 dia (100 s)
+    clock.now += 10
+    review.record("aluno", QID_B, 1)  # vence em 1 dia, 10 s depois de A
+    review.record("aluno", QID_C, 5)
+    review.record("aluno", QID_C, 5)  # reagendada: 6 dias, entrada antiga fica no heap
+
+    assert review.next_due("aluno") is None and review.next_due("outro") is None
+    assert review.next_due_at("aluno") == 1_700_000_100.0
+    clock.now += 200
+    assert review.next_due("aluno")["question_id"] == QID_A  # permanece até ser respondida
+    assert review.next_due("aluno")["question_id"] == QID_A
+    review.record("aluno", QID_A, 5)
+    assert review.next_due("aluno")["question_id"] == QID_B
+    review.forget("aluno", QID_B)
+    assert review.next_due("aluno") is None and review.cards("aluno") == 2
+
+
+def test_heap_compacts_under_many_reschedules():
+    review = ReviewScheduler(clock=FakeClock())
+    for _ in range(500):
+        review.record("aluno", QID_A, 4)
+    assert len(review._decks["aluno"].heap) <= 2 * 1 + 64
+
+
+def test_students_evicted_lru():
+    review = ReviewScheduler(max_students=2)
+    for student in ("a", "b", "c"):
+        review.record(student, QID_A, 5)
+    assert review.cards("a") == 0 and review.stats()["evicted_students"] == 1
+
+
+def test_decks_and_answer_keys_survive_restart(tmp_path):
+    clock = FakeClock()
+    store = ReviewStore(str(tmp_path / "review.db"))
+    review = ReviewScheduler(day_seconds=100, clock=clock, store=store)
+    review.record("aluno", QID_A, 5)
+    review.record("aluno", QID_B, 1)
+    review.forget("aluno", QID_B)
+    keys = AnswerKeyStore(max_entries=1, store=store)
+    qid = keys.add(TF_ITEM)
+    keys.add({**TF_ITEM, "statement": "Outra"})  # tira o primeiro gabarito do LRU
+
+    restarted = ReviewScheduler(day_seconds=100, clock=clock, store=ReviewStore(store.path))
+    assert restarted.load() == 1 and restarted.cards("aluno") == 1
+    clock.now += 101
+    assert restarted.next_due("aluno")["question_id"] == QID_A
+    assert keys.get(qid)["answer"] == "Verdadeiro"
+    assert AnswerKeyStore(store=ReviewStore(store.path)).get(qid)["statement"] == TF_ITEM["statement"]
+
+
+def test_workers_share_decks_through_store(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "review.db")
+    worker_a = ReviewScheduler(day_seconds=100, clock=clock, store=ReviewStore(path))
+    worker_b = ReviewScheduler(max_students=1, day_seconds=100, clock=clock, store=ReviewStore(path))
+    assert worker_b.next_due("aluno") is None
+
+    worker_a.record("aluno", QID_A, 5)
+    clock.now += 101
+    assert worker_b.next_due("aluno")["question_id"] == QID_A
+    worker_b.record("aluno", QID_A, 5)  # agora vence em 6 dias
+    worker_b.record("outro", QID_C, 5)  # "aluno" sai da memória do worker B
+    assert worker_a.next_due("aluno") is None and worker_a.cards("aluno") == 1
+    assert worker_b.cards("aluno") == 1 and worker_b.stats()["evicted_students"] >= 1
+
+
+def test_grade_then_review_without_model_calls(fake_model, monkeypatch):
+    from app import main
+
+    clock = FakeClock()
+    monkeypatch.setattr(main, "review", ReviewScheduler(day_seconds=60, clock=clock))
+    client = TestClient(main.app, headers={"X-Client-Id": "aluno-7"})
+    graded = client.post("/grade", json={"answers": [{"question": TF_ITEM, "answer": "Falso"}]}).json()
+    qid = graded["results"][0]["question_id"]
+
+    pending = client.get("/review/next").json()
+    assert pending["item"] is None and pending["cards"] == 1 and pending["next_due_at"] == clock.now + 60
+
+    clock.now += 61
+    due = client.get("/review/next").json()
+    assert due["source"] == "review" and due["item"]["question_id"] == qid
+    assert due["card"]["repetitions"] == 0
+    assert fake_model.calls == []
+    assert TestClient(main.app).get("/review/next").status_code == 400
+
+
+def test_review_falls_back_to_pool_then_model(fake_model, monkeypatch):
+    from app import main
+    from app.question_pool import QuestionPool
+
+    monkeypatch.setattr(main, "review", ReviewScheduler())
+    monkeypatch.setattr(main, "question_pool", QuestionPool())
+    fake_model.text = json.dumps([
+        {**TF_ITEM, "statement": f"Afirmação {i}"} for i in range(2)
+    ])
+    client = TestClient(main.app, headers={"X-Client-Id": "aluno-8"})
+    params = {"subject": "Química", "topic": "Ebulição", "question_type": "true_false"}
+
+    sources = [client.get("/review/next", params=params).json()["source"] for _ in range(3)]
+    assert sources == ["generated", "pool", "generated"]
+    assert len(fake_model.calls) == 2
+
+
+def test_lifespan_opens_review_store_from_settings(monkeypatch, tmp_path):
+    from app import main
+
+    store = ReviewStore(str(tmp_path / "review.db"))
+    ReviewScheduler(store=store).record(f"{DEFAULT_TENANT}:aluno", QID_A, 5)
+    monkeypatch.setattr(main.settings, "REVIEW_DB_PATH", store.path)
+    main.close_stores()  # o conftest já abriu; o lifespan só cuida do que ele mesmo abrir
+    with TestClient(main.app, headers={"X-Client-Id": "aluno"}) as client:
+        assert main.review.stats()["students"] == 1
+        assert client.get("/review/next").json()["cards"] == 1
+    assert main.review is None
+    main.open_stores()  # para o teardown do conftest
+
+
+def test_inline_answer_keys_are_capped(tmp_path):
+    store = ReviewStore(str(tmp_path / "review.db"))
+    keys = AnswerKeyStore(store=store, max_inline=2)
+    generated = keys.add(TF_ITEM)
+    inline = [keys.add({**TF_ITEM, "statement": f"Inline {i}"}, inline=True) for i in range(3)]
+
+    assert keys.inline_evicted == 1
+    restarted = AnswerKeyStore(store=store)
+    assert restarted.get(inline[0]) is None
+    assert restarted.get(inline[2])["statement"] == "Inline 2" and restarted.get(generated) is not None
@@ -0,0 +1,118 @@
+"""
+Testes do agendamento justo entre tenants
+NÃO consomem tokens da API
+"""
+
+import asyncio
+
+from app.scheduler import FairScheduler
+from app.tenants import BACKGROUND, INTERACTIVE, TenantPolicy, TenantRegistry
+
+
+def make_scheduler(concurrency=1, **policies):
+    default = TenantPolicy(name="public", weight=1, burst=10)
+    return FairScheduler(
+        {name: TenantPolicy(name=name, **values) for name, values in policies.items()},
+        default,
+        concurrency=concurrency,
+    )
+
+
+async def run_all(scheduler, requests):
+    """Enfileira todas as requisições de uma vez e retorna a ordem de atendimento"""
+    order = []
+    gate = asyncio.Event()
+
+    async def call(tenant, lane):
+        async with scheduler.slot(tenant, lane):
+            order.append((tenant, lane))
+            await gate.wait()
+
+    # Ocupa a única vaga para que todos os outros entrem na fila
+    blocker = asyncio.create_task(call("blocker", INTERACTIVE))
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(call(tenant, lane)) for tenant, lane in requests]
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(blocker, *tasks)
+    return order[1:]
+
+
+class TestFairScheduler:
+    def test_weighted_share(self):
+        scheduler = make_scheduler(escola_a={"weight": 3, "burst": 10}, escola_b={"weight": 1, "burst": 10})
+        requests = [("escola_a", INTERACTIVE)] * 8 + [("escola_b", INTERACTIVE)] * 8
+        order = asyncio.run(run_all(scheduler, requests))
+        first_eight = [tenant for tenant, _ in order[:8]]
+        assert first_eight.count("escola_a") == 6
+        assert first_eight.count("escola_b") == 2
+
+    def test_interactive_lane_first(self):
+        scheduler = make_scheduler()
+        requests = [("public", BACKGROUND)] * 3 + [("public", INTERACTIVE)] * 2
+        order = asyncio.run(run_all(scheduler, requests))
+        assert [lane for _, lane in order] == [INTERACTIVE] * 2 + [BACKGROUND] * 3
+
+    def test_burst_limit(self):
+        scheduler = make_scheduler(concurrency=4, escola_a={"weight": 1, "burst": 1})
+
+        async def scenario():
+            running = []
+            release = asyncio.Event()
+
+            async def call():
+                async with scheduler.slot("escola_a"):
+                    running.append(1)
+                    await release.wait()
+
+            tasks = [asyncio.create_task(call()) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            in_flight = len(running)
+            release.set()
+            await asyncio.gather(*tasks)
+            return in_flight
+
+        assert asyncio.run(scenario()) == 1
+        stats = scheduler.stats()["tenants"]["escola_a"]
+        assert stats["granted"] == 3
+        assert stats["in_flight"] == 0
+
+    def test_cancelled_waiter_frees_queue(self):
+        scheduler = make_scheduler()
+
+        async def scenario():
+            gate = asyncio.Event()
+
+            async def hold():
+                async with scheduler.slot("public"):
+                    await gate.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            gate.set()
+            await holder
+            async with scheduler.slot("public"):
+                return scheduler.stats()["in_flight"]
+
+        assert asyncio.run(scenario()) == 1
+
+
+class TestTenantIdentity:
+    def test_registry(self):
+        registry = TenantRegistry.from_json('{"chave-a": {"name": "escola-a", "weight": 2}}')
+        assert registry.resolve("chave-a").name == "escola-a"
+        assert registry.resolve(None).name == "public"
+        assert registry.resolve("desconhecida") is None
+
+    def test_unknown_api_key_rejected(self, client):
+        response = client.get("/health", headers={"X-API-Key": "desconhecida"})
+        assert response.status_code == 401
+
+    def test_wait_time_exported_per_tenant(self, client, fake_model):
+        client.post("/explain", json={"concept": "Átomo", "level": "beginner"})
+        tenants = client.get("/metrics").json()["scheduler"]["tenants"]
+        assert tenants["public"]["granted"] == 1
+        assert "p95_wait_ms" in tenants["public"]
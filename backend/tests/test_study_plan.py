@@ -0,0 +1,63 @@
+# Testes do motor híbrido de planos de estudo
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.study_plan import build_skeleton, merge_plan, parse_plan_content, render_plan, split_minutes
+
+
+@pytest.mark.parametrize("total,ratios", [(120, (0.5, 0.3, 0.2)), (60, (0.4, 0.45, 0.15)), (180, (0.3, 0.55, 0.15))])
+def test_split_minutes_sums_exactly_in_slots(total, ratios):
+    parts = split_minutes(total, ratios)
+    assert sum(parts) == total and all(part % 15 == 0 for part in parts)
+
+
+def test_skeleton_hours_phases_and_milestones():
+    skeleton = build_skeleton(10, 2, "beginner")
+    weeks = skeleton["weeks"]
+
+    assert skeleton["total_hours"] == 10 * 7 * 2 == sum(week["hours"] for week in weeks)
+    assert [block["minutes"] for block in weeks[0]["daily_blocks"]] == [60, 30, 30]
+    assert skeleton["milestones"] == [4, 8, 10]
+    assert weeks[-1]["milestone"]["type"] == "final" and weeks[3]["day_7"]["activity"] == "Avaliação"
+    phases = [week["phase"] for week in weeks]
+    assert phases == sorted(phases, key=["Fundamentos", "Aprofundamento", "Consolidação e revisão"].index)
+    assert phases[0] == "Fundamentos" and phases[-1] == "Consolidação e revisão"
+    assert build_skeleton(1, 1, "expert")["milestones"] == [1]  # nível desconhecido não quebra
+
+
+def test_merge_marks_weeks_without_content():
+    skeleton = build_skeleton(3, 1, "advanced")
+    content = parse_plan_content(json.dumps([
+        {"week": 1, "topic": "Sintaxe", "goals": ["Ler código"], "activities": ["Exercícios"]},
+        {"week": "x", "topic": "inválida"},
+    ]))
+    plan = merge_plan(skeleton, content)
+
+    assert plan["weeks"][0]["topic"] == "Sintaxe" and plan["weeks"][1]["topic"] is None
+    assert plan["weeks_without_content"] == 2 and not plan["content_complete"]
+    assert "Conteúdo a definir" in render_plan(plan, "Python", 1, "advanced")
+    assert parse_plan_content("# Plano em markdown") == {}
+
+
+def test_study_plan_endpoint_merges_model_content(fake_model):
+    from app import main
+
+    fake_model.text = json.dumps([
+        {"week": week, "topic": f"Tópico {week}", "goals": ["Objetivo"], "activities": ["Atividade"]}
+        for week in range(1, 4)
+    ])
+    response = TestClient(main.app).post(
+        "/study-plan", json={"subject": "Química", "duration_weeks": 3, "daily_hours": 2, "current_level": "beginner"}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["plan"]["content_complete"] and body["plan"]["total_hours"] == 42
+    assert "### Semana 3: Tópico 3 (14 h)" in body["study_plan"]
+    config = fake_model.call_kwargs[0]["generation_config"]
+    assert config["response_mime_type"] == "application/json" and config["max_output_tokens"] <= 256 + 3 * 110
+
+    too_long = TestClient(main.app).post("/study-plan", json={"subject": "Química", "duration_weeks": 500, "daily_hours": 2})
+    assert too_long.status_code == 422
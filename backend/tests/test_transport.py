@@ -0,0 +1,51 @@
+"""
+Testes do pool de conexões upstream
+Usam o stand-in local do Gemini - NÃO consomem tokens da API
+"""
+
+import asyncio
+import socket
+
+import pytest
+
+from app.transport import ModelPool
+from benchmarks.fake_gemini_server import start_grpc, start_rest, stop_rest
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_invalid_transport():
+    with pytest.raises(ValueError):
+        ModelPool("gemini-2.0-flash-lite", {}, "key", transport="http3")
+
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+def test_warm_up_and_generate(transport):
+    async def scenario():
+        port = free_port()
+        if transport == "grpc":
+            server = await start_grpc(port, latency=0)
+        else:
+            server = await start_rest(port, latency=0)
+        pool = ModelPool(
+            "gemini-2.0-flash-lite", {}, "fake-key",
+            transport=transport, pool_size=2, endpoint=f"127.0.0.1:{port}", insecure=True,
+        )
+        try:
+            warm = await pool.warm_up(timeout=5)
+            response = await pool.generate_content_async("Olá", request_options={"timeout": 5})
+        finally:
+            await pool.close()
+            if transport == "grpc":
+                await server.stop(None)
+            else:
+                await stop_rest(server)
+        return warm, response
+
+    warm, response = asyncio.run(scenario())
+    assert warm["warm"] is True
+    assert "Olá" in response.text
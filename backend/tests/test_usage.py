@@ -0,0 +1,104 @@
+# Testes do ledger de uso
+
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.usage import UsageLedger
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_rollups_group_by_endpoint_and_day(tmp_path):
+    clock = FakeClock()
+    ledger = UsageLedger(str(tmp_path), clock=clock)
+    ledger.record("/explain", "flash", "public", "miss", prompt_tokens=10, output_tokens=100, latency=1.0)
+    ledger.record("/explain", "flash", "public", "hit")
+    clock.now += 3600
+    ledger.record("/summarize", "flash", "escola-a", "miss", prompt_tokens=50, output_tokens=80, latency=3.0, ok=False)
+
+    hourly = ledger.rollup("hour", hours=24, group_by="endpoint")
+    assert len(hourly["buckets"]) == 2
+    explain = hourly["totals"]["/explain"]
+    assert explain == {
+        "requests": 2, "upstream_calls": 1, "cache_hits": 1, "errors": 0,
+        "prompt_tokens": 10, "output_tokens": 100, "avg_latency_ms": 1000,
+    }
+
+    by_key = ledger.rollup("day", hours=24, group_by="key")
+    assert set(by_key["totals"]) == {"public", "escola-a"}
+    assert by_key["totals"]["escola-a"]["errors"] == 1
+
+
+def test_projection_from_recent_rate(tmp_path):
+    clock = FakeClock(1_700_000_000.0 - 1_700_000_000.0 % 3600 + 1800)  # meia hora dentro da hora
+    ledger = UsageLedger(str(tmp_path), clock=clock)
+    for _ in range(10):
+        ledger.record("/explain", "flash", "public", "miss")
+    ledger.record("/explain", "flash", "public", "hit")  # cache não gasta cota
+
+    projection = ledger.projection(day_remaining=100, window_hours=1)
+    assert projection["rate_per_hour"] == 20.0
+    assert projection["exhausts_within_24h"] is True
+    assert ledger.projection(day_remaining=100, window_hours=1)["calls_last_24h"] == 10
+
+
+@pytest.mark.asyncio
+async def test_batched_writes_survive_restart_and_rotate(tmp_path):
+    clock = FakeClock()
+    ledger = UsageLedger(str(tmp_path), retention_days=2, flush_interval=0.01, clock=clock)
+    ledger.start()
+    for _ in range(5):
+        ledger.record("/explain", "flash", "public", "miss", output_tokens=7)
+    await asyncio.sleep(0.05)
+    await ledger.stop()
+    assert ledger.stats()["written"] == 5
+
+    reloaded = UsageLedger(str(tmp_path), retention_days=2, clock=clock)
+    assert reloaded.load() == 5
+    assert reloaded.rollup()["totals"]["/explain"]["output_tokens"] == 35
+
+    clock.now += 3 * 86400
+    assert reloaded.rotate() == 1
+    assert os.listdir(tmp_path) == []
+    assert reloaded.rollup()["totals"] == {}
+
+
+def test_usage_endpoint_reports_generation_calls(fake_model, monkeypatch, tmp_path):
+    from app import main
+
+    monkeypatch.setattr(main, "usage", UsageLedger(str(tmp_path)))
+    client = TestClient(main.app)
+    explain = {"concept": "Entropia", "level": "beginner", "subject": "Física"}
+    client.post("/explain", json=explain)
+    client.post("/explain", json=explain)
+
+    body = client.get("/usage", params={"group_by": "endpoint"}).json()
+    totals = body["totals"]["/explain"]
+    assert totals["upstream_calls"] == 1 and totals["cache_hits"] == 1
+    assert totals["output_tokens"] > 0
+    assert body["projection"]["rate_per_hour"] > 0
+    assert body["projection"]["day_remaining"] == main.settings.QUOTA_RPD - 1
+
+
+def test_lifespan_reloads_ledger_from_settings_dir(monkeypatch, tmp_path):
+    from app import main
+
+    previous = UsageLedger(str(tmp_path))
+    previous._write_batch([[time.time(), "/explain", "flash", "public", 0, 7, 100, "miss", True]])
+    monkeypatch.setattr(main.settings, "USAGE_LEDGER_DIR", str(tmp_path))
+    main.close_stores()  # o conftest já abriu; o lifespan só cuida do que ele mesmo abrir
+    with TestClient(main.app) as client:
+        assert main.usage.stats()["written"] == 0
+        assert client.get("/usage").json()["totals"]["/explain"]["output_tokens"] == 7
+    assert main.usage is None
+    main.open_stores()  # para o teardown do conftest